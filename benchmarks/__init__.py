@@ -0,0 +1,2 @@
+# Benchmarks for the output-parsing hot path.
+# Run with: python -m benchmarks.run_benchmarks --help (from the repository root)
@@ -0,0 +1,266 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import statistics
+import subprocess
+import contextlib
+import multiprocessing
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+src_dir = os.path.join(repo_dir, 'src')
+rules_dir = os.path.join(repo_dir, 'config', 'file_parser_config')
+if src_dir not in sys.path:
+    sys.path.insert(0, src_dir)
+if repo_dir not in sys.path:
+    sys.path.insert(0, repo_dir)
+
+from benchmarks import synthetic_outputs
+
+#BENCHMARK TARGETS
+
+# Every target runs in its own spawned process, so peak RSS belongs to that
+# target alone and no compiled ruleset or parse result carries over from the
+# previous one. The parse cache is switched off in the child. Sidecars written
+# next to the output (.json, .arrays.npz, .sections.json) are removed before
+# each repeat, so every timing is a cold parse.
+
+#programs each target applies to
+target_programs = {
+    'extract_data' : ('orca', 'gaussian', 'xtb', 'crest'),
+    'extract_status_fields' : ('orca', 'gaussian', 'xtb', 'crest'),
+    'probe_data' : ('orca', 'gaussian', 'xtb', 'crest'),
+    'read_rulesfile' : ('orca', 'gaussian', 'xtb', 'crest'),
+    'compile_ruleset' : ('orca', 'gaussian', 'xtb', 'crest'),
+    'postprocess' : ('orca', 'gaussian'),
+    'final_coordinates' : ('gaussian',),
+}
+
+#targets that do not read an output, timed per call over many calls
+ruleset_targets = ('read_rulesfile', 'compile_ruleset')
+RULESET_CALLS = 200
+
+harness_classes = {
+    'orca' : 'ORCAHarness',
+    'gaussian' : 'GaussianHarness',
+    'xtb' : 'xTBHarness',
+    'crest' : 'CRESTHarness',
+}
+
+
+def sidecars(path):
+    base = os.path.splitext(path)[0]
+    return [base + '.json', base + '.arrays.npz', base + '.xyz', path + '.sections.json']
+
+
+def clear_sidecars(path):
+    for sidecar in sidecars(path):
+        if os.path.exists(sidecar):
+            os.remove(sidecar)
+    #section indexes are also kept in memory
+    import file_parser
+    file_parser.section_indexes.clear()
+
+
+def peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def make_call(target, program, path):
+    '''
+    returns a no-argument callable running target once on path
+    '''
+    import file_parser
+    import job_harness
+    import postprocessing
+    rules_path = os.path.join(rules_dir, synthetic_outputs.writers[program][2])
+    harness = getattr(job_harness, harness_classes[program])()
+    if target == 'extract_data':
+        return lambda: file_parser.extract_data(path, rules_path, use_cache=False)
+    if target == 'extract_status_fields':
+        return lambda: file_parser.extract_data(path, rules_path, fields=harness.status_fields, use_cache=False)
+    if target == 'probe_data':
+        return lambda: file_parser.probe_data(path, rules_path, head_fields=harness.probe_head_fields,
+                                              tail_fields=harness.probe_tail_fields)
+    if target == 'read_rulesfile':
+        return lambda: file_parser.read_rulesfile(rules_path)
+    if target == 'compile_ruleset':
+        return lambda: file_parser.CompiledRuleset(rules_path)
+    dirname, filename = os.path.split(path)
+    basename = os.path.splitext(filename)[0]
+    if target == 'postprocess' and program == 'orca':
+        return lambda: postprocessing.OrcaPostProcessor(dirname=dirname, basename=basename).orca_pp_routine()
+    if target == 'postprocess' and program == 'gaussian':
+        return lambda: postprocessing.GaussianPostProcessor(dirname=dirname, basename=basename).pp_routine()
+    if target == 'final_coordinates':
+        harness.directory = dirname
+        harness.job_name = basename
+        return harness.extract_final_coordinates
+    raise ValueError(f'no benchmark target {target} for {program}')
+
+
+def run_target(target, program, path, repeat):
+    '''
+    runs in the child process, returns the timings of each repeat and the peak RSS
+    '''
+    import parse_cache
+    parse_cache.set_default_cache(None)
+    call = make_call(target, program, path)
+    #interpreter, pandas and numpy, before anything is parsed
+    import_rss = peak_rss_bytes()
+    calls = RULESET_CALLS if target in ruleset_targets else 1
+    seconds = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for i in range(repeat):
+            clear_sidecars(path)
+            start = time.perf_counter()
+            for j in range(calls):
+                call()
+            seconds.append((time.perf_counter() - start) / calls)
+    clear_sidecars(path)
+    return {'seconds' : seconds, 'peak_rss_bytes' : peak_rss_bytes(), 'import_rss_bytes' : import_rss}
+
+
+def run_isolated(target, program, path, repeat):
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1) as pool:
+        return pool.apply(run_target, (target, program, path, repeat))
+
+
+#RESULTS
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=repo_dir, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_meta():
+    return {
+        'python' : platform.python_version(),
+        'platform' : platform.platform(),
+        'machine' : platform.machine(),
+        'cpus' : os.cpu_count(),
+        'git_commit' : git_commit(),
+        'timestamp' : time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+
+def result_key(result):
+    return (result['program'], result['size_bytes'], result['opt_cycles'], result['target'])
+
+
+def benchmark(programs, sizes, cycles, targets, repeat, workdir, seed=0):
+    results = []
+    timed_rulesets = set()
+    for program in programs:
+        for size in sizes:
+            for opt_cycles in cycles:
+                path = synthetic_outputs.write_output(program, workdir, size, opt_cycles=opt_cycles, seed=seed)
+                size_bytes = os.path.getsize(path)
+                for target in targets:
+                    if program not in target_programs[target]:
+                        continue
+                    #rulesfile timings do not depend on the output, run them once per program
+                    if target in ruleset_targets:
+                        if (program, target) in timed_rulesets:
+                            continue
+                        timed_rulesets.add((program, target))
+                    run = run_isolated(target, program, path, repeat)
+                    best = min(run['seconds'])
+                    result = {
+                        'program' : program,
+                        'size' : size,
+                        'size_bytes' : size_bytes,
+                        'opt_cycles' : opt_cycles,
+                        'target' : target,
+                        'repeat' : repeat,
+                        'seconds' : run['seconds'],
+                        'best_seconds' : best,
+                        'median_seconds' : statistics.median(run['seconds']),
+                        'mb_per_s' : None if target in ruleset_targets or best == 0 else size_bytes / 1024**2 / best,
+                        'peak_rss_bytes' : run['peak_rss_bytes'],
+                        'import_rss_bytes' : run['import_rss_bytes'],
+                    }
+                    results.append(result)
+                    print_result(result)
+    return results
+
+
+def print_result(result):
+    rate = '' if result['mb_per_s'] is None else f"{result['mb_per_s']:9.1f} MB/s"
+    print(f"{result['program']:9s} {result['size']:>6s} {result['opt_cycles']:5d} cyc  "
+          f"{result['target']:22s} {result['best_seconds']:10.4f} s {rate:>14s}  "
+          f"peak RSS {result['peak_rss_bytes'] / 1024**2:8.1f} MB")
+
+
+def compare(results, baseline_path):
+    '''
+    prints best-time and peak RSS ratios against a previous results file
+    '''
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {result_key(result) : result for result in baseline['results']}
+    print(f"\ncompared with {baseline_path} (commit {baseline['meta'].get('git_commit')})")
+    print("ratios are new/old, below 1 is faster or smaller")
+    for result in results:
+        old = previous.get(result_key(result))
+        if old is None:
+            continue
+        time_ratio = result['best_seconds'] / old['best_seconds'] if old['best_seconds'] else float('nan')
+        rss_ratio = result['peak_rss_bytes'] / old['peak_rss_bytes'] if old['peak_rss_bytes'] else float('nan')
+        print(f"{result['program']:9s} {result['size']:>6s} {result['opt_cycles']:5d} cyc  "
+              f"{result['target']:22s} time x{time_ratio:6.3f}   peak RSS x{rss_ratio:6.3f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='benchmark the output-parsing hot path on synthetic outputs')
+    parser.add_argument('--programs', default='orca,gaussian,xtb,crest',
+                        help='comma separated list of orca, gaussian, xtb, crest')
+    parser.add_argument('--sizes', default='1MB,10MB,100MB',
+                        help='comma separated output sizes, e.g. 1MB,100MB,2GB')
+    parser.add_argument('--cycles', default='20',
+                        help='comma separated optimization cycle counts')
+    parser.add_argument('--targets', default=','.join(target_programs),
+                        help='comma separated subset of ' + ', '.join(target_programs))
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per target, the best is reported')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workdir', default=os.path.join(repo_dir, 'benchmarks', 'outputs'),
+                        help='where synthetic outputs are written and reused')
+    parser.add_argument('--output', default=None, help='write results to this JSON file')
+    parser.add_argument('--compare', default=None, help='previous results JSON to compare against')
+    parser.add_argument('--clean', action='store_true', help='remove the synthetic outputs afterwards')
+    args = parser.parse_args(argv)
+
+    programs = [program for program in args.programs.split(',') if program]
+    targets = [target for target in args.targets.split(',') if target]
+    for program in programs:
+        if program not in synthetic_outputs.writers:
+            parser.error(f'unknown program {program}')
+    for target in targets:
+        if target not in target_programs:
+            parser.error(f'unknown target {target}')
+    sizes = [size for size in args.sizes.split(',') if size]
+    cycles = [int(cycle) for cycle in args.cycles.split(',') if cycle]
+
+    meta = run_meta()
+    results = benchmark(programs, sizes, cycles, targets, args.repeat, args.workdir, seed=args.seed)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'meta' : meta, 'results' : results}, f, indent=1)
+    if args.compare:
+        compare(results, args.compare)
+    if args.clean:
+        shutil.rmtree(args.workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
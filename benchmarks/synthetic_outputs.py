@@ -0,0 +1,256 @@
+import os
+import random
+
+#SYNTHETIC OUTPUTS
+
+# Writers for fake ORCA, Gaussian, xTB and CREST outputs. Each one carries every
+# line the shipped rules and postprocessors look for, padded with filler that
+# looks like real SCF and geometry output until the file reaches size_bytes.
+# The same arguments and seed always give the same file.
+
+#lines written at a time, so multi-GB outputs never sit in memory
+WRITE_BATCH = 10000
+
+
+def parse_size(size):
+    '''
+    '10MB' -> 10*1024**2. plain integers are bytes
+    '''
+    units = {'KB' : 1024, 'MB' : 1024**2, 'GB' : 1024**3}
+    size = str(size).strip().upper()
+    for unit, factor in units.items():
+        if size.endswith(unit):
+            return int(float(size[:-len(unit)]) * factor)
+    return int(size)
+
+
+class OutputWriter:
+    '''
+    counts the bytes it writes so filler can be spread to hit a target size
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'w')
+        self.written = 0
+        self.batch = []
+
+    def write(self, line):
+        self.batch.append(line)
+        self.written += len(line)
+        if len(self.batch) >= WRITE_BATCH:
+            self.flush()
+
+    def flush(self):
+        self.file.write(''.join(self.batch))
+        self.batch = []
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+def fill(writer, rng, target, make_line):
+    '''
+    writes make_line(rng, i) lines until the writer has written target bytes
+    '''
+    i = 0
+    while writer.written < target:
+        writer.write(make_line(rng, i))
+        i += 1
+
+
+def orca_scf_line(rng, i):
+    return f"  {i % 40:3d}   -{rng.uniform(300, 400):.10f}   {rng.uniform(-1e-3, 1e-3):.4e}   {rng.uniform(0, 1e-2):.4e}   {rng.uniform(0, 1):.6f}\n"
+
+
+def gaussian_scf_line(rng, i):
+    return f" Cycle {i % 64:4d}  Pass 1  IDiag  1:  E= -{rng.uniform(300, 400):.12f}  Delta-E= {rng.uniform(-1e-3, 1e-3):.12f}\n"
+
+
+def xtb_scf_line(rng, i):
+    return f"  {i % 30:4d}   -{rng.uniform(10, 50):.8f}  {rng.uniform(-1e-3, 1e-3):.8e}  {rng.uniform(0, 1e-2):.8e}   {rng.uniform(0, 5):.4f}\n"
+
+
+def crest_line(rng, i):
+    return f"  {i:7d}  -{rng.uniform(10, 50):.8f}  {rng.uniform(0, 5):.4f}   {rng.randint(1, 20)}\n"
+
+
+def write_orca_output(path, size_bytes, opt_cycles=20, num_atoms=10, seed=0,
+                      sections=('dispersion', 'freq', 'tddft', 'broken_symmetry', 'uno')):
+    '''
+    ORCA opt(+freq) output with opt_cycles optimization cycles
+    '''
+    rng = random.Random(seed)
+    out = OutputWriter(path)
+    out.write("                                 * O   R   C   A *\n")
+    out.write("                         INPUT FILE\n")
+    out.write("================================================================================\n")
+    out.write("|  1> ! UKS B3LYP def2-SVP Opt Freq\n")
+    out.write(f"|  2> * xyz 0 1\n")
+    out.write("                         ****END OF INPUT****\n")
+    tail_reserve = 4096 + 60 * num_atoms
+    per_cycle = max(0, size_bytes - tail_reserve) / max(1, opt_cycles)
+    for cycle in range(opt_cycles):
+        out.write(f"                         *   GEOMETRY OPTIMIZATION CYCLE  {cycle + 1:3d}   *\n")
+        out.write("CARTESIAN COORDINATES (ANGSTROEM)\n")
+        for atom in range(num_atoms):
+            out.write(f"  C     {rng.uniform(-5, 5):12.6f}   {rng.uniform(-5, 5):12.6f}   {rng.uniform(-5, 5):12.6f}\n")
+        out.write("SCF ITERATIONS\n")
+        fill(out, rng, per_cycle * (cycle + 1) - 600, orca_scf_line)
+        if 'dispersion' in sections:
+            out.write("DFT DISPERSION CORRECTION\n")
+            out.write(f"Dispersion correction           -{rng.uniform(0, 0.1):.9f}\n")
+            out.write(f"gCP correction                   {rng.uniform(0, 0.01):.9f}\n")
+        out.write(f"FINAL SINGLE POINT ENERGY      -{rng.uniform(300, 400):.9f}\n")
+        out.write("          Geometry convergence\n")
+        out.write(f"          Energy change      {rng.uniform(-1e-4, 1e-4):.10f}      0.0000050000      NO\n")
+        out.write(f"          MAX gradient        {rng.uniform(0, 1e-2):.10f}      0.0003000000      NO\n")
+        out.write(f"          RMS gradient        {rng.uniform(0, 1e-3):.10f}      0.0001000000      NO\n")
+    out.write("                    ***        THE OPTIMIZATION HAS CONVERGED     ***\n")
+    out.write("                             *** OPTIMIZATION RUN DONE ***\n")
+    if 'freq' in sections:
+        out.write("VIBRATIONAL FREQUENCIES\n")
+        for mode in range(3 * num_atoms):
+            frequency = 0.0 if mode < 6 else rng.uniform(50, 3500)
+            out.write(f"   {mode:3d}:      {frequency:10.2f} cm**-1\n")
+        out.write("NORMAL MODES\n")
+    out.write(f"Total thermal energy                 -{rng.uniform(300, 400):.8f} Eh\n")
+    out.write(f"Total Enthalpy                    ...   -{rng.uniform(300, 400):.8f} Eh\n")
+    out.write(f"Final entropy term                ...      {rng.uniform(0, 0.1):.8f} Eh\n")
+    out.write(f"Final Gibbs free energy         ...   -{rng.uniform(300, 400):.8f} Eh\n")
+    out.write(f"G-E(el)                           ...      {rng.uniform(0, 0.5):.8f} Eh\n")
+    if 'tddft' in sections:
+        out.write("TD-DFT/TDA EXCITED STATES (SINGLETS)\n")
+        for state in range(10):
+            out.write(f"STATE {state + 1:3d}:  E=   {rng.uniform(0.05, 0.3):.6f} au      {rng.uniform(1, 8):.3f} eV\n")
+        out.write("TD-DFT/TDA-EXCITATION SPECTRA\n")
+    if 'broken_symmetry' in sections:
+        out.write("BROKEN SYMMETRY MAGNETIC COUPLING ANALYSIS\n")
+        out.write(f" E (High-Spin)                      ...     -{rng.uniform(300, 400):.9f} Eh\n")
+        out.write(f" E (BrokenSym)                      ...     -{rng.uniform(300, 400):.9f} Eh\n")
+        out.write(f" <S**2> (High-Spin)                 ...      2.0{rng.randint(0, 9)}\n")
+        out.write(f" <S**2> (BrokenSym)                 ...      1.0{rng.randint(0, 9)}\n")
+        out.write("Spin-Hamiltonian Analysis based on H(S) = -2J*SaSb\n")
+    if 'uno' in sections:
+        out.write("UHF NATURAL ORBITALS\n")
+        occupations = [2.0] * 6 + [1.6, 0.4] + [0.0] * 6
+        out.write(''.join(f" N[{i:3d}]=  {occ:.5f}" for i, occ in enumerate(occupations)) + "\n")
+        out.write("QR-MO GENERATION\n")
+    out.write("                             ****ORCA TERMINATED NORMALLY****\n")
+    out.write("TOTAL RUN TIME: 0 days 1 hours 2 minutes 3 seconds 456 msec\n")
+    out.close()
+    return path
+
+
+def write_gaussian_output(path, size_bytes, opt_cycles=20, num_atoms=10, seed=0,
+                          sections=('freq', 'uno')):
+    '''
+    Gaussian opt(+freq) output with opt_cycles optimization steps
+    '''
+    rng = random.Random(seed)
+    out = OutputWriter(path)
+    out.write(" Entering Gaussian System, Link 0=g16\n")
+    out.write(" #p ub3lyp/6-31g(d) opt freq\n")
+    tail_reserve = 4096
+    per_cycle = max(0, size_bytes - tail_reserve) / max(1, opt_cycles)
+    for cycle in range(opt_cycles):
+        out.write("                         Standard orientation:\n")
+        out.write(" ---------------------------------------------------------------------\n")
+        out.write(" Center     Atomic      Atomic             Coordinates (Angstroms)\n")
+        out.write(" Number     Number       Type             X           Y           Z\n")
+        out.write(" ---------------------------------------------------------------------\n")
+        for atom in range(num_atoms):
+            out.write(f"    {atom + 1:3d}          6           0    {rng.uniform(-5, 5):10.6f}  {rng.uniform(-5, 5):10.6f}  {rng.uniform(-5, 5):10.6f}\n")
+        out.write(" ---------------------------------------------------------------------\n")
+        fill(out, rng, per_cycle * (cycle + 1) - 400, gaussian_scf_line)
+        out.write(f" SCF Done:  E(UB3LYP) =  -{rng.uniform(300, 400):.9f}     A.U. after   {rng.randint(8, 30)} cycles\n")
+        out.write(f" <S**2>= {rng.uniform(0.75, 0.8):.4f}\n")
+        out.write(f" Maximum Force            {rng.uniform(0, 1e-2):.6f}     0.000450     NO \n")
+        out.write(f" RMS     Force            {rng.uniform(0, 1e-3):.6f}     0.000300     NO \n")
+    out.write("    -- Stationary point found.\n")
+    out.write(" Normal termination of Gaussian 16 at Mon Jan  1 00:00:00 2024.\n")
+    if 'freq' in sections:
+        out.write(" Harmonic frequencies (cm**-1)\n")
+        for group in range(num_atoms):
+            out.write(f" Frequencies --  {rng.uniform(50, 3500):10.4f}  {rng.uniform(50, 3500):10.4f}  {rng.uniform(50, 3500):10.4f}\n")
+        #the freq link checks the geometry again, normal_exit_opt_freq_2 counts both
+        out.write("    -- Stationary point found.\n")
+        out.write(f" Sum of electronic and thermal Energies=         -{rng.uniform(300, 400):.6f}\n")
+        out.write(f" Sum of electronic and thermal Enthalpies=       -{rng.uniform(300, 400):.6f}\n")
+        out.write(f" Sum of electronic and thermal Free Energies=    -{rng.uniform(300, 400):.6f}\n")
+    if 'uno' in sections:
+        out.write("     Natural Orbital Coefficients:\n")
+        out.write("     Eigenvalues --     2.00000   2.00000   1.60000   0.40000   0.00000\n")
+        out.write(" Condensed to atoms (all electrons):\n")
+    out.write(" Normal termination of Gaussian 16 at Mon Jan  1 00:00:01 2024.\n")
+    out.close()
+    return path
+
+
+def write_xtb_output(path, size_bytes, opt_cycles=20, seed=0, sections=('hess',)):
+    '''
+    xtb --ohess output
+    '''
+    rng = random.Random(seed)
+    out = OutputWriter(path)
+    out.write("      -----------------------------------------------------------\n")
+    out.write("     |                   x T B                                   |\n")
+    tail_reserve = 2048
+    per_cycle = max(0, size_bytes - tail_reserve) / max(1, opt_cycles)
+    for cycle in range(opt_cycles):
+        out.write(f"........................................................................\n")
+        out.write(f".............................. CYCLE {cycle + 1:4d} ..............................\n")
+        fill(out, rng, per_cycle * (cycle + 1) - 200, xtb_scf_line)
+        out.write(f" * total energy  :   -{rng.uniform(10, 50):.7f} Eh     change   {rng.uniform(-1e-4, 1e-4):.8e} Eh\n")
+    if 'hess' in sections:
+        out.write(f"           :  # imaginary freq.                    {rng.randint(0, 1)}          :\n")
+    out.write(f"          | TOTAL ENERGY              -{rng.uniform(10, 50):.9f} Eh   |\n")
+    out.write(f"          | TOTAL ENTHALPY            -{rng.uniform(10, 50):.9f} Eh   |\n")
+    out.write(f"          | TOTAL FREE ENERGY         -{rng.uniform(10, 50):.9f} Eh   |\n")
+    out.write(f"          | HOMO-LUMO GAP               {rng.uniform(1, 6):.6f} eV   |\n")
+    out.write(" * finished run on 2024/01/01 at 00:00:00.000\n")
+    out.close()
+    return path
+
+
+def write_crest_output(path, size_bytes, opt_cycles=20, seed=0, sections=()):
+    '''
+    CREST conformer search output, opt_cycles metadynamics iterations
+    '''
+    rng = random.Random(seed)
+    out = OutputWriter(path)
+    out.write("       ==============================================\n")
+    out.write("       |                 C R E S T                  |\n")
+    tail_reserve = 1024
+    per_cycle = max(0, size_bytes - tail_reserve) / max(1, opt_cycles)
+    for cycle in range(opt_cycles):
+        out.write(f" ------------------------------\n")
+        out.write(f" Meta-MD {cycle + 1} finished\n")
+        fill(out, rng, per_cycle * (cycle + 1) - 100, crest_line)
+    out.write(" CREST terminated normally.\n")
+    out.close()
+    return path
+
+
+writers = {
+    'orca' : (write_orca_output, '.out', 'orca_rules.dat'),
+    'gaussian' : (write_gaussian_output, '.log', 'gaussian_rules.dat'),
+    'xtb' : (write_xtb_output, '.out', 'xtb_rules.dat'),
+    'crest' : (write_crest_output, '.out', 'crest_rules.dat'),
+}
+
+
+def write_output(program, directory, size, opt_cycles=20, seed=0, basename=None):
+    '''
+    writes a synthetic output for program ('orca', 'gaussian', 'xtb', 'crest')
+    into directory, returns its path. the file is reused if it already exists
+    '''
+    writer, extension, rules = writers[program]
+    size_bytes = parse_size(size)
+    if basename is None:
+        basename = f"{program}_{size_bytes}_{opt_cycles}_{seed}"
+    path = os.path.join(directory, basename + extension)
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        writer(path, size_bytes, opt_cycles=opt_cycles, seed=seed)
+    return path
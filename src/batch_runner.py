@@ -2,10 +2,14 @@ import job_harness
 import pandas as pd
 import json
 import os
+import sys
 import time
 import shutil
 import re
+import shlex
 import subprocess
+import functools
+import concurrent.futures
 #jobs should be a list or dict of job_harness objects
 import editor
 import numpy as np
@@ -15,39 +19,162 @@ import argparse
 
 ## new 2025-06-14
 import restart_jobs
+import file_parser
+import ledger_store
+import parse_cache
+from dependency_graph import DependencyGraph
+from ledger_index import LedgerIndex
+from filesystem_snapshot import FilesystemSnapshot, run_info_stat
 
 
-def get_all_slurm_statuses():
+def query_slurm_statuses():
     """
     Get all user's SLURM jobs in one call.
-    Returns: {job_id (int): status (str)} where status is 'running' or 'pending'
+    Returns: {job_id (int): status (str)} where status is 'running' or 'pending'.
+    Array tasks are listed one per task (-r) and keyed 'jobid_task', see JobHarness.slurm_key
+    Raises RuntimeError if squeue could not be run or exited with an error
     """
     try:
         result = subprocess.run(
-            'squeue -u $USER -o "%i|%T" --noheader',
+            'squeue -u $USER -r -o "%i|%T" --noheader',
             shell=True, capture_output=True, text=True, timeout=30
         )
-        statuses = {}
-        for line in result.stdout.strip().split('\n'):
-            if not line.strip():
+    except (OSError, subprocess.SubprocessError) as e:
+        raise RuntimeError(f"squeue failed: {e}")
+    if result.returncode != 0:
+        raise RuntimeError(f"squeue exited with {result.returncode}: {result.stderr.strip()}")
+    statuses = {}
+    for line in result.stdout.strip().split('\n'):
+        if not line.strip():
+            continue
+        parts = line.split('|')
+        if len(parts) >= 2:
+            try:
+                job_id = parts[0].strip()
+                if '_' in job_id:
+                    array_id, task = job_id.split('_', 1)
+                    job_id = f"{int(array_id)}_{int(task)}"
+                else:
+                    job_id = int(job_id)
+                state = parts[1].strip().upper()
+                if state in ('RUNNING', 'R'):
+                    statuses[job_id] = 'running'
+                elif state in ('PENDING', 'PD'):
+                    statuses[job_id] = 'pending'
+            except ValueError:
                 continue
-            parts = line.split('|')
-            if len(parts) >= 2:
-                try:
-                    job_id = int(parts[0].strip())
-                    state = parts[1].strip().upper()
-                    if state in ('RUNNING', 'R'):
-                        statuses[job_id] = 'running'
-                    elif state in ('PENDING', 'PD'):
-                        statuses[job_id] = 'pending'
-                except ValueError:
-                    continue
-        return statuses
-    except Exception as e:
+    return statuses
+
+
+def get_all_slurm_statuses():
+    """
+    Get all user's SLURM jobs in one call.
+    Returns: {job_id (int): status (str)} where status is 'running' or 'pending',
+    empty if squeue failed
+    """
+    try:
+        return query_slurm_statuses()
+    except RuntimeError as e:
         print(f"Warning: batch squeue failed: {e}")
         return {}
 
 
+class SlurmSnapshot:
+    '''
+    one squeue listing of the user's jobs, shared by every harness
+    update in a pass of the main loop instead of one squeue --job per job.
+    refresh() only asks slurm again once the listing is older than ttl seconds
+    '''
+    def __init__(self, ttl=10.0, **kwargs):
+        self.ttl = ttl
+        self.debug = kwargs.get('debug', False)
+        #{job_id : 'running' or 'pending'}, None until squeue has answered once.
+        #harnesses given None fall back to their own squeue call
+        self.statuses = None
+        self.taken = None #time.monotonic() of the listing
+
+    def age(self):
+        if self.taken is None:
+            return None
+        return time.monotonic() - self.taken
+
+    def refresh(self, force=False):
+        '''
+        takes a new listing if forced or if the current one has expired.
+        if squeue fails the previous listing is kept, so jobs it showed as
+        running are not mistaken for finished ones
+        '''
+        if not force and self.taken is not None and self.age() < self.ttl:
+            return self.statuses
+        try:
+            statuses = query_slurm_statuses()
+        except RuntimeError as e:
+            print(f"Warning: batch squeue failed, keeping previous snapshot: {e}")
+            return self.statuses
+        self.statuses = statuses
+        self.taken = time.monotonic()
+        if self.debug: print(f"squeue snapshot: {len(statuses)} running/pending jobs")
+        return self.statuses
+
+    def add(self, job_id, status='pending'):
+        '''
+        records a job submitted after the listing was taken,
+        so it is not taken for a finished job until the next refresh
+        '''
+        if self.statuses is not None and job_id is not None:
+            self.statuses[job_id] = status
+
+
+class AdaptivePoll:
+    '''
+    how long the main loop sleeps between passes. a pass where something
+    happened (a submission, a status change, a change in the squeue listing)
+    drops the interval back to min_interval, every quiet pass multiplies it
+    by backoff, up to max_interval. once jobs have finished in this run the
+    ceiling is also kept to a fraction of the shortest runtime seen, so short
+    jobs are still noticed promptly. never below min_interval
+    '''
+    def __init__(self, min_interval=5.0, max_interval=300.0, backoff=2.0, **kwargs):
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.backoff = backoff
+        self.runtime_fraction = kwargs.get('runtime_fraction', 0.1)
+        self.shortest_runtime = None #seconds, shortest submit-to-finish time seen
+        self.interval = min_interval
+
+    def ceiling(self):
+        ceiling = self.max_interval
+        if self.shortest_runtime is not None:
+            ceiling = min(ceiling, self.shortest_runtime * self.runtime_fraction)
+        return max(self.min_interval, ceiling)
+
+    def job_finished(self, runtime):
+        if self.shortest_runtime is None or runtime < self.shortest_runtime:
+            self.shortest_runtime = runtime
+
+    def next_interval(self, event):
+        if event:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.backoff, self.ceiling())
+        return self.interval
+
+
+#processes check_status_all uses without --parse-workers. the runner usually sits
+#on a login node, so it takes a few cores rather than the whole machine
+DEFAULT_STATUS_WORKERS = 4
+
+
+def detect_job_status(job, slurm_cache=None):
+    '''
+    worker for check_status_all: one harness's job id and status, from its
+    directory and the squeue listing, saved to its run_info.json
+    '''
+    job.update_status(slurm_cache=slurm_cache)
+    job.write_json()
+    return job.job_id, job.status, run_info_stat(job.directory)
+
+
 #TODO: add arguments for each of these
 class BatchRunner:
     #tested
@@ -59,11 +186,60 @@ class BatchRunner:
         self.run_root_directory = "./" #read from batchfile
         self.jobs = [] #list of JobHarness objects
         self.ledger = pd.DataFrame() #ledger containing instructions and status
+        self.dependency_graph = DependencyGraph() #pipe graph of the ledger, rebuilt with it
+        self.ledger_index = LedgerIndex() #job_id and directory lookups into the ledger, rebuilt with it
+        self.fs_snapshot = FilesystemSnapshot() #job directory listings from the last check_status_all
         self.batchfile = kwargs.get('input_file',None)
         self.ledger_filename = kwargs.get('ledger_filename','__ledger__.csv') #
+        #'csv' rewrites the ledger csv, 'sqlite' keeps it in __ledger__.db with one-row updates,
+        #'journal' appends changes to __ledger__.csv.journal and compacts them into the csv now and then
+        self.ledger_backend = kwargs.get('ledger_backend',None) or 'csv'
+        if self.ledger_backend not in ('csv','sqlite','journal'):
+            raise ValueError(f"Invalid ledger backend: {self.ledger_backend}")
+        self.ledger_store = None
+        self.ledger_journal = None
+        self.ledger_store_stale = True #the stored ledger needs a full rewrite
         self.restart = kwargs.get('restart',True) #This option is for using an old ledger file
         self.max_jobs_running = kwargs.get('num_jobs',1)
         self.debug = kwargs.get('debug',False)
+        self.parse_workers = kwargs.get('parse_workers',None) #processes for bulk parsing, None uses every available cpu
+        self.compress_outputs = kwargs.get('compress_outputs',None) #'gz' or 'zst' to compress outputs of finished jobs
+        #'on' or a path on a local disk turns on the parse cache, otherwise CCBATCHMAN_PARSE_CACHE decides
+        self.parse_cache = kwargs.get('parse_cache',None)
+        if self.parse_cache:
+            parse_cache.set_default_cache(self.parse_cache)
+        #seconds one squeue listing is reused for, see SlurmSnapshot
+        squeue_ttl = kwargs.get('squeue_ttl',None)
+        self.squeue_ttl = 10.0 if squeue_ttl is None else squeue_ttl
+        self.slurm_snapshot = SlurmSnapshot(ttl=self.squeue_ttl, debug=self.debug)
+        #main loop pacing, see AdaptivePoll
+        min_poll_interval = kwargs.get('min_poll_interval',None)
+        max_poll_interval = kwargs.get('max_poll_interval',None)
+        self.poll = AdaptivePoll(
+            min_interval=5.0 if min_poll_interval is None else min_poll_interval,
+            max_interval=300.0 if max_poll_interval is None else max_poll_interval,
+        )
+        self.events = 0 #things that happened in the current main loop pass
+        self.ledger_changed = False #ledger differs from the copy on disk
+        self.submit_times = {} #slurm key : time.monotonic() at submission, for AdaptivePoll
+        #submit ready jobs with the same #SBATCH resources as one slurm job array
+        self.array_submit = kwargs.get('array_submit',False)
+        #run up to bundle_size ready jobs of at most bundle_max_runtime minutes in one allocation,
+        #bundle_workers at a time. bundle_size 0 or 1 submits every job on its own
+        self.bundle_size = kwargs.get('bundle_size',None) or 0
+        self.bundle_workers = kwargs.get('bundle_workers',None) or 1
+        bundle_max_runtime = kwargs.get('bundle_max_runtime',None)
+        self.bundle_max_runtime = 30.0 if bundle_max_runtime is None else bundle_max_runtime
+        self.groups_submitted = 0 #arrays and bundles, for unique script names
+        #queue jobs behind their running or pending upstream jobs with --dependency=afterok,
+        #their coordinate and orbital transfers run inside their own allocation
+        self.chain_submit = kwargs.get('chain_submit',False)
+        #check_status_all reuses the status of jobs whose files have not changed since the last sweep,
+        #every job is checked again once the last full check is revalidate_after seconds old
+        self.fingerprints_filename = kwargs.get('fingerprints_filename','__fingerprints__.json')
+        self.revalidate = kwargs.get('revalidate',False)
+        revalidate_after = kwargs.get('revalidate_after',None)
+        self.revalidate_after = 86400.0 if revalidate_after is None else revalidate_after
         ###
         self.restart_failed = kwargs.get('restart_failed',False)
         ###
@@ -114,16 +290,14 @@ class BatchRunner:
 
 
     def dependencies_broken(self,row):
-        failed_jobs = self.ledger['job_status'] == 'failed'
-        broken_dependencies = self.ledger['job_status'] == 'broken_dependency'
-        failed_jobs = self.ledger[failed_jobs | broken_dependencies]
-        if pd.isna(row['coords_from']):
-            return False
-        dependencies = row['coords_from']
-        dependency_abs_path = os.path.abspath(os.path.join(row['job_directory'],row['coords_from']))
-        if len(failed_jobs) != 0:
-            failed_abs_paths = [os.path.abspath(fail_row['job_directory']) for i, fail_row in failed_jobs.iterrows()]
-            if (dependency_abs_path in failed_abs_paths):
+        # the pipes the dependency graph follows, into the directories of
+        # failed and broken_dependency jobs it keeps
+        for pipe_column in ('coords_from','orbitals_from'):
+            pipe = row.get(pipe_column,None)
+            if not isinstance(pipe,str) or pipe == './':
+                continue
+            dependency_abs_path = os.path.abspath(os.path.join(row['job_directory'],pipe))
+            if dependency_abs_path in self.dependency_graph.failed_paths:
                 return True
         return False
 
@@ -157,20 +331,56 @@ class BatchRunner:
     def completed_jobs(self):
         return self.ledger[self.ledger['job_status']=='succeeded']
 
+    def build_dependency_graph(self):
+        # rebuilt in place, so the files it has already seen on disk are not checked again
+        self.dependency_graph.debug = self.debug
+        self.dependency_graph.build(self.ledger)
+        self.ledger_index = LedgerIndex(self.ledger, debug=self.debug)
+        # the graph is rebuilt whenever the ledger is replaced or reindexed
+        self.ledger_store_stale = True
+
+    def get_ledger_store(self):
+        if self.ledger_store is None:
+            ledger_path = os.path.join(self.scratch_directory,self.ledger_filename)
+            self.ledger_store = ledger_store.LedgerStore(ledger_path, debug=self.debug)
+        return self.ledger_store
+
+    def get_ledger_journal(self):
+        if self.ledger_journal is None:
+            ledger_path = os.path.join(self.scratch_directory,self.ledger_filename)
+            self.ledger_journal = ledger_store.LedgerJournal(ledger_path, debug=self.debug)
+        return self.ledger_journal
+
+    def _store_row(self, index, **values):
+        # with the sqlite and journal backends single changes are written straight away, one row each
+        if self.ledger_store_stale:
+            return
+        if self.ledger_backend == 'sqlite':
+            self.get_ledger_store().update_row(index, **values)
+        elif self.ledger_backend == 'journal':
+            self.get_ledger_journal().append(self.ledger.index.get_loc(index), **values)
+
+    def _set_job_id(self, index, job_id):
+        if self.ledger_index.job_id.get(index, None) != job_id:
+            self.ledger_changed = True
+            self._store_row(index, job_id=job_id)
+        self.ledger.loc[index,'job_id'] = job_id
+        self.ledger_index.set_job_id(index, job_id)
+
+    def _set_job_status(self, index, status):
+        '''
+        every ledger status change goes through here, so the dependency graph follows the ledger
+        '''
+        if self.dependency_graph.status.get(index, None) != status:
+            self.events += 1
+            self.ledger_changed = True
+            self._store_row(index, job_status=status)
+        self.ledger.loc[index,'job_status'] = status
+        self.dependency_graph.set_status(index, status)
+
     def dependency_mask(self):
-        return self.ledger.apply(
-                    lambda row: self.dependencies_satisfied(
-                        row
-                        ),axis=1
-                )
+        return self.dependency_graph.mask(self.ledger)
     
-    def broken_dependency_mask(self):
-        return self.ledger.apply(
-                    lambda row: self.dependencies_broken(
-                        row,
-                        ),axis=1
-                )
-
     def run_jobs_update_ledger(self,**kwargs):
         if self.debug:
             print('--------------------------------------')
@@ -178,6 +388,7 @@ class BatchRunner:
             print()
             
         debug = kwargs.get('debug',False)
+        reverted = False #chained jobs that never ran
         for index in range(len(self.jobs) - 1, -1, -1):
             job = self.jobs[index]
             
@@ -186,7 +397,7 @@ class BatchRunner:
                 print(f"job directory: {job.directory}")
                 print(json.dumps(job.to_dict(),indent=6))
             
-            job.OneIter()
+            job.OneIter(slurm_cache=self.slurm_snapshot.statuses)
             
             if self.debug:
                 print('after OneIter:')
@@ -195,10 +406,25 @@ class BatchRunner:
            
             if self.debug: print(f"job status: {job.status}")
                 
-            self.ledger.loc[self.ledger['job_id'] == job.job_id, 'job_status'] = job.status
+            # by name, the jobs of an array share one job id
+            ledger_indices = self.ledger_index.by_name(job.directory, job.job_name)
+            for ledger_index in ledger_indices:
+                self._set_job_status(ledger_index, job.status)
             
+            if job.status == 'not_started' and job.after:
+                # slurm dropped it, or its prologue found an upstream job had failed.
+                # queue_new_jobs submits it again, unless it is broken by that failure
+                print(f"chained job in {job.directory} did not run")
+                self.jobs.pop(index)
+                reverted = True
+
+            if job.status in ('succeeded','failed'):
+                submitted = self.submit_times.pop(job.slurm_key(), None)
+                if submitted is not None:
+                    self.poll.job_finished(time.monotonic() - submitted)
+
             if job.status == 'failed':
-                self.flag_broken_dependencies()
+                self.flag_broken_dependencies(ledger_indices)
                 out_path = os.path.join(job.directory,job.job_name) + job.output_extension
                 if not job.job_id:
                     job.get_id()
@@ -210,7 +436,10 @@ class BatchRunner:
                 fail_path = os.path.join(prefix,'fail_output',job_fail_write)
                 if not os.path.exists(fail_path):
                     os.makedirs(fail_path)
-                shutil.copy(out_path,os.path.join(fail_path,job.job_name + job.output_extension))
+                # the output may already be compressed, keep its extension on the copy
+                out_path = file_parser.resolve_output(out_path)
+                compressed_extension = out_path[len(os.path.join(job.directory,job.job_name) + job.output_extension):]
+                shutil.copy(out_path,os.path.join(fail_path,job.job_name + job.output_extension + compressed_extension))
                 print(slurm_path)
                 if os.path.exists(slurm_path):
                     shutil.copy(slurm_path,os.path.join(fail_path,f"slurm-{job.job_id}.out"))
@@ -236,6 +465,15 @@ class BatchRunner:
                 print("////////////////////////////////////////////////////////")
                 print()
 
+            if self.compress_outputs and job.status in ('succeeded','failed'):
+                try:
+                    job.compress_output(self.compress_outputs)
+                except OSError as e:
+                    print(f"could not compress output in {job.directory}: {e}")
+
+        if reverted:
+            self.flag_broken_dependencies()
+
         if self.debug:
             print('exiting run_jobs_update_ledger()')
             print('--------------------------------------')
@@ -326,8 +564,19 @@ class BatchRunner:
         else:
             raise ValueError('Invalid Program Specified')
         
-    def flag_broken_dependencies(self,**kwargs):
-        self.ledger.loc[self.broken_dependency_mask(),'job_status'] = 'broken_dependency'
+    def flag_broken_dependencies(self,indices=None,**kwargs):
+        '''
+        marks every not_started job downstream of the failed jobs at indices as broken_dependency,
+        grandchildren included. without indices, walks from every failed or broken job.
+        succeeded, running and pending jobs keep their status and stop the walk
+        '''
+        if indices is None:
+            indices = self.dependency_graph.with_status('failed','broken_dependency')
+        downstream = self.dependency_graph.downstream_of(
+                list(indices), statuses=('not_started','failed','broken_dependency'))
+        for index in downstream:
+            if self.dependency_graph.status[index] == 'not_started':
+                self._set_job_status(index, 'broken_dependency')
 
     def final_parse_dependency(self,row,**kwargs):
         print('new functionality: running final parse on old job')
@@ -339,8 +588,11 @@ class BatchRunner:
         			row['coords_from']
         		)
         	)
-        old_row = self.ledger[self.ledger['job_directory'] == old_directory].iloc[0]
-        old_job = self.create_job_harness(old_row['program'])
+        #the old job's program, looked up in the ledger unless given
+        program = kwargs.get('program',None)
+        if program is None:
+            program = self.ledger.loc[self.ledger_index.by_directory(old_directory)[0]]['program']
+        old_job = self.create_job_harness(program)
         old_job.job_name = os.path.basename(row['coords_from'])
         #jobs in directory with their basename, and their files have this basename
         old_job.directory = old_directory
@@ -348,17 +600,15 @@ class BatchRunner:
         old_job.final_parse()
 
     def queue_new_jobs(self,**kwargs):
-        running_mask = (self.ledger['job_status'] == 'running') |\
-                       (self.ledger['job_status'] == 'pending') 
-        num_running_jobs = len(self.ledger[running_mask])
+        num_running_jobs = self.dependency_graph.count('running','pending')
         
         if num_running_jobs < self.max_jobs_running:
-            if self.debug: print(f"jobs with satisfied dependencies:\n{self.ledger.loc[self.dependency_mask()]}")
-            not_started_mask = (self.dependency_mask()) & (self.ledger['job_status'] == 'not_started')
-            not_started_jobs = self.ledger.loc[not_started_mask]
+            # only jobs whose upstream jobs all succeeded, straight from the dependency graph
+            ready_indices = self.dependency_graph.ready_jobs(limit=self.max_jobs_running-num_running_jobs)
+            not_started_jobs = self.ledger.loc[ready_indices]
             if self.debug: print(f"available jobs:\n{not_started_jobs}")
-            for i in range(min(self.max_jobs_running-num_running_jobs,
-                               len(not_started_jobs))):
+            to_submit = [] #(ledger index, harness) of jobs to submit as arrays or bundles
+            for i in range(len(not_started_jobs)):
                 job = self.create_job_harness(not_started_jobs.iloc[i]['program'])
                 
                 job.job_name = not_started_jobs.iloc[i]['job_basename']
@@ -367,7 +617,7 @@ class BatchRunner:
                 job.directory = not_started_jobs.iloc[i]['job_directory']
                 if self.debug: print(f"directory set to {job.directory}")
 
-                job.update_status() #this was changed, ensure desired behavior!
+                job.update_status(slurm_cache=self.slurm_snapshot.statuses) #this was changed, ensure desired behavior!
                 job.write_json()
                 
                 if job.status == 'succeeded':
@@ -394,7 +644,12 @@ class BatchRunner:
                     self.final_parse_dependency(not_started_jobs.iloc[i]) #new functionality
                     self.transfer_coords(not_started_jobs.iloc[i],job)
                     self.transfer_orbitals(not_started_jobs.iloc[i], job)
+                    if self.array_submit or self.bundle_size > 1:
+                        # submitted together after this loop
+                        to_submit.append((not_started_jobs.index[i], job))
+                        continue
                     job.submit_job()
+                    self.job_submitted(job)
 
                 elif job.status in ['running','pending']:
                     print("////////////////////////////////////////////////////////")
@@ -407,30 +662,214 @@ class BatchRunner:
                     raise ValueError(f"invalid job status: {job.status}")
 
                 
-                ledger_index = not_started_jobs.index[i]
-                if self.debug: print(f"job id: {job.job_id}")
-                self.ledger.loc[ledger_index,'job_id'] = job.job_id
-                if self.debug: print(f"job status: {job.status}")
-                self.ledger.loc[ledger_index,'job_status'] = job.status #doesn't work; for now update ledger will be able to tell
-                if self.debug: print(f"after: {self.ledger.loc[ledger_index]}")
-                
-                self.jobs.append(job)
-            
+                self.record_queued_job(not_started_jobs.index[i], job)
+            if to_submit:
+                self.submit_grouped(to_submit)
+        if self.chain_submit:
+            self.queue_chained_jobs()
+
+    def job_submitted(self, job, **kwargs):
+        self.slurm_snapshot.add(job.slurm_key(),'pending')
+        # a chained job's wait for its upstream jobs is no runtime for AdaptivePoll
+        if kwargs.get('timed',True):
+            self.submit_times[job.slurm_key()] = time.monotonic()
+        self.events += 1
+
+    def record_queued_job(self, ledger_index, job):
+        if self.debug: print(f"job id: {job.job_id}")
+        self._set_job_id(ledger_index, job.job_id)
+        if self.debug: print(f"job status: {job.status}")
+        self._set_job_status(ledger_index, job.status)
+        if self.debug: print(f"after: {self.ledger.loc[ledger_index]}")
+        
+        self.jobs.append(job)
+
+    def queue_chained_jobs(self):
+        '''
+        queues not_started jobs behind their running or pending upstream jobs with
+        --dependency=afterok, as far down each chain as num_jobs allows. each one runs
+        chain_prologue.py in its own allocation first, in place of the transfers
+        queue_new_jobs does before submitting
+        '''
+        active = {} #ledger index : harness of jobs in the queue
+        for job in self.jobs:
+            if job.status in ('running','pending'):
+                for ledger_index in self.ledger_index.by_name(job.directory, job.job_name):
+                    active[ledger_index] = job
+        budget = self.max_jobs_running - self.dependency_graph.count('running','pending')
+        while budget > 0:
+            chainable = self.dependency_graph.chainable_jobs(active, limit=budget)
+            if not chainable:
+                break
+            for ledger_index in chainable:
+                row = self.ledger.loc[ledger_index]
+                job = self.create_job_harness(row['program'])
+                job.job_name = row['job_basename']
+                job.directory = row['job_directory']
+                job.update_status(slurm_cache=self.slurm_snapshot.statuses)
+                if job.status == 'not_started':
+                    after = [active[upstream_index].slurm_key()
+                             for upstream_index in sorted(self.dependency_graph.upstream[ledger_index])
+                             if upstream_index in active]
+                    script = job.chain_script(self.chain_prologue_command(ledger_index, job))
+                    job.submit_job(after=after, script=script)
+                    print(f"queued {job.job_name} in {job.directory} behind {', '.join(str(key) for key in after)}")
+                    self.job_submitted(job, timed=False)
+                else:
+                    job.write_json()
+                self.record_queued_job(ledger_index, job)
+                if job.status in ('running','pending'):
+                    active[ledger_index] = job
+                    budget -= 1
+
+    def chain_prologue_command(self, ledger_index, job):
+        '''
+        writes what chain_prologue needs to know about a chained job to job_name.chain.json
+        in its directory, returns the command that runs the prologue on it
+        '''
+        row = self.ledger.loc[ledger_index]
+        columns = ['job_directory','job_basename','program','coords_from','xyz_filename','orbitals_from','gbw_filename']
+        upstream = self.ledger.loc[sorted(self.dependency_graph.upstream[ledger_index])]
+        spec = {
+            'row' : {column : None if pd.isna(row[column]) else row[column] for column in columns if column in row},
+            'upstream' : [{'directory' : directory, 'job_name' : basename, 'program' : program}
+                          for directory, basename, program in zip(upstream['job_directory'],
+                                                                  upstream['job_basename'], upstream['program'])],
+        }
+        spec_path = os.path.abspath(os.path.join(job.directory, f"{job.job_name}.chain.json"))
+        with open(spec_path,'w') as json_file:
+            json.dump(spec, json_file, indent="")
+        prologue_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chain_prologue.py')
+        return ' '.join(shlex.quote(part) for part in (sys.executable, prologue_path, spec_path))
+
+    def chain_prologue(self, spec):
+        '''
+        runs in a chained job's allocation before its own commands. afterok only means
+        the upstream jobs exited cleanly, so their outputs are checked, then the inputs are
+        prepared the way queue_new_jobs does it. False if an upstream job did not succeed
+        '''
+        programs = {} #absolute directory : program of upstream jobs
+        for upstream in spec['upstream']:
+            old_job = self.create_job_harness(upstream['program'])
+            old_job.directory = upstream['directory']
+            old_job.job_name = upstream['job_name']
+            old_job.check_success_static()
+            if old_job.status != 'succeeded':
+                print(f"upstream job {old_job.job_name} in {old_job.directory}: {old_job.status}, not running")
+                return False
+            programs[os.path.abspath(upstream['directory'])] = upstream['program']
+        row = pd.Series(spec['row'])
+        job = self.create_job_harness(row['program'])
+        job.job_name = row['job_basename']
+        job.directory = row['job_directory']
+        if isinstance(row['coords_from'],str):
+            coords_directory = os.path.abspath(os.path.join(row['job_directory'],row['coords_from']))
+            if coords_directory in programs:
+                self.final_parse_dependency(row, program=programs[coords_directory])
+        self.transfer_coords(row, job)
+        self.transfer_orbitals(row, job)
+        return True
+
+    def group_name(self, kind):
+        # names stay unique across runs, a pending array or bundle still reads its map
+        name = f"{kind}_{time.strftime('%Y%m%d%H%M%S')}_{self.groups_submitted}"
+        self.groups_submitted += 1
+        return name
+
+    def submit_grouped(self, to_submit):
+        '''
+        submits the (ledger index, harness) pairs queue_new_jobs collected: short jobs
+        in task-farm bundles of up to bundle_size, the rest as job arrays or one by one
+        '''
+        remaining = []
+        short = {}
+        for ledger_index, job in to_submit:
+            options = job.sbatch_options()
+            runtime = job_harness.sbatch_runtime(options)
+            if self.bundle_size > 1 and runtime is not None and runtime <= self.bundle_max_runtime:
+                short.setdefault(job_harness.bundle_key(options), []).append((ledger_index, job))
+            else:
+                remaining.append((ledger_index, job))
+        bundle_directory = os.path.join(self.scratch_directory,'__bundles__')
+        for group in short.values():
+            for start in range(0, len(group), self.bundle_size):
+                chunk = group[start:start + self.bundle_size]
+                if len(chunk) == 1:
+                    remaining.extend(chunk)
+                    continue
+                name = self.group_name('bundle')
+                job_id = job_harness.submit_bundle([job for ledger_index, job in chunk], bundle_directory, name,
+                                                   workers=min(self.bundle_workers, len(chunk)), debug=self.debug)
+                print(f"submitted {len(chunk)} jobs as bundle {job_id} ({name})")
+                for ledger_index, job in chunk:
+                    self.job_submitted(job)
+                    self.record_queued_job(ledger_index, job)
+        if self.array_submit:
+            self.submit_arrays(remaining)
+            return
+        for ledger_index, job in remaining:
+            job.submit_job()
+            self.job_submitted(job)
+            self.record_queued_job(ledger_index, job)
+
+    def submit_arrays(self, to_submit):
+        '''
+        submits (ledger index, harness) pairs grouped by their #SBATCH resources,
+        one slurm job array per group. a job alone in its group is submitted on its own
+        '''
+        groups = {}
+        for ledger_index, job in to_submit:
+            groups.setdefault(job.sbatch_options(), []).append((ledger_index, job))
+        array_directory = os.path.join(self.scratch_directory,'__arrays__')
+        for group in groups.values():
+            jobs = [job for ledger_index, job in group]
+            if len(jobs) == 1:
+                jobs[0].submit_job()
+            else:
+                name = self.group_name('array')
+                job_id = job_harness.submit_array(jobs, array_directory, name, debug=self.debug)
+                print(f"submitted {len(jobs)} jobs as array {job_id} ({name})")
+            for ledger_index, job in group:
+                self.job_submitted(job)
+                self.record_queued_job(ledger_index, job)
 
     def check_finished(self,**kwargs):
         debug = kwargs.get('debug',False)
-        not_finished_mask = (self.ledger['job_status'] == 'not_started') |\
-                            (self.ledger['job_status'] == 'running') |\
-                            (self.ledger['job_status'] == 'pending')
-        if len(self.ledger.loc[not_finished_mask & self.dependency_mask()]) == 0:
+        # finished when nothing is queued and no not_started job can be submitted
+        if self.dependency_graph.count('running','pending') == 0 and not self.dependency_graph.ready_jobs(limit=1):
             return True
         return False
 
     def write_ledger(self,**kwargs):
         ledger_path = os.path.join(self.scratch_directory,self.ledger_filename)
-        if self.debug:
-            print(f"writing ledger to disk with path {ledger_path}")
-        self.ledger.to_csv(ledger_path,sep='|',index=False)
+        if self.ledger_backend == 'sqlite':
+            # row changes are already stored, only a replaced ledger is written in full
+            if self.ledger_store_stale:
+                if self.debug: print(f"writing ledger to {self.get_ledger_store().path}")
+                self.get_ledger_store().write(self.ledger)
+                self.ledger_store_stale = False
+        elif self.ledger_backend == 'journal':
+            # changes are already in the journal, fold it into the csv once it is as long as the ledger
+            journal = self.get_ledger_journal()
+            if self.ledger_store_stale or journal.records >= len(self.ledger):
+                journal.compact(self.ledger)
+                self.ledger_store_stale = False
+        else:
+            if self.debug:
+                print(f"writing ledger to disk with path {ledger_path}")
+            ledger_store.write_csv(self.ledger, ledger_path)
+        self.ledger_changed = False
+
+    def export_ledger(self):
+        '''
+        with the sqlite and journal backends, writes the ledger csv for tools that read it directly
+        '''
+        if self.ledger_backend == 'sqlite':
+            self.write_ledger()
+            self.get_ledger_store().export_csv()
+        elif self.ledger_backend == 'journal':
+            self.get_ledger_journal().compact(self.ledger)
+            self.ledger_store_stale = False
 
 
 
@@ -476,9 +915,9 @@ class BatchRunner:
     
     def read_old_ledger(self,**kwargs):
         ledger_path = os.path.join(self.scratch_directory,self.ledger_filename)
-        if not os.path.exists(ledger_path):
+        if not ledger_store.ledger_exists(ledger_path):
             raise ValueError('ledger path does not exist')
-        old_ledger = pd.read_csv(ledger_path,sep='|')
+        old_ledger = ledger_store.load_ledger(ledger_path)
         if self.debug: print(f"Old ledger loaded with filename:\n{self.ledger_filename}")
             
         self.ledger = pd.concat([self.ledger, old_ledger])\
@@ -498,9 +937,11 @@ class BatchRunner:
             new_job.directory = row['job_directory'] 
             new_job.job_name = row['job_basename'] #sure
             new_job.restart = True  #why does this fail
+            # run_info.json also knows the array task of jobs submitted in an array
+            new_job.get_id()
             #so we need to check. if there's a job ID, but no output and it's not active,
             #status is not_started.
-            new_job.update_status() #right here is where we fail. 
+            new_job.update_status(slurm_cache=self.slurm_snapshot.statuses) #right here is where we fail. 
             new_job.write_json()  
             self.jobs.append(new_job) 
             if self.debug: print(f"JOB ADDED TO QUEUE. {new_job.job_name}")
@@ -582,15 +1023,27 @@ class BatchRunner:
 
     def try_parse_all_jobs(self,**kwargs):
         print(f"trying to parse all jobs in ledger!!")
+        harnesses = []
         for index, row in self.ledger.iterrows():
-            dirname = row['job_directory']
-            basename = row['job_basename']
             jh = self.create_job_harness(row['program'])
-            jh.directory = dirname
-            jh.job_name = basename
+            jh.directory = row['job_directory']
+            jh.job_name = row['job_basename']
+            harnesses.append(jh)
+        # the outputs are parsed together on a process pool,
+        # with the parse cache on, final_parse then reuses those results through it
+        results = file_parser.extract_many(
+            [os.path.join(jh.directory, jh.job_name) + jh.output_extension for jh in harnesses],
+            [jh.ruleset for jh in harnesses],
+            workers=self.parse_workers,
+        )
+        for jh, data in zip(harnesses, results):
+            dirname = jh.directory
+            basename = jh.job_name
             try:
                 print(f"parsing data in dir : {dirname} basename: {basename}")
-                jh.parse_output()
+                if isinstance(data, Exception):
+                    raise data
+                jh.write_parsed_json(data)
                 jh.final_parse()
             except:
                 print(f"parse_data failed for job with base path:")
@@ -599,34 +1052,114 @@ class BatchRunner:
     def save_fail_output(self,**kwargs):
         print("Job failed. Saving output in {self.run_root_directory}/failed_jobs.")
 
+    def detect_job_statuses(self, jobs, slurm_cache=None):
+        '''
+        (job_id, status, run_info.json stat) of each harness, read from disk on a process pool
+        of parse_workers, DEFAULT_STATUS_WORKERS when it is not set
+        '''
+        workers = self.parse_workers
+        if workers is None:
+            workers = min(DEFAULT_STATUS_WORKERS, file_parser.available_cpus())
+        workers = min(workers, len(jobs))
+        detect = functools.partial(detect_job_status, slurm_cache=slurm_cache)
+        if workers <= 1:
+            return [detect(job) for job in jobs]
+        #a few chunks per worker keeps them busy when outputs differ in size
+        chunksize = max(1, len(jobs) // (workers * 4))
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(detect, jobs, chunksize=chunksize))
+
+    def read_fingerprints(self):
+        fingerprints_path = os.path.join(self.scratch_directory,self.fingerprints_filename)
+        if not os.path.exists(fingerprints_path):
+            return {}
+        try:
+            with open(fingerprints_path,'r') as json_file:
+                return json.load(json_file)
+        except ValueError:
+            print(f"ignoring unreadable fingerprints at {fingerprints_path}")
+            return {}
+
+    def write_fingerprints(self, fingerprints):
+        fingerprints_path = os.path.join(self.scratch_directory,self.fingerprints_filename)
+        with open(fingerprints_path + '.part','w') as json_file:
+            json.dump(fingerprints, json_file)
+        os.replace(fingerprints_path + '.part', fingerprints_path)
+
     def check_status_all(self,**kwargs):
         self.ledger.index = range(0,len(self.ledger))
         print(f"Length of ledger: {len(self.ledger)}")
         
-        # Single squeue call for all jobs
-        slurm_cache = get_all_slurm_statuses()
-        print(f"Got {len(slurm_cache)} running/pending jobs from squeue")
+        # Single squeue call for all jobs, kept for restart_job_harnesses and the main loop
+        slurm_cache = self.slurm_snapshot.refresh(force=True)
+        if slurm_cache is not None:
+            print(f"Got {len(slurm_cache)} running/pending jobs from squeue")
+        # one listing of every job directory, taken after squeue so a job missing
+        # from the queue has finished writing by the time its directory is read
+        self.fs_snapshot = FilesystemSnapshot(self.ledger['job_directory'], debug=self.debug)
+
+        # jobs whose slurm ids, output and run_info.json match the last sweep keep the status found then.
+        # without a squeue listing nothing is reused, a queued job could look unchanged
+        fingerprints = self.read_fingerprints()
+        revalidate = (self.revalidate or slurm_cache is None
+                      or time.time() - fingerprints.get('revalidated', 0) > self.revalidate_after)
+        known = {} if revalidate else fingerprints.get('jobs', {})
+        if revalidate: print("Checking every job, fingerprints are not used for this sweep")
+        self.revalidate = False #--revalidate forces one full sweep, not every one
+        recorded = {}
         
-        for i,row in self.ledger.iterrows():
-            directory = row['job_directory']
-            basename = row['job_basename']
-            program = row['program']
-            if row['job_status'] == 'broken_dependency':
+        indices = []
+        job_ids = []
+        statuses = []
+        jobs = []
+        keys = []
+        for i, directory, basename, program, status in zip(self.ledger.index, self.ledger['job_directory'],
+                self.ledger['job_basename'], self.ledger['program'], self.ledger['job_status']):
+            key = os.path.join(os.path.abspath(directory), basename)
+            if status == 'broken_dependency':
+                # not checked, but its fingerprint stays good for the next sweep
+                if key in fingerprints.get('jobs', {}):
+                    recorded[key] = fingerprints['jobs'][key]
                 continue
             job = self.create_job_harness(program)
             job.from_dict({
                 'directory': directory,
                 'job_name' : basename,
                 })
-            # Use slurm_cache to avoid N individual squeue calls
-            job.update_status(slurm_cache=slurm_cache)
-            self.ledger.loc[i, 'job_id'] = job.job_id
-            self.ledger.loc[i, 'job_status'] = job.status
-            # Persist updated status to run_info.json
-            job.write_json()
-            if job.status == 'failed':
-                self.flag_broken_dependencies()
-            del job
+            fingerprint = self.fs_snapshot.fingerprint(directory, os.path.join(directory, basename) + job.output_extension)
+            old = known.get(key, None)
+            if (fingerprint is not None and old is not None and old['fingerprint'] == fingerprint
+                    and old['job_status'] in ('succeeded','failed','not_started')
+                    and old['job_id'] not in slurm_cache):
+                recorded[key] = old
+                indices.append(i)
+                job_ids.append(old['job_id'])
+                statuses.append(old['job_status'])
+                continue
+            job.fs_snapshot = self.fs_snapshot.subset(directory)
+            jobs.append(job)
+            keys.append((i, key, fingerprint))
+        print(f"{len(indices)} jobs unchanged since the last sweep, checking {len(jobs)}")
+        # Use slurm_cache to avoid N individual squeue calls, each job persists its status to run_info.json
+        results = self.detect_job_statuses(jobs, slurm_cache=slurm_cache)
+        for (i, key, fingerprint), (job_id, status, run_info) in zip(keys, results):
+            indices.append(i)
+            job_ids.append(job_id)
+            statuses.append(status)
+            if fingerprint is not None:
+                # run_info.json as this sweep left it
+                recorded[key] = {'fingerprint' : fingerprint[:2] + [run_info], 'job_id' : job_id, 'job_status' : status}
+        self.write_fingerprints({
+            'revalidated' : time.time() if revalidate else fingerprints['revalidated'],
+            'jobs' : recorded,
+        })
+        # every row at once, then the graph and index are built from the finished ledger
+        self.ledger.loc[indices, 'job_id'] = job_ids
+        self.ledger.loc[indices, 'job_status'] = statuses
+        self.build_dependency_graph()
+        self.ledger_changed = True
+        # one walk down the dependency graph from every failed job
+        self.flag_broken_dependencies()
 
 
     def restart_failed_jobs(self,**kwargs):
@@ -634,8 +1167,45 @@ class BatchRunner:
         self.write_ledger()
         restart_jobs.restart_routine(ledger_path)
         self.read_old_ledger()
+        # restarted jobs are not_started again
+        self.ledger.index = range(0,len(self.ledger))
+        self.build_dependency_graph()
     
 
+    def watched_outputs(self):
+        '''
+        (exists, mtime, size) of the outputs of active jobs that squeue does not list as running.
+        a change there means a job started or finished between squeue listings
+        '''
+        statuses = self.slurm_snapshot.statuses or {}
+        watched = {}
+        for job in self.jobs:
+            if statuses.get(job.slurm_key(), None) == 'running':
+                continue #running jobs write all the time, only squeue can tell us they stopped
+            path = file_parser.resolve_output(os.path.join(job.directory,job.job_name) + job.output_extension)
+            try:
+                stat = os.stat(path)
+                watched[path] = (True, stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                watched[path] = (False, None, None)
+        return watched
+
+    def wait_for_event(self, interval):
+        '''
+        sleeps for interval seconds, checking the watched outputs every
+        min_poll_interval and returning early when one of them changes
+        '''
+        deadline = time.monotonic() + interval
+        watched = self.watched_outputs()
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(self.poll.min_interval, remaining))
+            if watched and self.watched_outputs() != watched:
+                if self.debug: print('output changed, waking up')
+                return True
+
     def MainLoop(self,**kwargs):
         print('batch_runner\nInitializing run\n')
         self.initialize_run()
@@ -645,13 +1215,21 @@ class BatchRunner:
             self.check_status_all()
             print("STATUS CHECK DONE")
             self.write_ledger()
+            self.export_ledger()
             return
         if self.restart_failed:
             do_one_pass = True
         else:
             do_one_pass = False
+        last_slurm_statuses = None
         while not (self.check_finished() and not do_one_pass):
             do_one_pass = False
+            self.events = 0
+            # one squeue listing for every harness in this pass
+            slurm_statuses = self.slurm_snapshot.refresh()
+            if slurm_statuses != last_slurm_statuses:
+                self.events += 1
+                last_slurm_statuses = None if slurm_statuses is None else dict(slurm_statuses)
             # if self.debug: 
             print('updating ledger and running job loops')
             self.run_jobs_update_ledger()
@@ -662,12 +1240,17 @@ class BatchRunner:
             if self.restart_failed:
                 print('restarting failed jobs')
                 self.restart_failed_jobs()
+            if self.ledger_changed:
+                # if self.debug: 
+                print('writing ledger')
+                self.write_ledger()
+            if self.check_finished():
+                break
+            interval = self.poll.next_interval(self.events > 0)
             # if self.debug: 
-            print('writing ledger')
-            self.write_ledger()
-            # if self.debug: 
-            print('sleeping')
-            time.sleep(0.1)
+            print(f'sleeping up to {interval:.1f} s')
+            self.wait_for_event(interval)
+        self.export_ledger()
         print("\n\nEXITING\n\n")
         return
 
@@ -681,6 +1264,20 @@ if __name__ == "__main__":
     ##NEW AND UNTESTED
     parser.add_argument("-l","--ledger-filename",type=str,help="filename of ledger to use for this run")
     parser.add_argument("-r", "--restart-failed", action="store_true",help="Restart failed jobs")
+    parser.add_argument("--compress-outputs", choices=['gz','zst'], help="Compress outputs of finished jobs with gzip or zstandard")
+    parser.add_argument("--parse-workers", type=int, help="Processes used when parsing many outputs at once (default: all available cpus) and for startup status checks (default: 4)")
+    parser.add_argument("--parse-cache", type=str, help="Keep parse results in an SQLite cache: 'on' for one in the node-local temporary directory, or a path on a local disk, not NFS (default: off)")
+    parser.add_argument("--squeue-ttl", type=float, help="Seconds one squeue listing is reused for by the main loop (default: 10)")
+    parser.add_argument("--ledger-backend", choices=['csv','sqlite','journal'], help="Keep the ledger as a csv rewritten each change (default), in SQLite with one-row updates, or as a csv plus a journal of changes")
+    parser.add_argument("--min-poll-interval", type=float, help="Shortest sleep between main loop passes in seconds (default: 5)")
+    parser.add_argument("--max-poll-interval", type=float, help="Longest sleep between main loop passes in seconds (default: 300)")
+    parser.add_argument("--array-submit", action="store_true", help="Submit ready jobs with identical #SBATCH resources together as slurm job arrays")
+    parser.add_argument("--bundle-size", type=int, help="Run up to this many short ready jobs together in one allocation (default: off)")
+    parser.add_argument("--bundle-workers", type=int, help="Jobs a bundle runs at the same time (default: 1)")
+    parser.add_argument("--bundle-max-runtime", type=float, help="Minutes of #SBATCH -t up to which a job counts as short for bundling (default: 30)")
+    parser.add_argument("--chain-submit", action="store_true", help="Queue jobs behind their running upstream jobs with --dependency=afterok instead of waiting for them to finish")
+    parser.add_argument("--revalidate", action="store_true", help="Check every job's status at startup, even if its files have not changed since the last check")
+    parser.add_argument("--revalidate-after", type=float, help="Seconds after which unchanged jobs are checked again anyway (default: 86400)")
 
 
     args = parser.parse_args()
@@ -704,6 +1301,20 @@ if __name__ == "__main__":
         ###
         restart_failed=restart_failed,
         ###
+        parse_workers=args.parse_workers,
+        compress_outputs=args.compress_outputs,
+        parse_cache=args.parse_cache,
+        squeue_ttl=args.squeue_ttl,
+        ledger_backend=args.ledger_backend,
+        min_poll_interval=args.min_poll_interval,
+        max_poll_interval=args.max_poll_interval,
+        revalidate=args.revalidate,
+        array_submit=args.array_submit,
+        bundle_size=args.bundle_size,
+        bundle_workers=args.bundle_workers,
+        bundle_max_runtime=args.bundle_max_runtime,
+        chain_submit=args.chain_submit,
+        revalidate_after=args.revalidate_after,
     )
     batch_runner.MainLoop()
 
@@ -0,0 +1,22 @@
+import sys
+import json
+import argparse
+
+import batch_runner
+
+#CHAIN PROLOGUE
+
+# Run by the script of a job BatchRunner queued behind its upstream jobs
+# (--chain-submit), before the job's own commands. A non-zero exit stops
+# the job, and slurm drops the jobs queued behind it.
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Check a chained job's upstream jobs and move their coordinates and orbitals over")
+    parser.add_argument("spec", type=str, help="Path to the job's .chain.json, written when it was queued")
+    parser.add_argument("-v", "--verbose", action="store_true",help="Enable debug/verbose print statements")
+    args = parser.parse_args()
+    with open(args.spec,'r') as json_file:
+        spec = json.load(json_file)
+    runner = batch_runner.BatchRunner(debug=args.verbose)
+    if not runner.chain_prologue(spec):
+        sys.exit(1)
@@ -17,6 +17,14 @@ import data_routines
 
 #most of these import statements are unnecessary.
 
+#the only variables get_molecule_data reads from each output,
+#plus what's needed to spin correct broken-symmetry energies
+MOLECULE_DATA_FIELDS = [
+    'E_el_au', 'E_au', 'H_au', 'G_au',
+    '<S^2>_HS', '<S^2>_BS', 'E_high_spin_au', 'E_broken_sym_au',
+    'E_gCP_au', 'E_dispersion_au',
+]
+
 def get_molecule_data(root,
                       molecules,
                       theory,
@@ -78,6 +86,7 @@ def get_molecule_data(root,
             parseleaf = parse_tree.ParseLeaf()
             parseleaf.directory = os.path.join(root,molecule,theory)
             parseleaf.basename = basename
+            parseleaf.fields = MOLECULE_DATA_FIELDS
             parseleaf.parse_data()
             data = parseleaf.data
         except:
@@ -0,0 +1,230 @@
+import os
+import json
+import bisect
+import collections
+
+import pandas as pd
+
+#a job in one of these states breaks every job downstream of it
+failed_statuses = ('failed', 'broken_dependency')
+
+
+class DependencyGraph:
+    '''
+    the pipe graph of a ledger (coords_from and orbitals_from),
+    keyed by ledger index. every job keeps a count of upstream jobs
+    that have not succeeded yet, so when a job changes status only its
+    downstream jobs are touched, and the jobs ready to submit are kept
+    in a sorted list instead of being found by scanning the ledger.
+
+    pipes pointing at directories outside the ledger are checked on disk,
+    the way BatchRunner.dependencies_satisfied does it
+    '''
+    def __init__(self, ledger=None, **kwargs):
+        self.debug = kwargs.get('debug', False)
+        self.status = {} #index : job_status
+        self.counts = {} #job_status : number of jobs
+        self.upstream = {} #index : set of upstream indices
+        self.downstream = {} #index : set of downstream indices
+        self.remaining = {} #index : upstream jobs that have not succeeded
+        self.xyz_paths = {} #index : xyz file that must exist before the job can run
+        self.external = {} #index : run_info.json paths of upstream jobs outside the ledger
+        self.ready = [] #not_started indices with remaining == 0, sorted
+        self.ready_set = set()
+        self.directory = {} #index : absolute job directory
+        self.directories = {} #absolute job directory : indices
+        self.failed_paths = set() #absolute directories of failed and broken_dependency jobs
+        #xyz files and external upstream jobs already seen to be there.
+        #build() keeps them, since finished jobs do not come undone
+        self.verified = set()
+        if ledger is not None:
+            self.build(ledger)
+
+    def build(self, ledger):
+        '''
+        builds the graph from the ledger's pipe columns and statuses
+        '''
+        self.status = {}
+        self.counts = {}
+        self.upstream = {}
+        self.downstream = {}
+        self.remaining = {}
+        self.xyz_paths = {}
+        self.external = {}
+        self.ready = []
+        self.ready_set = set()
+        self.directory = {}
+        self.directories = {}
+        self.failed_paths = set()
+
+        for index, directory in zip(ledger.index, ledger['job_directory']):
+            directory = os.path.abspath(directory)
+            self.directory[index] = directory
+            self.directories.setdefault(directory, []).append(index)
+        directories = self.directories
+
+        pipe_columns = ('job_directory', 'coords_from', 'xyz_filename', 'orbitals_from', 'gbw_filename')
+        rows = [dict(zip(pipe_columns, values)) for values in zip(
+            *[ledger[column] if column in ledger else [None] * len(ledger) for column in pipe_columns])]
+        for index, row in zip(ledger.index, rows):
+            self.upstream[index] = set()
+            self.downstream.setdefault(index, set())
+            self.external[index] = []
+            for pipe_column, file_column in (('coords_from', 'xyz_filename'), ('orbitals_from', 'gbw_filename')):
+                pipe = row.get(pipe_column, None)
+                if not isinstance(pipe, str) or pipe == './':
+                    continue
+                upstream_directory = os.path.abspath(os.path.join(row['job_directory'], pipe))
+                upstream_indices = directories.get(upstream_directory, [])
+                if pipe_column == 'coords_from':
+                    self.xyz_paths[index] = os.path.join(upstream_directory, row[file_column])
+                if not upstream_indices:
+                    #only coordinates were ever waited on for jobs outside the ledger
+                    if pipe_column == 'coords_from':
+                        self.external[index].append(os.path.join(upstream_directory, 'run_info.json'))
+                    continue
+                for upstream_index in upstream_indices:
+                    if upstream_index == index:
+                        continue
+                    self.upstream[index].add(upstream_index)
+                    self.downstream.setdefault(upstream_index, set()).add(index)
+
+        for index, status in zip(ledger.index, ledger['job_status']):
+            self.status[index] = status
+            self.counts[status] = self.counts.get(status, 0) + 1
+            if status in failed_statuses:
+                self.failed_paths.add(self.directory[index])
+        for index in self.upstream:
+            self.remaining[index] = sum(1 for upstream_index in self.upstream[index]
+                                        if self.status[upstream_index] != 'succeeded')
+            self.update_ready(index)
+        if self.debug: print(f"dependency graph: {len(self.status)} jobs, {len(self.ready)} ready")
+        return self
+
+    def update_ready(self, index):
+        is_ready = self.status[index] == 'not_started' and self.remaining[index] == 0
+        if is_ready and index not in self.ready_set:
+            bisect.insort(self.ready, index)
+            self.ready_set.add(index)
+        elif not is_ready and index in self.ready_set:
+            del self.ready[bisect.bisect_left(self.ready, index)]
+            self.ready_set.discard(index)
+
+    def set_status(self, index, status):
+        '''
+        records a status change, updating the counters of downstream jobs
+        '''
+        old_status = self.status.get(index, None)
+        if old_status == status:
+            return
+        if index not in self.upstream:
+            raise ValueError(f'ledger index {index} is not in the dependency graph')
+        self.status[index] = status
+        self.counts[old_status] = self.counts.get(old_status, 0) - 1
+        self.counts[status] = self.counts.get(status, 0) + 1
+        if status == 'succeeded' or old_status == 'succeeded':
+            change = -1 if status == 'succeeded' else 1
+            for downstream_index in self.downstream[index]:
+                self.remaining[downstream_index] += change
+                self.update_ready(downstream_index)
+        if status in failed_statuses:
+            self.failed_paths.add(self.directory[index])
+        elif old_status in failed_statuses:
+            directory = self.directory[index]
+            if not any(self.status[other] in failed_statuses for other in self.directories[directory]):
+                self.failed_paths.discard(directory)
+        self.update_ready(index)
+
+    def with_status(self, *statuses):
+        return [index for index, status in self.status.items() if status in statuses]
+
+    def downstream_of(self, indices, statuses=None):
+        '''
+        every job that depends on one of indices, directly or through other jobs,
+        found in one breadth-first walk. with statuses, the walk only enters jobs in those states
+        '''
+        seen = set(indices)
+        queue = collections.deque(indices)
+        found = []
+        while queue:
+            for downstream_index in self.downstream[queue.popleft()]:
+                if downstream_index in seen:
+                    continue
+                seen.add(downstream_index)
+                if statuses is not None and self.status[downstream_index] not in statuses:
+                    continue
+                found.append(downstream_index)
+                queue.append(downstream_index)
+        return found
+
+    def count(self, *statuses):
+        return sum(self.counts.get(status, 0) for status in statuses)
+
+    def files_ready(self, index):
+        '''
+        the on-disk part of a job's dependencies: the xyz file it will read
+        and the status of upstream jobs outside the ledger
+        '''
+        xyz_path = self.xyz_paths.get(index, None)
+        if xyz_path is not None and xyz_path not in self.verified:
+            if not os.path.exists(xyz_path):
+                return False
+            self.verified.add(xyz_path)
+        return self.external_ready(index)
+
+    def external_ready(self, index):
+        '''
+        True once every upstream job outside the ledger has succeeded
+        '''
+        for run_info_path in self.external[index]:
+            if run_info_path in self.verified:
+                continue
+            if not os.path.exists(run_info_path):
+                return False
+            with open(run_info_path, 'r') as run_info_f:
+                run_info = json.load(run_info_f)
+            if run_info['status'] != 'succeeded':
+                return False
+            self.verified.add(run_info_path)
+        return True
+
+    def dependencies_met(self, index):
+        return self.remaining[index] == 0 and self.files_ready(index)
+
+    def ready_jobs(self, limit=None):
+        '''
+        not_started jobs whose dependencies are all met, in ledger order
+        '''
+        jobs = []
+        for index in self.ready:
+            if limit is not None and len(jobs) >= limit:
+                break
+            if self.files_ready(index):
+                jobs.append(index)
+        return jobs
+
+    def chainable_jobs(self, active, limit=None):
+        '''
+        not_started jobs downstream of the jobs at active, in ledger order, whose
+        upstream jobs have all either succeeded or are in active. they can be queued
+        behind the active ones, see BatchRunner.queue_chained_jobs
+        '''
+        candidates = set()
+        for index in active:
+            candidates.update(self.downstream[index])
+        jobs = []
+        for index in sorted(candidates):
+            if limit is not None and len(jobs) >= limit:
+                break
+            if self.status[index] != 'not_started' or not self.external_ready(index):
+                continue
+            if all(upstream_index in active or self.status[upstream_index] == 'succeeded'
+                   for upstream_index in self.upstream[index]):
+                jobs.append(index)
+        return jobs
+
+    def mask(self, ledger):
+        '''
+        boolean Series over the ledger, True where a job's dependencies are met
+        '''
+        return pd.Series([self.dependencies_met(index) for index in ledger.index], index=ledger.index, dtype=bool)
@@ -1,8 +1,33 @@
+import io
+import os
 import re
+import gzip
+import json
+import mmap
+import shutil
+import codecs
+import locale
+import hashlib
+import collections
+import concurrent.futures
 import numpy as np
 import itertools as itt
 import logging as log
 
+import parse_cache
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import re._parser as sre_parser
+    import re._constants as sre_constants
+except ImportError: #python < 3.11
+    import sre_parse as sre_parser
+    import sre_constants
+
 #READ DATA FROM ONE FILE
 
 float_pattern = r'(-?\d+\.\d+)'
@@ -158,9 +183,8 @@ def hidden_operation(line, sr_flag=None, last_value=None, var_type=None, var_fla
                 if last_value is None:
                         log.debug('returning False')
                         return False
-                if last_value is False:
-                        log.debug('returning True')
-                        return True
+                log.debug('returning True')
+                return True
 
 
     
@@ -194,9 +218,10 @@ def make_test_and_procedure(search_rule, sr_flag=None, var_type = None, var_flag
 
 
 
-def read_rulesfile(rule_filename):
+def read_rule_fields(rule_filename):
     '''
-    function that makes a list of rules from the rulesfile
+    splits the rulesfile into a list of semicolon-delimited fields per rule,
+    skipping comments and blank lines
     '''
     with open(rule_filename, 'r') as rules_file:
             lines = rules_file.readlines()
@@ -216,6 +241,14 @@ def read_rulesfile(rule_filename):
             for match in rule_matches:
                 fields.append(match.group(1).strip())
             rules_found.append(fields)
+    return rules_found
+
+
+def read_rulesfile(rule_filename):
+    '''
+    function that makes a list of rules from the rulesfile
+    '''
+    rules_found = read_rule_fields(rule_filename)
 
 #to handle list_of syntax:
     variable_index_dict = dict ()
@@ -288,105 +321,1041 @@ def read_rulesfile(rule_filename):
 
 
 
+#COMPILED RULESETS
 
+#same precedence as the re.search chain in hidden_operation,
+#so a flag resolves to the same operation it always has.
+#array comes last: it collects every match into one numpy array
+operation_order = ('first', 'last', 'largest', 'smallest',
+                   'sum_all', 'found', 'not_found', 'at_least_2', 'array')
 
+default_var_regexes = {
+    'float' : re.compile(float_pattern),
+    'int' : re.compile(int_pattern),
+}
 
 
+def resolve_operation(sr_flag):
+    '''
+    returns the name of the operation hidden_operation would run for this flag
+    '''
+    for operation in operation_order:
+        if re.search(operation, sr_flag):
+            return operation
+    return None
 
 
+class CompiledRule:
+    '''
+    a single variable rule with its regexes compiled and its flag resolved
+    '''
+    def __init__(self, varname, search_regex, sr_flag, var_type=None, var_flag=None):
+        self.varname = varname
+        self.search_regex = search_regex
+        self.test = re.compile(search_regex)
+        self.flag = sr_flag
+        self.operation = resolve_operation(sr_flag)
+        self.is_list = bool(re.search('list', sr_flag))
+        self.var_type = var_type
+        self.var_flag = var_flag
+        self.var_regex = default_var_regexes.get(var_type)
+
+    def provides(self, varname):
+        '''
+        whether this rule writes varname, counting the numbered names of list rules
+        '''
+        if varname == self.varname:
+            return True
+        if not self.is_list:
+            return False
+        pattern = re.escape(self.varname).replace(re.escape('{}'), r'\d+')
+        return re.fullmatch(pattern, varname) is not None
 
+    def read_var(self, line):
+        return read_var_from_line(line, self.var_type, self.var_flag, self.var_regex)
 
+    def apply(self, line, last_value):
+        '''
+        same semantics as hidden_operation, without re-reading the flag every line
+        '''
+        operation = self.operation
+        if operation == 'first':
+            if last_value is None:
+                return self.read_var(line)
+            return last_value
+        if operation == 'last':
+            return self.read_var(line)
+        if operation == 'largest':
+            temp = self.read_var(line)
+            if last_value is None or temp > last_value:
+                return temp
+            return last_value
+        if operation == 'smallest':
+            temp = self.read_var(line)
+            if last_value is None or temp <= last_value:
+                return temp
+            return last_value
+        if operation == 'sum_all':
+            temp = self.read_var(line)
+            if last_value is None:
+                return temp
+            return temp + last_value
+        if operation == 'found':
+            return True
+        if operation == 'not_found':
+            return False
+        if operation == 'at_least_2':
+            #False after the first match, True from the second on
+            return last_value is not None
+        if operation == 'array':
+            #kept as a list while parsing, ParseState.result turns it into an array
+            if last_value is None:
+                last_value = []
+            last_value.append(self.read_var(line))
+            return last_value
+        return None
 
+    def default_value(self):
+        '''
+        value stored for this rule's variable when it never matched,
+        returns (store, value)
+        '''
+        if self.operation == 'array':
+            return True, self.to_array([])
+        if re.search('not_found', self.flag):
+            return True, True
+        if re.search('found', self.flag) or re.search('at_least_2', self.flag):
+            return True, False
+        if not self.is_list:
+            return True, None
+        return False, None
+
+    def to_array(self, values):
+        dtype = int if self.var_type == 'integer' else float
+        return np.array(values, dtype=dtype)
+
+
+class CompiledRuleset:
+    '''
+    a rulesfile compiled once into regexes and a per-section dispatch table.
+    sections maps a working key to the rules defined under it,
+    dispatch maps a working key to every rule checked while that key is active.
+    '''
+    def __init__(self, rule_filename=None):
+        self.path = rule_filename
+        self.digest = None #content hash of the rulesfile
+        self.sections = {'__normal__' : []}
+        self.after = [] #(compiled regex, working key)
+        self.before = [] #compiled regex
+        self.dispatch = {}
+        self.selections = {} #field-selective copies, see select()
+        if rule_filename is not None:
+            with open(rule_filename, 'rb') as rules_file:
+                self.digest = hashlib.sha1(rules_file.read()).hexdigest()
+            self.compile(read_rule_fields(rule_filename))
+
+    def compile(self, rules_found):
+        section_key = '__normal__'
+        for rule_fields in rules_found:
+            varname = rule_fields[0]
+            search_regex = rule_fields[1]
+            if varname == '__after__':
+                if len(rule_fields) != 2:
+                    raise ValueError("need two fields in control flow rule\n")
+                self.after.append((re.compile(search_regex), search_regex))
+                self.sections.setdefault(search_regex, [])
+                section_key = search_regex
+            elif varname == '__before__':
+                if len(rule_fields) != 2:
+                    raise ValueError("need exactly two fields in control flow rule\n")
+                self.before.append(re.compile(search_regex))
+                section_key = '__normal__'
+            else:
+                if len(rule_fields) < 3:
+                    print(rule_fields)
+                    raise ValueError("^ rule formatted incorrectly\n")
+                if len(rule_fields) > 5:
+                    raise ValueError(str(len(rule_fields)) +" fields found in rule line.\n" )
+                rule = CompiledRule(*rule_fields)
+                rule.section = section_key
+                self.sections[section_key].append(rule)
+        self.build_dispatch()
+        return self
+
+    def build_dispatch(self):
+        normal_rules = self.sections['__normal__']
+        self.dispatch = {
+            key : (normal_rules if key == '__normal__' else normal_rules + rules)
+            for key, rules in self.sections.items()
+        }
+
+    def rules(self):
+        for rules in self.sections.values():
+            yield from rules
+
+    def select(self, fields):
+        '''
+        copy of this ruleset with only the rules that write the given variables.
+        the section markers are kept only if one of those rules is scoped to a section,
+        since markers only decide which section's rules run
+        '''
+        key = tuple(sorted(set(fields)))
+        selected = self.selections.get(key)
+        if selected is not None:
+            return selected
+        unknown = [field for field in key if not any(rule.provides(field) for rule in self.rules())]
+        if unknown:
+            raise ValueError(f"fields not defined in {self.path}: {', '.join(unknown)}")
+
+        selected = CompiledRuleset()
+        selected.path = self.path
+        if self.digest is not None:
+            selected.digest = hashlib.sha1(f"{self.digest}|{','.join(key)}".encode()).hexdigest()
+        selected.sections = {
+            section_key : [rule for rule in rules if any(rule.provides(field) for field in key)]
+            for section_key, rules in self.sections.items()
+        }
+        if any(rules for section_key, rules in selected.sections.items() if section_key != '__normal__'):
+            selected.after = self.after
+            selected.before = self.before
+        selected.build_dispatch()
+        self.selections[key] = selected
+        return selected
+
+    def new_state(self):
+        return ParseState(self)
+
+    def parse_lines(self, lines):
+        state = self.new_state()
+        for line in lines:
+            state.feed(line)
+        return state.result()
+
+    def scan_plan(self):
+        if not hasattr(self, 'plan'):
+            self.plan = scan_plan(self)
+        return self.plan
+
+    def parse_file(self, read_filename, chunk_size=None):
+        read_filename = resolve_output(read_filename)
+        if chunk_size is None and not is_compressed(read_filename)\
+        and os.path.getsize(read_filename) >= MAPPED_MIN_BYTES:
+            file_data = None
+            if self.after and not self.sections['__normal__']:
+                #only section rules, e.g. a field selection: seek to the sections
+                file_data = parse_sections(self, read_filename)
+            if file_data is None:
+                file_data = parse_mapped(self, read_filename)
+            if file_data is not None:
+                return file_data
+        return self.parse_lines(iter_lines(read_filename, chunk_size))
+
+
+class ParseState:
+    '''
+    the running accumulators of one parse: the working section key,
+    the variables found so far and the counters behind list-flag variables
+    '''
+    def __init__(self, ruleset):
+        self.ruleset = ruleset
+        self.working_key = '__normal__'
+        self.file_data = dict()
+        self.list_var_integers = dict()
+        #sections this parse has switched into and out of
+        self.sections_entered = set()
+        self.sections_left = set()
+        #for incremental parses: bytes of the file consumed so far,
+        #and the (device, inode) of the file they came from
+        self.offset = 0
+        self.identity = None
+
+    def copy(self):
+        new_state = ParseState(self.ruleset)
+        new_state.working_key = self.working_key
+        #array rules append to their lists in place, so those are copied too
+        new_state.file_data = {
+            varname : (list(value) if isinstance(value, list) else value)
+            for varname, value in self.file_data.items()
+        }
+        new_state.list_var_integers = dict(self.list_var_integers)
+        new_state.sections_entered = set(self.sections_entered)
+        new_state.sections_left = set(self.sections_left)
+        new_state.offset = self.offset
+        new_state.identity = self.identity
+        return new_state
+
+    def feed(self, line):
+        ruleset = self.ruleset
+        file_data = self.file_data
+        for rule in ruleset.dispatch[self.working_key]:
+            if rule.test.search(line):
+                varname = rule.varname
+                if rule.is_list:
+                    count = self.list_var_integers.get(varname, 0) + 1
+                    self.list_var_integers[varname] = count
+                    varname = varname.format(str(count))
+                file_data[varname] = rule.apply(line, file_data.get(varname))
+
+        working_key = self.working_key
+        for test in ruleset.before:
+            if test.search(line):
+                working_key = '__normal__'
 
+        for test, search_key in ruleset.after:
+            if test.search(line):
+                working_key = search_key
 
+        if working_key != self.working_key:
+            self.sections_left.add(self.working_key)
+            self.sections_entered.add(working_key)
+            self.working_key = working_key
+
+    def value(self, varname):
+        '''
+        value of a variable as result() would report it
+        '''
+        value = self.file_data.get(varname, None)
+        if value is None:
+            for rule in self.ruleset.rules():
+                if rule.varname == varname:
+                    store, default = rule.default_value()
+                    if store:
+                        value = default
+        return value
+
+    def result(self):
+        '''
+        copy of the data with defaults filled in for variables that never matched
+        '''
+        file_data = dict(self.file_data)
+        for rule in self.ruleset.rules():
+            if file_data.get(rule.varname, None) is None:
+                store, value = rule.default_value()
+                if store:
+                    file_data[rule.varname] = value
+            elif rule.operation == 'array' and isinstance(file_data[rule.varname], list):
+                file_data[rule.varname] = rule.to_array(file_data[rule.varname])
+        if not file_data:
+            raise ValueError('No data read from file!')
+        return file_data
+
+
+#compiled rulesets keyed by absolute path,
+#each stored with the (mtime, size) of the rulesfile it was compiled from
+compiled_rulesets = dict()
+
+def get_ruleset(rule_filename):
+    '''
+    returns the CompiledRuleset for a rulesfile,
+    compiling it only if it is new or has changed on disk
+    '''
+    if isinstance(rule_filename, CompiledRuleset):
+        return rule_filename
+    path = os.path.abspath(rule_filename)
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    cached = compiled_rulesets.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    ruleset = CompiledRuleset(path)
+    compiled_rulesets[path] = (stamp, ruleset)
+    return ruleset
 
 
-def extract_data(read_filename, ruleset_filename = "data/rules/GAU.rules"):
+def clear_ruleset_cache():
+    compiled_rulesets.clear()
+
+
+#outputs are read through a buffer of this many bytes at a time,
+#so memory use does not grow with the size of the file
+STREAM_CHUNK_BYTES = 1024 * 1024
+
+def iter_lines(read_filename, chunk_size=None):
+    '''
+    yields the lines of a file one at a time, reading it in chunks.
+    a compressed copy (see resolve_output) is read if the file itself is gone
     '''
+    if chunk_size is None:
+        chunk_size = STREAM_CHUNK_BYTES
+    with open_output(read_filename, chunk_size) as input:
+        for line in input:
+            yield line
 
+
+#COMPRESSED OUTPUTS
+
+# Finished outputs may be replaced by {output}.gz or {output}.zst (compress_output).
+# Everything that reads outputs through this module looks for those when the
+# plain file is missing, so callers keep using the uncompressed name.
+compressed_extensions = ('.gz', '.zst')
+
+def resolve_output(read_filename):
     '''
-    #some storage data type
-    #log.debug ('porque')
-    with open(read_filename, 'r') as input:
-        lines = input.readlines()
-    
-    file_data = dict() #dict of varname : returned data
-    rules_dict = read_rulesfile(ruleset_filename)
-    working_key = '__normal__'
-    line_index = 0
-    
-    ##print('starting extract_data')
-     ##print(rules_dict)  
-    list_var_integers = dict()
+    the file on disk holding this output: the file itself, else a compressed copy.
+    returns read_filename unchanged if neither exists
+    '''
+    if os.path.exists(read_filename) or read_filename.endswith(compressed_extensions):
+        return read_filename
+    for extension in compressed_extensions:
+        if os.path.exists(read_filename + extension):
+            return read_filename + extension
+    return read_filename
 
-    for line in lines:
-        line_index += 1
-        ##print(line_index)
-
-        ##print('using key: ' + working_key)
-        #log.debug(len(rules_list))        #consider always checking normal ones and only checking special ones if working key for them used
-        current_rules = [action for action in rules_dict['__normal__']]
-        if working_key != '__normal__':
-            current_rules += [action for action in rules_dict[working_key]]
-        for action in current_rules:
-            ##print('checking working key')
-            #log.debug ('gets to action')
-            varname = action[0]
-            line_test = action[1]
-            operation = action[2]
-            flag = action[3]
-            #list syntax
-            #need this to not save the variable format...
-            if line_test(line):
-                if re.search("list", flag):
-                    if list_var_integers.get(varname) is None:
-                        list_var_integers[varname] = 0
-                    list_var_integers[varname] += 1
-                    varname = varname.format(str(list_var_integers[varname]))
-
-                #print('storing key ' + varname + ' in file_data')
-                file_data[varname] = operation(line, file_data.get(varname))
-                #log.debug('stored stuff in key: ' + '|' +varname+'|')
-
-        for action in rules_dict['__before__']:
-            varname = action[0]
-            line_test = action[1]
-            search_key = action[2]
-            if line_test(line):
-                working_key = '__normal__'
 
-        for action in rules_dict['__after__']:
-            varname = action[0]
-            line_test = action[1]
-            search_key = action[2]
-            if line_test(line):
-                #for all the after and before rules, action[2] is the new working key
-                #instead of a variable setting function
-                working_key = search_key
+def output_exists(read_filename):
+    return os.path.exists(resolve_output(read_filename))
 
-#at end of lines, check None values to see what to do with them
-    for key in rules_dict:
-        if key != '__after__' and key != '__before__':
-            for action in rules_dict[key]:
-                varname = action[0]
-                flag = action[3]
-                if file_data.get(varname,None) is None:
-                    #print('varname not used in file_data yet')
-                    if re.search('not_found',flag):
-                        #print('not_found in flag')
-                        #print('storing key ' + varname + ' in file_data')
-                        file_data[varname] = True
-                    elif re.search('found', flag) or re.search('at_least_2', flag):
-                        #print('found or at_least_2 in flag')
-                        #print('storing key ' + varname + ' in file_data')
-                        file_data[varname] = False
-                    #right here is where list syntax goes bad.
-                    #fixed by adding check re.search
-                    elif not re.search('list', flag):
-                        #print('list not in flag')
-                        #print('storing key ' + varname + ' in file_data')
-                        file_data[varname] = None
-    if not file_data:
-        raise ValueError('No data read from file!')
-        
+
+def is_compressed(read_filename):
+    return resolve_output(read_filename).endswith(compressed_extensions)
+
+
+def open_output(read_filename, chunk_size=None):
+    '''
+    opens an output for reading text, decompressing .gz and .zst on the fly
+    '''
+    if chunk_size is None:
+        chunk_size = STREAM_CHUNK_BYTES
+    path = resolve_output(read_filename)
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt')
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError(f"zstandard is needed to read {path}, install it with pip install zstandard")
+        return zstandard.open(path, 'rt')
+    return open(path, 'r', buffering=chunk_size)
+
+
+def compress_output(read_filename, method='gz'):
+    '''
+    replaces a finished output with {read_filename}.{method}, returns the new path.
+    the copy is written under a temporary name and renamed into place before the
+    original is removed, so readers always find one complete version
+    '''
+    if method not in ('gz', 'zst'):
+        raise ValueError(f"unknown compression method: {method}")
+    if method == 'zst' and zstandard is None:
+        raise RuntimeError("zstandard is needed to write .zst outputs, install it with pip install zstandard")
+    if not os.path.exists(read_filename):
+        return resolve_output(read_filename)
+    target = f"{read_filename}.{method}"
+    partial = target + '.part'
+    with open(read_filename, 'rb') as input:
+        if method == 'gz':
+            output = gzip.open(partial, 'wb', compresslevel=6)
+        else:
+            output = zstandard.open(partial, 'wb')
+        with output:
+            shutil.copyfileobj(input, output, STREAM_CHUNK_BYTES)
+    shutil.copystat(read_filename, partial)
+    os.replace(partial, target)
+    os.remove(read_filename)
+    parse_cache.invalidate(read_filename)
+    section_indexes.pop(os.path.abspath(read_filename), None)
+    if os.path.exists(section_index_path(read_filename)):
+        os.remove(section_index_path(read_filename))
+    return target
+
+
+#MAPPED SCANNING
+
+# Outputs of at least MAPPED_MIN_BYTES are memory-mapped, and only candidate lines are
+# fed to the rules: lines holding a literal that some rule or section marker requires,
+# plus every line of a section whose rules have no such literal. A line matching no
+# rule and no marker leaves the parse state untouched, so skipping it is exact.
+MAPPED_MIN_BYTES = 1024 * 1024
+MIN_LITERAL_LENGTH = 3 #shorter literals match too many lines to be worth it
+
+#encodings in which the bytes of an ascii literal only ever mean that literal
+ascii_compatible_encodings = ('utf-8', 'ascii', 'iso8859-1', 'cp1252')
+
+
+def line_encoding():
+    '''
+    encoding text-mode reads use, or None if byte offsets of ascii text can't be trusted in it
+    '''
+    encoding = codecs.lookup(locale.getpreferredencoding(False)).name
+    if encoding not in ascii_compatible_encodings:
+        return None
+    return encoding
+
+
+def literal_run(items):
+    '''
+    longest run of consecutive ascii characters every match of this sequence must contain
+    '''
+    best = ''
+    run = ''
+    for opcode, value in items:
+        if opcode == sre_constants.LITERAL and value < 128:
+            run += chr(value)
+            continue
+        if len(run) > len(best):
+            best = run
+        run = ''
+        if opcode == sre_constants.SUBPATTERN:
+            group, add_flags, del_flags, sub_items = value
+            if not add_flags and not del_flags:
+                inner = literal_run(sub_items)
+                if len(inner) > len(best):
+                    best = inner
+    if len(run) > len(best):
+        best = run
+    return best
+
+
+def required_literal(pattern):
+    '''
+    (literal, ignore_case) that must appear in any line the pattern matches,
+    or None if there is no usable literal
+    '''
+    try:
+        parsed = sre_parser.parse(pattern)
+    except Exception:
+        return None
+    literal = literal_run(list(parsed))
+    if len(literal) < MIN_LITERAL_LENGTH:
+        return None
+    return literal, bool(parsed.state.flags & re.IGNORECASE)
+
+
+def scan_plan(ruleset):
+    '''
+    (literals, dense_keys) for scanning with this ruleset, where dense_keys are the
+    sections whose every line must be read, or None if it can only be read line by line
+    '''
+    literals = set()
+    dense_keys = set()
+    markers = [test.pattern for test in ruleset.before] + [test.pattern for test, key in ruleset.after]
+    for pattern in markers:
+        found = required_literal(pattern)
+        if found is None:
+            return None
+        literals.add(found)
+    for section_key, rules in ruleset.sections.items():
+        for rule in rules:
+            found = required_literal(rule.search_regex)
+            if found is not None:
+                literals.add(found)
+            elif section_key == '__normal__':
+                return None #would have to test every line of the file
+            else:
+                dense_keys.add(section_key)
+    return literals, dense_keys
+
+
+def candidate_offsets(mapped, literals):
+    '''
+    sorted start offsets of the lines that hold one of the literals, or any non-ascii byte
+    '''
+    searches = [re.compile(rb'[\x80-\xff]')]
+    for literal, ignore_case in literals:
+        if ignore_case:
+            searches.append(re.compile(re.escape(literal.encode('ascii')), re.IGNORECASE))
+        else:
+            searches.append(literal.encode('ascii'))
+    starts = set()
+    for search in searches:
+        position = 0
+        while True:
+            if isinstance(search, bytes):
+                found = mapped.find(search, position)
+            else:
+                match = search.search(mapped, position)
+                found = match.start() if match else -1
+            if found == -1:
+                break
+            start = mapped.rfind(b'\n', 0, found) + 1
+            starts.add(start)
+            end = mapped.find(b'\n', found)
+            if end == -1:
+                break
+            position = end + 1 #the rest of this line is already a candidate
+    return sorted(starts)
+
+
+def parse_mapped(ruleset, read_filename):
+    '''
+    parses read_filename with a memory map and the ruleset's scan plan,
+    returns None when the file or the ruleset can't be scanned this way
+    '''
+    plan = ruleset.scan_plan()
+    encoding = line_encoding()
+    if plan is None or encoding is None:
+        return None
+    literals, dense_keys = plan
+    with open(read_filename, 'rb') as input:
+        with mmap.mmap(input.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if mapped.find(b'\r') != -1:
+                return None #text mode would translate these, leave it to the line reader
+            size = len(mapped)
+            state = ruleset.new_state()
+            position = 0 #everything before this has been fed or skipped
+            for start in candidate_offsets(mapped, literals):
+                if start < position:
+                    continue
+                position = start
+                while True:
+                    end = mapped.find(b'\n', position)
+                    end = size if end == -1 else end + 1
+                    state.feed(mapped[position:end].decode(encoding))
+                    position = end
+                    # inside a section with literal-free rules, read on line by line
+                    if state.working_key not in dense_keys or position >= size:
+                        break
+            return state.result()
+
+
+#SECTION INDEX
+
+# The byte offset of every line of a finished output matching the header patterns
+# asked for so far. Indexes of the most recently read outputs are kept in memory and
+# rebuilt when an output's size or mtime changes. Readers use them to seek straight
+# to a section instead of streaming the whole output again. Only with persist=True
+# is the index also saved as {output}.sections.json next to the output, where
+# later processes read it back.
+
+SECTION_INDEX_ENTRIES = 256 #outputs whose index is kept in memory
+section_indexes = collections.OrderedDict() #absolute output path : index
+
+
+def section_index_path(read_filename):
+    return read_filename + '.sections.json'
+
+
+def scan_offsets(mapped, patterns, encoding):
+    '''
+    {pattern: [start offsets of the lines it matches]} in one pass over the mapped file
+    '''
+    tests = {pattern : re.compile(pattern) for pattern in patterns}
+    literals = {pattern : required_literal(pattern) for pattern in patterns}
+    offsets = {pattern : [] for pattern in patterns}
+    size = len(mapped)
+    if all(literals.values()):
+        starts = candidate_offsets(mapped, set(literals.values()))
+    else:
+        #a pattern without a literal has to be tested on every line
+        starts = [0] + [match.end() for match in re.finditer(rb'\n', mapped) if match.end() < size]
+    for start in starts:
+        end = mapped.find(b'\n', start)
+        end = size if end == -1 else end + 1
+        line = mapped[start:end].decode(encoding)
+        for pattern, test in tests.items():
+            if test.search(line):
+                offsets[pattern].append(start)
+    return offsets
+
+
+def section_offsets(read_filename, patterns, persist=False):
+    '''
+    {pattern: [byte offsets of the lines it matches]} for a finished output,
+    read from its section index and added to it when a pattern is new.
+    with persist, the index is saved next to the output as well.
+    returns None for outputs that can't be read by offset (compressed, or with \\r line ends)
+    '''
+    encoding = line_encoding()
+    path = resolve_output(read_filename)
+    if encoding is None or is_compressed(path) or not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    index_path = section_index_path(path)
+    key = os.path.abspath(path)
+    index = section_indexes.get(key, None)
+    if index is None and os.path.exists(index_path):
+        try:
+            with open(index_path, 'r') as index_file:
+                index = json.load(index_file)
+        except (OSError, ValueError):
+            index = None
+    if index is not None and (index.get('size') != stat.st_size or index.get('mtime_ns') != stat.st_mtime_ns):
+        index = None
+    if index is None:
+        index = {'size' : stat.st_size, 'mtime_ns' : stat.st_mtime_ns, 'has_cr' : False, 'offsets' : {}}
+    if index['has_cr']:
+        return None
+
+    missing = [pattern for pattern in patterns if pattern not in index['offsets']]
+    if missing:
+        if stat.st_size == 0:
+            index['offsets'].update({pattern : [] for pattern in missing})
+        else:
+            with open(path, 'rb') as input:
+                with mmap.mmap(input.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    if mapped.find(b'\r') != -1:
+                        index['has_cr'] = True
+                    else:
+                        index['offsets'].update(scan_offsets(mapped, missing, encoding))
+    if persist and (missing or not os.path.exists(index_path)):
+        try:
+            partial = index_path + '.part'
+            with open(partial, 'w') as index_file:
+                json.dump(index, index_file)
+            os.replace(partial, index_path)
+        except OSError:
+            pass #read-only directory, the offsets are still good for this process
+    section_indexes[key] = index
+    section_indexes.move_to_end(key)
+    while len(section_indexes) > SECTION_INDEX_ENTRIES:
+        section_indexes.popitem(last=False)
+    if index['has_cr']:
+        return None
+    return {pattern : index['offsets'][pattern] for pattern in patterns}
+
+
+def iter_lines_at(read_filename, offset, end=None):
+    '''
+    yields the lines of an uncompressed output starting at byte offset offset,
+    stopping before byte offset end
+    '''
+    with open(resolve_output(read_filename), 'rb') as input:
+        input.seek(offset)
+        position = offset
+        for raw in input:
+            if end is not None and position >= end:
+                break
+            position += len(raw)
+            yield raw.decode(line_encoding() or 'utf-8')
+
+
+def iter_lines_from_last(read_filename, patterns, persist=False):
+    '''
+    lines of a finished output from the last line matching any of the patterns on.
+    for loops that start over at every header and only keep the last section.
+    yields the whole file if there's no section index for it, and nothing if no line matches
+    '''
+    offsets = section_offsets(read_filename, patterns, persist=persist)
+    if offsets is None:
+        yield from iter_lines(read_filename)
+        return
+    starts = [start for pattern in patterns for start in offsets[pattern]]
+    if starts:
+        yield from iter_lines_at(read_filename, max(starts))
+
+
+def parse_sections(ruleset, read_filename):
+    '''
+    parse with a ruleset whose rules all sit in __after__ sections: only the marker
+    lines and the lines of sections with rules are read, located with the section index.
+    returns None if the output has no section index
+    '''
+    markers = [test.pattern for test in ruleset.before] + [test.pattern for test, key in ruleset.after]
+    offsets = section_offsets(read_filename, markers)
+    if offsets is None:
+        return None
+    encoding = line_encoding()
+    marker_starts = sorted(set(start for pattern in markers for start in offsets[pattern]))
+    dense_keys = set(key for key, rules in ruleset.sections.items() if rules and key != '__normal__')
+    state = ruleset.new_state()
+    with open(resolve_output(read_filename), 'rb') as input:
+        for number, start in enumerate(marker_starts):
+            end = marker_starts[number + 1] if number + 1 < len(marker_starts) else None
+            input.seek(start)
+            state.feed(input.readline().decode(encoding))
+            if state.working_key not in dense_keys:
+                continue
+            while end is None or input.tell() < end:
+                raw = input.readline()
+                if not raw:
+                    break
+                state.feed(raw.decode(encoding))
+    return state.result()
+
+
+def extract_data(read_filename, ruleset_filename = "data/rules/GAU.rules", fields=None, use_cache=True):
+    '''
+    parses an output file with the rules in ruleset_filename,
+    which may also be an already compiled ruleset.
+    if fields is given, only the rules for those variables are evaluated
+    and only those variables are returned.
+    the file is streamed, never held in memory as a whole.
+    with the on-disk parse cache turned on (see parse_cache.py), results are
+    kept there and reused while the output and the ruleset are unchanged.
+    '''
+    read_filename = resolve_output(read_filename)
+    ruleset = get_ruleset(ruleset_filename)
+    if fields is not None:
+        ruleset = ruleset.select(fields)
+    cache = parse_cache.get_default_cache() if use_cache and ruleset.digest else None
+    if cache is not None:
+        file_data = cache.get(read_filename, ruleset)
+        if file_data is not None:
+            return file_data
+    file_data = ruleset.parse_file(read_filename)
+    if cache is not None:
+        cache.put(read_filename, ruleset, file_data)
     return file_data
+
+
+#ARRAY OUTPUT
+
+# Parsed data can hold numpy arrays (array flag rules), which json can't store.
+# write_data_json puts them in a compressed .arrays.npz next to the json file,
+# leaving {"__array__": key, "shape": [...]} in the json where each one was.
+
+def arrays_path(json_path):
+    return os.path.splitext(json_path)[0] + '.arrays.npz'
+
+
+def jsonable(value):
+    '''
+    json.dumps default for parsed data when it only needs to be printed
+    '''
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def write_data_json(data, json_path, **json_kwargs):
+    '''
+    json.dump for parsed data, writing any numpy arrays to the .arrays.npz sidecar
+    '''
+    arrays = dict()
+    def to_json(value):
+        if isinstance(value, np.ndarray):
+            key = f"array_{len(arrays)}"
+            arrays[key] = value
+            return {'__array__' : key, 'shape' : list(value.shape)}
+        if isinstance(value, np.generic):
+            return value.item()
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+    text = json.dumps(data, default=to_json, **json_kwargs)
+    if arrays:
+        np.savez_compressed(arrays_path(json_path), **arrays)
+    with open(json_path, 'w') as json_file:
+        json_file.write(text)
+
+
+def read_data_json(json_path):
+    '''
+    json.load for files written by write_data_json, with the arrays put back
+    '''
+    arrays = None
+    def from_json(obj):
+        nonlocal arrays
+        if '__array__' not in obj:
+            return obj
+        if arrays is None:
+            with np.load(arrays_path(json_path)) as npz:
+                arrays = dict(npz)
+        return arrays[obj['__array__']]
+    with open(json_path, 'r') as json_file:
+        return json.load(json_file, object_hook=from_json)
+
+
+#BULK EXTRACTION
+
+def available_cpus():
+    '''
+    cpus this process may run on, which under slurm is the allocation, not the node
+    '''
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def extract_or_error(job):
+    '''
+    worker for extract_many: the parse result, or the exception that stopped it
+    '''
+    read_filename, ruleset_filename, fields = job
+    try:
+        return extract_data(read_filename, ruleset_filename, fields=fields)
+    except Exception as e:
+        return e
+
+
+def extract_many(read_filenames, ruleset_filename, fields=None, workers=None, chunksize=None):
+    '''
+    extract_data over many outputs on a process pool.
+    ruleset_filename is either one ruleset for every file or a list with one per file.
+    results come back in the order of read_filenames; a file that could not be parsed
+    gives the exception it raised instead of a dict, so one bad output doesn't stop the rest.
+    workers defaults to the number of available cpus, and workers=1 parses in this process.
+    '''
+    read_filenames = list(read_filenames)
+    if isinstance(ruleset_filename, (list, tuple)):
+        if len(ruleset_filename) != len(read_filenames):
+            raise ValueError(f"got {len(ruleset_filename)} rulesets for {len(read_filenames)} files")
+        rulesets = list(ruleset_filename)
+    else:
+        rulesets = [ruleset_filename] * len(read_filenames)
+    jobs = [(read_filename, ruleset, fields) for read_filename, ruleset in zip(read_filenames, rulesets)]
+
+    if workers is None:
+        workers = available_cpus()
+    workers = min(workers, len(jobs))
+    if workers <= 1:
+        return [extract_or_error(job) for job in jobs]
+    if chunksize is None:
+        #a few chunks per worker keeps them busy when file sizes are uneven
+        chunksize = max(1, len(jobs) // (workers * 4))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(extract_or_error, jobs, chunksize=chunksize))
+
+
+#STATUS PROBE
+
+PROBE_HEAD_BYTES = 64 * 1024
+PROBE_TAIL_BYTES = 256 * 1024
+
+def window_lines(data, drop_first=False, drop_last=False):
+    '''
+    lines of a byte window cut out of a file.
+    partial lines at the cut edges are dropped.
+    '''
+    if drop_first:
+        index = data.find(b'\n')
+        data = data[index + 1:] if index != -1 else b''
+    if drop_last:
+        index = data.rfind(b'\n')
+        data = data[:index + 1]
+    return io.TextIOWrapper(io.BytesIO(data))
+
+
+def at_least_2_matches(value):
+    '''
+    lower bound on how many times an at_least_2 rule matched, from the value it left
+    '''
+    if value is None:
+        return 0
+    return 2 if value else 1
+
+
+def probe_data(read_filename, ruleset_filename, head_fields=(), tail_fields=(),
+               tail_anchors=None, head_bytes=None, tail_bytes=None):
+    '''
+    cheap partial parse for status checks. only the first head_bytes and the
+    last tail_bytes of the file are read, and only variables whose values
+    those windows settle are returned:
+      - found-flag variables that matched in either window (always True)
+      - at_least_2 variables matched twice across the two windows (always True)
+      - head_fields, read from the head window. the value in the head is
+        taken as the value for the file. section-scoped rules only count
+        if their section was opened and closed inside the head. a found
+        rule outside any section that did not match in the head is not settled,
+        it may still match further down.
+      - tail_fields, read from the tail window the same way. section-scoped
+        rules only count if their section was opened inside the tail.
+      - tail_anchors, {variable: anchor variable} for variables that can only
+        match after the anchor's line. they are read from the tail window
+        once the anchor's value there is true.
+    every other variable is left out, so a caller indexing the result raises
+    KeyError exactly when it needs something the probe could not settle.
+    files that fit inside both windows are parsed in full.
+    '''
+    if head_bytes is None:
+        head_bytes = PROBE_HEAD_BYTES
+    if tail_bytes is None:
+        tail_bytes = PROBE_TAIL_BYTES
+    if tail_anchors is None:
+        tail_anchors = {}
+    ruleset = get_ruleset(ruleset_filename)
+    read_filename = resolve_output(read_filename)
+    if is_compressed(read_filename):
+        #no cheap seek to the tail, and a full parse settles every variable
+        return extract_data(read_filename, ruleset)
+    size = os.path.getsize(read_filename)
+    if size <= head_bytes + tail_bytes:
+        return ruleset.parse_file(read_filename)
+
+    with open(read_filename, 'rb') as input:
+        head = input.read(head_bytes)
+        input.seek(size - tail_bytes)
+        tail = input.read(tail_bytes)
+
+    head_state = ruleset.new_state()
+    for line in window_lines(head, drop_last=True):
+        head_state.feed(line)
+    tail_state = ruleset.new_state()
+    for line in window_lines(tail, drop_first=True):
+        tail_state.feed(line)
+
+    rules_by_var = dict()
+    for rule in ruleset.rules():
+        if not rule.is_list:
+            rules_by_var.setdefault(rule.varname, []).append(rule)
+
+    probe = dict()
+    for varname, rules in rules_by_var.items():
+        if varname in head_fields:
+            if all(rule.section == '__normal__' or rule.section in head_state.sections_left
+                   for rule in rules):
+                value = head_state.value(varname)
+                if value or not all(rule.operation == 'found' and rule.section == '__normal__'
+                                    for rule in rules):
+                    probe[varname] = value
+                    continue
+        if varname in tail_fields:
+            if all(rule.section == '__normal__' or rule.section in tail_state.sections_entered
+                   for rule in rules):
+                probe[varname] = tail_state.value(varname)
+                continue
+        anchor = tail_anchors.get(varname, None)
+        if anchor is not None and tail_state.value(anchor):
+            probe[varname] = tail_state.value(varname)
+            continue
+        if all(rule.operation == 'found' for rule in rules):
+            if head_state.file_data.get(varname) or tail_state.file_data.get(varname):
+                probe[varname] = True
+        elif len(rules) == 1 and rules[0].operation == 'at_least_2':
+            #the windows don't overlap, so their matches add up
+            if at_least_2_matches(head_state.file_data.get(varname))\
+            + at_least_2_matches(tail_state.file_data.get(varname)) >= 2:
+                probe[varname] = True
+    return probe
+
+
+#INCREMENTAL PARSING
+
+def extract_data_incremental(read_filename, ruleset_filename, state=None):
+    '''
+    parses a file that may still be growing, picking up where a previous
+    call left off. returns (data, state); pass state back in on the next call
+    and only the bytes appended since then are read.
+    the state is discarded and the file parsed from the start if the ruleset
+    changed, or if the file was replaced or truncated.
+    only complete lines are consumed into the state; a trailing partial line
+    is parsed into the returned data but read again next time.
+    '''
+    ruleset = get_ruleset(ruleset_filename)
+    read_filename = resolve_output(read_filename)
+    stat = os.stat(read_filename)
+    identity = (stat.st_dev, stat.st_ino)
+    if is_compressed(read_filename):
+        #compressed outputs are finished; offset holds the compressed size parsed
+        if state is None or state.ruleset is not ruleset\
+        or state.identity != identity or stat.st_size != state.offset:
+            state = ruleset.new_state()
+            state.identity = identity
+            for line in iter_lines(read_filename):
+                state.feed(line)
+            state.offset = stat.st_size
+        return state.result(), state
+    if state is None or state.ruleset is not ruleset\
+    or state.identity != identity or stat.st_size < state.offset:
+        state = ruleset.new_state()
+        state.identity = identity
+
+    pending = b''
+    with open(read_filename, 'rb') as input:
+        input.seek(state.offset)
+        while True:
+            chunk = input.read(STREAM_CHUNK_BYTES)
+            if not chunk:
+                break
+            chunk = pending + chunk
+            index = chunk.rfind(b'\n')
+            if index == -1:
+                pending = chunk
+                continue
+            complete, pending = chunk[:index + 1], chunk[index + 1:]
+            for line in window_lines(complete):
+                state.feed(line)
+            state.offset += len(complete)
+
+    if pending:
+        final_state = state.copy()
+        for line in window_lines(pending):
+            final_state.feed(line)
+        return final_state.result(), state
+    return state.result(), state
@@ -0,0 +1,124 @@
+import os
+import re
+
+import file_parser
+
+#SNAPSHOT
+
+# One os.scandir per job directory per sweep, in place of the listdir and the
+# several exists calls each job's status check made on its own. On network
+# filesystems every metadata call costs milliseconds, a readdir costs about one.
+#
+# Only directories passed to scan are known; asked about anything else,
+# knows() is False and callers go to the filesystem as before.
+
+slurm_pattern = re.compile(r'(?:slurm-)(\d+)(?:\.out)')
+#files whose size and mtime are recorded: program outputs, their compressed copies and run_info.json
+output_extensions = tuple(extension + compressed for extension in ('.out', '.log')
+                          for compressed in ('',) + file_parser.compressed_extensions)
+
+
+class FilesystemSnapshot:
+    '''
+    names, slurm job ids and output sizes/mtimes of a set of directories,
+    each read with a single os.scandir
+    '''
+    def __init__(self, directories=None, **kwargs):
+        self.debug = kwargs.get('debug', False)
+        self.names = {} #absolute directory : set of file names, None if the directory is missing
+        self.slurm_ids = {} #absolute directory : job ids of its slurm-*.out files
+        self.stats = {} #absolute directory : {output or run_info.json : (size, mtime_ns)}
+        if directories is not None:
+            self.scan(directories)
+
+    def scan(self, directories):
+        for directory in set(os.path.abspath(directory) for directory in directories):
+            names = set()
+            slurm_ids = []
+            stats = {}
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        names.add(entry.name)
+                        match = slurm_pattern.match(entry.name)
+                        if match:
+                            slurm_ids.append(int(match.group(1)))
+                        elif entry.name.endswith(output_extensions) or entry.name == 'run_info.json':
+                            stat = entry.stat()
+                            stats[entry.name] = (stat.st_size, stat.st_mtime_ns)
+            except (FileNotFoundError, NotADirectoryError):
+                names = None
+            self.names[directory] = names
+            self.slurm_ids[directory] = slurm_ids
+            self.stats[directory] = stats
+        if self.debug: print(f"filesystem snapshot: {len(self.names)} directories")
+        return self
+
+    def subset(self, directory):
+        '''
+        a snapshot of one directory, small enough to send to a worker process
+        '''
+        directory = os.path.abspath(directory)
+        snapshot = FilesystemSnapshot()
+        if directory in self.names:
+            snapshot.names[directory] = self.names[directory]
+            snapshot.slurm_ids[directory] = self.slurm_ids[directory]
+            snapshot.stats[directory] = self.stats[directory]
+        return snapshot
+
+    def knows(self, directory):
+        #a directory that was missing at the scan is left to the filesystem
+        return self.names.get(os.path.abspath(directory), None) is not None
+
+    def exists(self, path):
+        directory, name = os.path.split(os.path.abspath(path))
+        names = self.names.get(directory, None)
+        return names is not None and name in names
+
+    def resolve_output(self, read_filename):
+        '''
+        file_parser.resolve_output from the listing: the output, else a compressed copy,
+        None if neither was there
+        '''
+        if self.exists(read_filename):
+            return read_filename
+        if not read_filename.endswith(file_parser.compressed_extensions):
+            for extension in file_parser.compressed_extensions:
+                if self.exists(read_filename + extension):
+                    return read_filename + extension
+        return None
+
+    def stat(self, path):
+        '''
+        (size, mtime_ns) of an output or run_info.json as it was at the scan, None if it was not there
+        '''
+        directory, name = os.path.split(os.path.abspath(path))
+        return self.stats.get(directory, {}).get(name, None)
+
+    def fingerprint(self, directory, output_filename):
+        '''
+        what a job's status is read from: its slurm job ids, and the size and mtime
+        of its output and run_info.json. None for a directory the snapshot did not list
+        '''
+        if not self.knows(directory):
+            return None
+        directory = os.path.abspath(directory)
+        output_path = self.resolve_output(output_filename)
+        run_info = self.stat(os.path.join(directory, 'run_info.json'))
+        #lists, so a fingerprint compares equal to itself read back from json
+        return [
+            sorted(self.slurm_ids[directory]),
+            None if output_path is None else list(self.stat(output_path)),
+            None if run_info is None else list(run_info),
+        ]
+
+
+def run_info_stat(directory):
+    '''
+    (size, mtime_ns) of a job's run_info.json as it is now, None if there is none
+    '''
+    try:
+        stat = os.stat(os.path.join(directory, 'run_info.json'))
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
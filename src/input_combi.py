@@ -7,15 +7,16 @@ import re
 import copy
 import pandas as pd
 import json
+import ledger_store
 
 
 FLAGS = ['!directories']
 
 def delete_old_tmp_files(root_directory):
     ledger_path = os.path.join(root_directory,'__ledger__.csv')
-    if not os.path.exists(ledger_path):
+    if not ledger_store.ledger_exists(ledger_path):
         raise ValueError('tried to delete old .tmp files without ledger')
-    ledger = pd.read_csv(ledger_path,sep='|')
+    ledger = ledger_store.load_ledger(ledger_path)
     failed_mask = ledger['job_status'] == 'failed'
     for i, row in ledger.loc[failed_mask].iterrows():
         job_dir = row['job_directory']
@@ -221,32 +222,30 @@ def write_input_array(_configs,root_directory,**kwargs):
             #check if we have a ledger before the next part
             ledger_filename = kwargs.get('ledger','__ledger__.csv')
             ledger_path = os.path.join(root_directory,ledger_filename)
-            ledger = None
     
-            if os.path.exists(ledger_path):
-                ledger = pd.read_csv(ledger_path,sep='|')
+            #if we have a ledger, update this job's row in it
+            if ledger_store.ledger_exists(ledger_path):
                 if kwargs.get('debug',False): print(f'ledger exists: {ledger_path}')
-            #if we have a ledger, update it
-            if ledger is not None:
-                identify_mask = (ledger['job_basename'] == config['job_basename']) &\
-                                (ledger['job_directory'] == config['write_directory'])   
+                matches = ledger_store.update_unique_row(
+                    ledger_path,
+                    {
+                        'job_id' : -1,
+                        'job_status' : 'not_started',
+                        'coords_from' : config.get('!coords_from',None),
+                        'xyz_filename' : config.get('!xyz_file',None),
+                        'orbitals_from' : config.get('!orbitals_from', None),
+                        'gbw_filename' : config.get('!gbw_file', None),
+                    },
+                    job_basename=config['job_basename'],
+                    job_directory=config['write_directory'],
+                )
                 
-                if identify_mask.sum() > 1:
+                if matches > 1:
                     raise ValueError("Multiple jobs found with the same name.")
-                elif identify_mask.sum() == 0:
+                elif matches == 0:
                     if kwargs.get('debug',False): print('nothing satisfies parameters')
-                    if kwargs.get('debug',False): print(f"write/ directory: {config['write_directory']} | {ledger['job_basename']}")
-                    if kwargs.get('debug',False): print(f"basename: {config['job_basename']} | {ledger['job_directory']}")
-                else:
-                    ledger.loc[identify_mask, 'job_id'] = f"{-1}"
-                    ledger.loc[identify_mask, 'job_status'] = 'not_started'
-                    ledger.loc[identify_mask, 'coords_from'] = config.get('!coords_from',None)
-                    ledger.loc[identify_mask,'xyz_filename'] = config.get('!xyz_file',None)
-                    ledger.loc[identify_mask, 'orbitals_from'] = config.get('!orbitals_from', None)
-                    ledger.loc[identify_mask, 'gbw_filename'] = config.get('!gbw_file', None)
-    
-    
-                ledger.to_csv(ledger_path,sep='|',index=False)
+                    if kwargs.get('debug',False): print(f"write/ directory: {config['write_directory']}")
+                    if kwargs.get('debug',False): print(f"basename: {config['job_basename']}")
 
 
         if kwargs.get('force_write_config',False):
@@ -960,6 +960,38 @@ class BatchRunnerInputBuilder(InputBuilder):
         verbose_string = ' -v' if verbose else ''
         restart_string = ' -r' if restart else ''
         ledger_string = f"-l {self.config['ledger_filename']}"
+        parse_workers = self.config.get('parse_workers',None)
+        if parse_workers:
+            ledger_string += f" --parse-workers {parse_workers}"
+        compress_outputs = self.config.get('compress_outputs',None)
+        if compress_outputs:
+            ledger_string += f" --compress-outputs {compress_outputs}"
+        parse_cache = self.config.get('parse_cache',None)
+        if parse_cache:
+            ledger_string += f" --parse-cache {parse_cache}"
+        squeue_ttl = self.config.get('squeue_ttl',None)
+        if squeue_ttl is not None:
+            ledger_string += f" --squeue-ttl {squeue_ttl}"
+        ledger_backend = self.config.get('ledger_backend',None)
+        if ledger_backend:
+            ledger_string += f" --ledger-backend {ledger_backend}"
+        min_poll_interval = self.config.get('min_poll_interval',None)
+        if min_poll_interval is not None:
+            ledger_string += f" --min-poll-interval {min_poll_interval}"
+        max_poll_interval = self.config.get('max_poll_interval',None)
+        if max_poll_interval is not None:
+            ledger_string += f" --max-poll-interval {max_poll_interval}"
+        revalidate_after = self.config.get('revalidate_after',None)
+        if revalidate_after is not None:
+            ledger_string += f" --revalidate-after {revalidate_after}"
+        if self.config.get('array_submit',False):
+            ledger_string += " --array-submit"
+        for option in ('bundle_size','bundle_workers','bundle_max_runtime'):
+            value = self.config.get(option,None)
+            if value is not None:
+                ledger_string += f" --{option.replace('_','-')} {value}"
+        if self.config.get('chain_submit',False):
+            ledger_string += " --chain-submit"
         submit_line = f"python3 {command} {input_file}{restart_string}{verbose_string} -j {max_jobs} {ledger_string} > {job_basename}.out"
         return submit_line
 
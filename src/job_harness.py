@@ -20,6 +20,9 @@ CRESTRULES = os.path.join(rules_dir,'crest_rules.dat')
 PYAROMARULES=os.path.join(rules_dir,'pyaroma_rules.dat')
 
 
+#patterns extract_final_coordinates seeks to, see file_parser.iter_lines_from_last
+ORIENTATION_HEADERS = ['Input orientation', 'Standard orientation']
+
 class JobHarness:
     def __init__(self):
         self.strict = False
@@ -41,20 +44,48 @@ class JobHarness:
         self.restart = True #when this flag is enabled, we will look for old temp files and use them
         self.mode = 'slurm' #slurm or direct
         self.tmp_extension= '.tmp'
+        #status probe: read only the head and tail of finished outputs
+        #when deciding succeeded/failed, see file_parser.probe_data
+        self.status_probe = True
+        self.probe_head_fields = ()
+        self.probe_tail_fields = ('normal_exit',) #termination banner is the last thing printed
+        #{variable : anchor variable} for variables only ever printed after the anchor line
+        self.probe_tail_anchors = {}
+        #variables interpret_fp_out reads, the only rules evaluated when a status needs a full parse
+        self.status_fields = ('normal_exit',)
+        #checkpoint of the parse of a growing output, see file_parser.extract_data_incremental
+        self.parse_state = None
+        #listing of the job directory from the current status sweep, see filesystem_snapshot
+        self.fs_snapshot = None
+        #(size, mtime_ns) of the output when OneIter last parsed it
+        self.parsed_output_stat = None
+        #task index when the job runs as part of a slurm job array, see submit_array
+        self.array_task = None
+        #task index when the job runs in a task-farm allocation with other jobs, see submit_bundle
+        self.bundle_task = None
+        #slurm keys of the jobs this one was queued behind with --dependency=afterok,
+        #see BatchRunner.queue_chained_jobs
+        self.after = []
     def to_dict(self):
         return {
             'directory' : self.directory,
             'job_name' : self.job_name,
             'status' : self.status,
             'job_id' : self.job_id,
+            'array_task' : self.array_task,
+            'bundle_task' : self.bundle_task,
+            'after' : self.after,
             'restart' : self.restart,
             'ruleset' : self.ruleset,
         }
     
     def write_json(self):
         data_dict = self.to_dict()
-        with open(os.path.join(self.directory,'run_info.json'),'w') as json_file:
+        run_info_path = os.path.join(self.directory,'run_info.json')
+        # written aside and moved in, so readers never see a half-written file
+        with open(run_info_path + '.part','w') as json_file:
             json.dump(data_dict, json_file,indent="")
+        os.replace(run_info_path + '.part', run_info_path)
 
     def from_dict(self,data): #TODO: FIX RULESET HACK!
         old_data = self.to_dict()
@@ -64,6 +95,9 @@ class JobHarness:
         self.job_name = data['job_name']
         self.status = data['status']
         self.job_id = data['job_id']
+        self.array_task = data['array_task']
+        self.bundle_task = data['bundle_task']
+        self.after = data['after']
         self.restart = data['restart']
         if not self.ruleset:
             self.ruleset = data['ruleset']
@@ -74,13 +108,85 @@ class JobHarness:
             data = json.load(json_data)
         self.from_dict(data)
 
+    def slurm_key(self):
+        '''
+        how squeue names this job: the job id, or jobid_task for an array task
+        '''
+        if self.array_task is None:
+            return self.job_id
+        return f"{self.job_id}_{self.array_task}"
+
+    def bundle_progress(self):
+        '''
+        for a job in a running bundle, how far the bundle's worker got with it, from the
+        bundle_status file the worker writes: 'running', 'done', or pending until a worker picks it up
+        '''
+        try:
+            with open(os.path.join(self.directory, bundle_status_filename), 'r') as status_file:
+                fields = status_file.read().split()
+        except FileNotFoundError:
+            return 'pending'
+        # a mark left by an earlier bundle says nothing about this one
+        if fields[:2] != [str(self.job_id), str(self.bundle_task)]:
+            return 'pending'
+        return fields[2] if fields[2:3] in (['running'], ['done']) else 'pending'
+
+    def sbatch_options(self):
+        '''
+        the #SBATCH lines of the submission script that ask for resources,
+        without the ones naming this job or its output files
+        '''
+        options = []
+        with open(os.path.join(self.directory, f"{self.job_name}.sh"), 'r') as script:
+            for line in script:
+                line = line.strip()
+                if not line.startswith('#SBATCH'):
+                    continue
+                if re.match(r'#SBATCH\s+(-J|-o|-e|-D|--job-name|--output|--error|--chdir)\b', line):
+                    continue
+                options.append(line)
+        return tuple(options)
+
+    def knows_directory(self):
+        return self.fs_snapshot is not None and self.fs_snapshot.knows(self.directory)
+
+    def path_exists(self, path):
+        '''
+        os.path.exists for a file in the job directory, from fs_snapshot when it has one
+        '''
+        if self.knows_directory():
+            return self.fs_snapshot.exists(path)
+        return os.path.exists(path)
+
+    def output_stat(self):
+        '''
+        (size, mtime_ns) of the output, compressed or not, None if there is none
+        '''
+        path = file_parser.resolve_output(f"{os.path.join(self.directory, self.job_name)}{self.output_extension}")
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_size, stat.st_mtime_ns)
+
+    def output_exists(self, output_filename):
+        if self.knows_directory():
+            return self.fs_snapshot.resolve_output(output_filename) is not None
+        return file_parser.output_exists(output_filename)
+
     #this will make things more robust. On startup, we check for this...
     def get_id(self):
         import math
         run_info_path = os.path.join(self.directory, 'run_info.json')
-        if os.path.exists(run_info_path):
+        array_task = None
+        bundle_task = None
+        after = []
+        if self.path_exists(run_info_path):
             with open(run_info_path, 'r') as json_file:
                 data = json.load(json_file)
+            array_task = data.get('array_task', None)
+            bundle_task = data.get('bundle_task', None)
+            after = data.get('after', [])
             if 'job_id' in data.keys():
                 temp_id = data['job_id']
                 # Sanitize: NaN or None from old buggy runs should be -1
@@ -91,15 +197,22 @@ class JobHarness:
         else:
             temp_id = -1
         
-        files = os.listdir(self.directory)
-        pattern = r'(?:slurm-)(\d+)(?:\.out)'
-        id_list = [file for file in files if re.match(pattern,file)]
-        id_list = [int(re.match(pattern,file).group(1)) for file in id_list]
+        if self.knows_directory():
+            id_list = list(self.fs_snapshot.slurm_ids[os.path.abspath(self.directory)])
+        else:
+            files = os.listdir(self.directory)
+            pattern = r'(?:slurm-)(\d+)(?:\.out)'
+            id_list = [file for file in files if re.match(pattern,file)]
+            id_list = [int(re.match(pattern,file).group(1)) for file in id_list]
         id_list.append(temp_id)
         max_id = -1
         if len(id_list) != 0:
             max_id = max(id_list)
         self.job_id = max_id
+        # array and bundle tasks write slurm-jobid_task.out, so only run_info.json knows the task
+        self.array_task = array_task if max_id == temp_id and max_id != -1 else None
+        self.bundle_task = bundle_task if max_id == temp_id and max_id != -1 else None
+        self.after = after if max_id == temp_id and max_id != -1 else []
 
 
     #all that's required is a simple update_status here...
@@ -118,8 +231,11 @@ class JobHarness:
 
         # If slurm_cache provided, use it instead of individual squeue calls
         if slurm_cache is not None:
-            if self.job_id and self.job_id in slurm_cache:
-                cached_status = slurm_cache[self.job_id]
+            if self.job_id and self.slurm_key() in slurm_cache:
+                cached_status = slurm_cache[self.slurm_key()]
+                if cached_status == 'running' and self.bundle_task is not None:
+                    # the allocation runs many jobs, each one's progress is in its bundle_status
+                    cached_status = self.bundle_progress()
                 if cached_status == 'running':
                     self.status = 'running'
                     if debug: print(f"From cache: running")
@@ -130,7 +246,7 @@ class JobHarness:
                     return
             # Job not in cache = not running/pending, check output file
             output_filename = f"{os.path.join(self.directory, self.job_name)}{self.output_extension}"
-            if not os.path.exists(output_filename):
+            if not self.output_exists(output_filename):
                 if debug: print(f"Output file not found, status: not_started")
                 self.status = 'not_started'
                 return
@@ -145,7 +261,7 @@ class JobHarness:
         for attempt in range(5):
             try:
                 processdata = subprocess.run(
-                    f'squeue --job {self.job_id}',
+                    f'squeue --job {self.slurm_key()}',
                     shell=True,
                     cwd=self.directory,
                     stdout=subprocess.PIPE,
@@ -181,6 +297,14 @@ class JobHarness:
                 self.status = 'pending'
                 if self.debug: print("returning pending")
                 return
+            elif slurm_status == 'R' and self.bundle_task is not None:
+                # the allocation runs many jobs, each one's progress is in its bundle_status
+                progress = self.bundle_progress()
+                if progress == 'done':
+                    in_progress = False
+                else:
+                    self.status = progress
+                    return
             elif slurm_status == 'R':
                 self.status = 'running'
                 if self.debug: print("returning with running")
@@ -192,7 +316,7 @@ class JobHarness:
             if self.debug: print(f'updating status with ruleset found at: {self.ruleset}')
             if self.debug: print(f"slurm output before static success check: {output}")
             output_filename = f"{os.path.join(self.directory, self.job_name)}{self.output_extension}"
-            if not os.path.exists(output_filename):
+            if not self.output_exists(output_filename):
                 if self.debug: print(f'OLD OUTPUT FILE {output_filename} NOT FOUND')
                 self.status = 'not_started'
                 return
@@ -207,13 +331,37 @@ class JobHarness:
         if self.debug : print(f"using ruleset at path: {self.ruleset}")
         if self.debug : print(f"absolute ruleset path: {os.path.abspath(self.ruleset)}")
         output_filename = f"{os.path.join(self.directory,self.job_name)}{self.output_extension}"
-        if not os.path.exists(output_filename):
+        if not self.output_exists(output_filename):
             print(f"FILE DOES NOT EXIST: {output_filename}")
             self.status = 'not_started' #CHECK ERROR
             return
+        if self.parse_state is not None:
+            # we have been following this output while it ran, just catch up
+            temp_status, self.parse_state = file_parser.extract_data_incremental(
+                          output_filename,
+                          self.ruleset,
+                          self.parse_state,
+                          )
+            self.interpret_fp_out(temp_status)
+            return
+        if self.status_probe:
+            probe = file_parser.probe_data(
+                          output_filename,
+                          self.ruleset,
+                          head_fields=self.probe_head_fields,
+                          tail_fields=self.probe_tail_fields,
+                          tail_anchors=self.probe_tail_anchors,
+                          )
+            # interpret_fp_out raises KeyError when it needs a value the probe could not settle
+            try:
+                self.interpret_fp_out(probe)
+                return
+            except KeyError:
+                if self.debug: print(f"status probe ambiguous, parsing all of {output_filename}")
         temp_status = file_parser.extract_data(
                           output_filename,
-                          self.ruleset #this fails?
+                          self.ruleset, #this fails?
+                          fields=self.status_fields,
                           )
         self.interpret_fp_out(temp_status)
     
@@ -224,10 +372,18 @@ class JobHarness:
         
     def submit_job(self,**kwargs):
         debug = kwargs.get('debug',False)
+        #slurm keys of jobs that must succeed first, and the script to submit in place of job_name.sh
+        after = kwargs.get('after',None) or []
+        script = kwargs.get('script',f"{self.job_name}.sh")
+        command = f"sbatch {script}"
+        if after:
+            # jobs behind a job that failed are dropped by slurm rather than left pending forever
+            dependency = ':'.join(str(key) for key in after)
+            command = f"sbatch --dependency=afterok:{dependency} --kill-on-invalid-dep=yes {script}"
         if debug: print(f"In directory {self.directory}")
-        if debug: print(f"Executing command: sbatch {self.job_name}.sh")
+        if debug: print(f"Executing command: {command}")
         if self.mode == 'slurm':
-            processdata = subprocess.run(f"sbatch {self.job_name}.sh",
+            processdata = subprocess.run(command,
                                          shell=True,
                                          cwd=self.directory,
                                          stdout=subprocess.PIPE,
@@ -240,6 +396,9 @@ class JobHarness:
                     if debug: print(f"Directory: {self.directory}")
                     raise ValueError(f"Bad submission script! output: {output}")
                 self.job_id = int(re.search(r'\d+',output).group(0))
+                self.array_task = None
+                self.bundle_task = None
+                self.after = list(after)
                 self.status = 'pending'
                 self.write_json()
             except:
@@ -256,16 +415,37 @@ class JobHarness:
                                         shell=True,
                                         cwd=self.directory)
 
+    def chain_script(self, prologue):
+        '''
+        writes job_name.chain.sh, the submission script with prologue run right after
+        its #SBATCH lines, stopping the job if it fails. returns its filename
+        '''
+        with open(os.path.join(self.directory, f"{self.job_name}.sh"), 'r') as script:
+            lines = script.readlines()
+        # sbatch reads options up to the first command, so the prologue goes after them
+        header = 0
+        while header < len(lines) and (lines[header].startswith('#') or not lines[header].strip()):
+            header += 1
+        chain_filename = f"{self.job_name}.chain.sh"
+        with open(os.path.join(self.directory, chain_filename), 'w') as script:
+            script.writelines(lines[:header])
+            if header and not lines[header - 1].endswith('\n'):
+                script.write('\n')
+            script.write(f"{prologue} || exit 1\n")
+            script.writelines(lines[header:])
+        return chain_filename
+
     def parse_output(self,**kwargs):
         debug = kwargs.get('debug',False)
         path = os.path.join(self.directory,self.job_name) + self.output_extension
         data = None
         for trial in range(0,3):
             #TODO: fix failure here
-            if os.path.exists(path):
-                data = file_parser.extract_data(
+            if file_parser.output_exists(path):
+                data, self.parse_state = file_parser.extract_data_incremental(
                     path,
-                    self.ruleset
+                    self.ruleset,
+                    self.parse_state,
                 )
                 break
 
@@ -280,8 +460,13 @@ class JobHarness:
         if self.parse_fail_counter >= self.parse_fail_threshold:
             raise RuntimeError('TOO MANY PARSE FAILS')
 
-        with open(f"{os.path.join(self.directory, self.job_name)}.json",'w') as json_file:
-            json.dump(data, json_file,indent="")
+        self.write_parsed_json(data)
+
+    def write_parsed_json(self, data):
+        '''
+        writes parsed output data next to the output, as {job_name}.json
+        '''
+        file_parser.write_data_json(data, f"{os.path.join(self.directory, self.job_name)}.json", indent="")
 
     def OneIter(self,**kwargs):
         if self.status == 'failed':
@@ -293,15 +478,22 @@ class JobHarness:
             #right now, I need this to happen
             return self.status
         debug = kwargs.get('debug',False)
+        slurm_cache = kwargs.get('slurm_cache',None) #shared squeue listing, see batch_runner.SlurmSnapshot
         data_path = os.path.join(self.directory,'run_info.json')
         if os.path.exists(data_path): #this MUST happen if using this
             self.read_json(data_path)
         else:
             raise ValueError('OneIter called without run_info.json existing')
-        self.update_status()
-        self.write_json()
+        run_info = self.to_dict()
+        self.update_status(slurm_cache=slurm_cache)
+        # run_info.json and the parsed json are only rewritten when something changed
+        if self.to_dict() != run_info:
+            self.write_json()
         if not (self.status == 'not_started' or self.status == 'pending'):
-            self.parse_output()
+            output_stat = self.output_stat()
+            if output_stat is None or output_stat != self.parsed_output_stat:
+                self.parse_output()
+                self.parsed_output_stat = output_stat
         if self.status == 'failed':
             self.prune_temp_files()
         elif self.status == 'succeeded': #this is what we were missing
@@ -335,6 +527,14 @@ class JobHarness:
             self.final_parse()
             return 0
 
+    def compress_output(self, method='gz'):
+        '''
+        replaces the finished output with a compressed copy, see file_parser.compress_output.
+        everything that reads outputs through file_parser still finds it
+        '''
+        path = os.path.join(self.directory,self.job_name) + self.output_extension
+        return file_parser.compress_output(path, method)
+
     def prune_temp_files(self):
         print()
         print("////////////////////////////////////////////////////////") 
@@ -361,6 +561,11 @@ class ORCAHarness(JobHarness):
         self.output_extension = '.out'
         self.input_extension = '.inp'
         self.program = 'orca'
+        self.probe_head_fields = ('is_opt',) #input file echo
+        self.probe_tail_fields = ('normal_exit','imaginary_frequencies')
+        #the frequencies of the final geometry are printed after the optimization is done
+        self.probe_tail_anchors = {'imaginary_frequencies' : 'opt_normal_exit'}
+        self.status_fields = ('is_opt','normal_exit','opt_normal_exit','imaginary_frequencies')
 
     def interpret_fp_out(self,file_parser_output):
         self.status = 'failed'
@@ -384,6 +589,12 @@ class GaussianHarness(JobHarness):
         self.output_extension = '.log'
         self.input_extension = '.gjf'
         self.program = 'gaussian'
+        self.probe_head_fields = ('is_opt_freq',) #route section
+        #only the freq link reports imaginary frequencies, and it starts after the
+        #first of the two terminations, so both in the tail means all of it is there
+        self.probe_tail_anchors = {'imaginary_frequencies' : 'normal_exit_opt_freq'}
+        self.status_fields = ('is_opt_freq','normal_exit','normal_exit_opt_freq',
+                              'normal_exit_opt_freq_2','imaginary_frequencies')
     
     def interpret_fp_out(self, file_parser_output):
         if file_parser_output['is_opt_freq']:
@@ -415,30 +626,31 @@ class GaussianHarness(JobHarness):
         output_path = self.output_path
         xyz_path = os.path.join(self.directory, self.job_name) + '.xyz'
         
-        if not os.path.exists(output_path):
+        if not file_parser.output_exists(output_path):
             print(f"Output file not found: {output_path}")
             return
         
         try:
-            with open(output_path, 'r') as f:
-                lines = f.readlines()
-            
-            # Find the last occurrence of Standard orientation
-            standard_orientation_indices = [i for i, line in enumerate(lines) if ("Input orientation" in line) or ("Standard orientation" in line)]
-            
-            if not standard_orientation_indices:
-                print(f"No standard orientation section found in {output_path}")
-                return
-            
-            last_orientation_index = standard_orientation_indices[-1]
-            
-            # Extract coordinates
-            coord_lines = []
-            atoms = []
-            i = last_orientation_index + 5  # Skip header lines
-            
-            while i < len(lines) and not "---" in lines[i]:
-                parts = lines[i].split()
+            # Seek to the most recent Standard/Input orientation header
+            # with the section index and read the block under it
+            atoms = None
+            skip = 0
+            reading = False
+            for line in file_parser.iter_lines_from_last(output_path, ORIENTATION_HEADERS):
+                if ("Input orientation" in line) or ("Standard orientation" in line):
+                    atoms = []
+                    skip = 4  # Skip header lines
+                    reading = True
+                    continue
+                if not reading:
+                    continue
+                if skip:
+                    skip -= 1
+                    continue
+                if "---" in line:
+                    reading = False
+                    continue
+                parts = line.split()
                 if len(parts) >= 6:
                     atomic_num = int(parts[1])
                     x, y, z = float(parts[3]), float(parts[4]), float(parts[5])
@@ -446,7 +658,10 @@ class GaussianHarness(JobHarness):
                     # Convert atomic number to symbol
                     symbol = self._atomic_number_to_symbol(atomic_num)
                     atoms.append((symbol, x, y, z))
-                i += 1
+
+            if atoms is None:
+                print(f"No standard orientation section found in {output_path}")
+                return
             
             # Write XYZ file
             with open(xyz_path, 'w') as xyz_file:
@@ -497,3 +712,191 @@ class pyAromaHarness(JobHarness):
         self.program = 'pyaroma'
 
 
+
+
+#JOB ARRAYS
+
+# Jobs asking for the same resources can go to slurm as one sbatch --array.
+# The array script reads its task's line of a map file (job directory, job name),
+# and runs that job's own submission script there. Each task writes
+# slurm-jobid_task.out in its job directory, and every harness gets the
+# array's job id and its task index, which is how squeue -r lists it.
+
+ARRAY_SCRIPT = '''#!/bin/bash
+{options}
+#SBATCH --job-name={name}
+#SBATCH --array=0-{last}
+#SBATCH --output=/dev/null
+map={map_path}
+line=$(sed -n "$((SLURM_ARRAY_TASK_ID + 1))p" "$map")
+directory=${{line%%$'\\t'*}}
+job_name=${{line#*$'\\t'}}
+cd "$directory" || exit 1
+export SLURM_SUBMIT_DIR="$directory"
+bash "$job_name.sh" > "slurm-${{SLURM_ARRAY_JOB_ID}}_${{SLURM_ARRAY_TASK_ID}}.out" 2>&1
+'''
+
+
+def submit_array(jobs, array_directory, name, **kwargs):
+    '''
+    submits jobs, which must share sbatch_options(), as one slurm job array.
+    the map and array script are written to array_directory as name.map / name.sh.
+    every harness comes back pending with the array's job id and its task index
+    '''
+    debug = kwargs.get('debug', False)
+    options = jobs[0].sbatch_options()
+    os.makedirs(array_directory, exist_ok=True)
+    map_path = os.path.abspath(os.path.join(array_directory, f"{name}.map"))
+    with open(map_path, 'w') as map_file:
+        for job in jobs:
+            map_file.write(f"{os.path.abspath(job.directory)}\t{job.job_name}\n")
+    with open(os.path.join(array_directory, f"{name}.sh"), 'w') as script:
+        script.write(ARRAY_SCRIPT.format(options='\n'.join(options), name=name,
+                                         last=len(jobs) - 1, map_path=map_path))
+    processdata = subprocess.run(f"sbatch {name}.sh",
+                                 shell=True,
+                                 cwd=array_directory,
+                                 stdout=subprocess.PIPE,
+                                 stderr=subprocess.STDOUT)
+    output = processdata.stdout.decode('utf-8')
+    if debug: print(f"slurm array submission output: {output}")
+    match = re.search(r'\d+', output)
+    if re.search('error:', output) or match is None:
+        raise ValueError(f"""Bad array submission!
+                in directory: {array_directory}
+                output: {output}""")
+    job_id = int(match.group(0))
+    for task, job in enumerate(jobs):
+        job.job_id = job_id
+        job.array_task = task
+        job.bundle_task = None
+        job.status = 'pending'
+        job.write_json()
+    return job_id
+
+
+#TASK-FARM BUNDLES
+
+# Short jobs can share one allocation instead of each waiting in the queue.
+# The bundle script runs a pool of workers (xargs -P) over a map file of
+# (job directory, task, job name) lines. Each worker runs a job's own
+# submission script in its directory, marking it in a bundle_status file
+# there as "<job id> <task> running", then done. run_info.json is left to the
+# runner. update_status reads the mark while the allocation is in squeue,
+# and checks the output as usual once it says done.
+
+bundle_status_filename = 'bundle_status'
+
+BUNDLE_SCRIPT = '''#!/bin/bash
+{options}
+#SBATCH --job-name={name}
+#SBATCH -t {runtime}
+#SBATCH --output={output}
+map={map_path}
+run_job() {{
+    directory=${{1%%$'\\t'*}}
+    rest=${{1#*$'\\t'}}
+    task=${{rest%%$'\\t'*}}
+    job_name=${{rest#*$'\\t'}}
+    cd "$directory" || return 0
+    echo "$SLURM_JOB_ID $task running" > {status}.part && mv {status}.part {status}
+    SLURM_SUBMIT_DIR="$directory" bash "$job_name.sh" > "slurm-${{SLURM_JOB_ID}}_${{task}}.out" 2>&1
+    echo "$SLURM_JOB_ID $task done" > {status}.part && mv {status}.part {status}
+}}
+export -f run_job
+xargs -d '\\n' -P {workers} -I{{}} bash -c 'run_job "$1"' _ {{}} < "$map"
+'''
+
+time_option = re.compile(r'#SBATCH\s+(?:-t|--time)[\s=]+(\S+)')
+ntasks_option = re.compile(r'(#SBATCH\s+(?:-n|--ntasks)[\s=]+)(\d+)')
+
+
+def slurm_minutes(runtime):
+    '''
+    minutes in a slurm time limit: M, M:S, H:M:S, D-H, D-H:M or D-H:M:S.
+    None for UNLIMITED or INFINITE, no time limit
+    '''
+    if runtime.lower() in ('unlimited', 'infinite'):
+        return None
+    days = 0
+    if '-' in runtime:
+        days, runtime = runtime.split('-', 1)
+        days = int(days)
+        fields = [int(field) for field in runtime.split(':')]
+        fields += [0] * (3 - len(fields))
+        hours, minutes, seconds = fields
+    else:
+        fields = [int(field) for field in runtime.split(':')]
+        if len(fields) == 3:
+            hours, minutes, seconds = fields
+        else:
+            hours = 0
+            minutes, seconds = (fields + [0])[:2]
+    return days * 1440 + hours * 60 + minutes + seconds / 60
+
+
+def slurm_time(minutes):
+    minutes = int(-(-minutes // 1)) #rounded up
+    return f"{minutes // 1440}-{minutes % 1440 // 60:02d}:{minutes % 60:02d}:00"
+
+
+def sbatch_runtime(options):
+    '''
+    minutes asked for by the time line of sbatch_options(), None without one
+    '''
+    for line in options:
+        match = time_option.match(line)
+        if match:
+            return slurm_minutes(match.group(1))
+    return None
+
+
+def bundle_key(options):
+    '''
+    sbatch_options() without the time line: jobs with the same key can share an allocation
+    '''
+    return tuple(line for line in options if not time_option.match(line))
+
+
+def submit_bundle(jobs, bundle_directory, name, workers=1, **kwargs):
+    '''
+    submits jobs, which must share bundle_key(), as one allocation running
+    workers of them at a time. the allocation asks for workers times the tasks
+    of one job, and for the time of the longest job once per round of workers.
+    every harness comes back pending with the allocation's job id and its task index
+    '''
+    debug = kwargs.get('debug', False)
+    options = jobs[0].sbatch_options()
+    runtime = max(sbatch_runtime(job.sbatch_options()) for job in jobs) * -(-len(jobs) // workers)
+    options = [ntasks_option.sub(lambda match: f"{match.group(1)}{int(match.group(2)) * workers}", line)
+               for line in bundle_key(options)]
+    os.makedirs(bundle_directory, exist_ok=True)
+    bundle_directory = os.path.abspath(bundle_directory)
+    map_path = os.path.join(bundle_directory, f"{name}.map")
+    with open(map_path, 'w') as map_file:
+        for task, job in enumerate(jobs):
+            map_file.write(f"{os.path.abspath(job.directory)}\t{task}\t{job.job_name}\n")
+    with open(os.path.join(bundle_directory, f"{name}.sh"), 'w') as script:
+        script.write(BUNDLE_SCRIPT.format(options='\n'.join(options), name=name, runtime=slurm_time(runtime),
+                                          output=os.path.join(bundle_directory, f"{name}.out"),
+                                          map_path=map_path, workers=workers, status=bundle_status_filename))
+    processdata = subprocess.run(f"sbatch {name}.sh",
+                                 shell=True,
+                                 cwd=bundle_directory,
+                                 stdout=subprocess.PIPE,
+                                 stderr=subprocess.STDOUT)
+    output = processdata.stdout.decode('utf-8')
+    if debug: print(f"slurm bundle submission output: {output}")
+    match = re.search(r'\d+', output)
+    if re.search('error:', output) or match is None:
+        raise ValueError(f"""Bad bundle submission!
+                in directory: {bundle_directory}
+                output: {output}""")
+    job_id = int(match.group(0))
+    for task, job in enumerate(jobs):
+        job.job_id = job_id
+        job.array_task = None
+        job.bundle_task = task
+        job.status = 'pending'
+        job.write_json()
+    return job_id
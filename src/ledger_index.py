@@ -0,0 +1,55 @@
+import os
+
+
+class LedgerIndex:
+    '''
+    dict lookups into a ledger, from job_id and from (job_directory, job_basename)
+    to ledger index, so finding a job's row doesn't scan a column.
+    directories are made absolute, the way DependencyGraph keys them.
+
+    rebuilt whenever the ledger is replaced or reindexed, job id changes
+    go through set_job_id
+    '''
+    def __init__(self, ledger=None, **kwargs):
+        self.debug = kwargs.get('debug', False)
+        self.job_ids = {} #job_id : ledger indices
+        self.names = {} #(absolute job directory, job_basename) : ledger indices
+        self.directories = {} #absolute job directory : ledger indices
+        self.job_id = {} #ledger index : job_id
+        if ledger is not None:
+            self.build(ledger)
+
+    def build(self, ledger):
+        self.job_ids = {}
+        self.names = {}
+        self.directories = {}
+        self.job_id = {}
+        for index, job_id, directory, basename in zip(ledger.index, ledger['job_id'],
+                                                       ledger['job_directory'], ledger['job_basename']):
+            directory = os.path.abspath(directory)
+            self.job_id[index] = job_id
+            self.job_ids.setdefault(job_id, []).append(index)
+            self.names.setdefault((directory, basename), []).append(index)
+            self.directories.setdefault(directory, []).append(index)
+        if self.debug: print(f"ledger index: {len(self.job_id)} rows")
+        return self
+
+    def set_job_id(self, index, job_id):
+        old_job_id = self.job_id[index]
+        if old_job_id == job_id:
+            return
+        indices = self.job_ids[old_job_id]
+        indices.remove(index)
+        if not indices:
+            del self.job_ids[old_job_id]
+        self.job_id[index] = job_id
+        self.job_ids.setdefault(job_id, []).append(index)
+
+    def by_job_id(self, job_id):
+        return list(self.job_ids.get(job_id, []))
+
+    def by_name(self, directory, basename):
+        return list(self.names.get((os.path.abspath(directory), basename), []))
+
+    def by_directory(self, directory):
+        return list(self.directories.get(os.path.abspath(directory), []))
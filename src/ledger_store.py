@@ -0,0 +1,324 @@
+import os
+import json
+import sqlite3
+import argparse
+
+import numpy as np
+import pandas as pd
+
+#SQLITE LEDGER
+
+# A copy of a BatchRunner ledger in an SQLite database next to the csv,
+# __ledger__.csv -> __ledger__.db. Rows keep their ledger index as row_index,
+# and single status or job id changes are written as one-row transactions
+# instead of rewriting the whole csv. The database runs in WAL mode, so
+# readers always see the last committed ledger while the runner writes.
+#
+# The journal backend keeps the csv as a snapshot and appends each change
+# to __ledger__.csv.journal as one JSON line. The journal is folded back into
+# the csv (compacted) once it holds as many records as the ledger has rows,
+# and when the runner exits.
+#
+# Readers and writers outside BatchRunner go through load_ledger and
+# update_unique_row, which use whichever of the csv and the database was
+# written last, and replay the journal on top of the csv.
+
+#indexed columns, the ones rows are looked up by
+INDEXED_COLUMNS = ('job_id', 'job_directory', 'job_status')
+
+
+def db_path(csv_path):
+    return os.path.splitext(csv_path)[0] + '.db'
+
+
+def sql_value(value):
+    '''
+    numpy scalars and NaN as sqlite understands them
+    '''
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+
+class LedgerStore:
+    '''
+    SQLite copy of the ledger at csv_path
+    '''
+    def __init__(self, csv_path, **kwargs):
+        self.csv_path = csv_path
+        self.path = db_path(csv_path)
+        self.debug = kwargs.get('debug', False)
+        self.connection = None
+        self.pid = None
+
+    def connect(self):
+        #connections can't be shared with forked worker processes
+        if self.connection is not None and self.pid == os.getpid():
+            return self.connection
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection = connection
+        self.pid = os.getpid()
+        return connection
+
+    def close(self):
+        if self.connection is not None and self.pid == os.getpid():
+            self.connection.close()
+        self.connection = None
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def columns(self):
+        rows = self.connect().execute('PRAGMA table_info(ledger)').fetchall()
+        return [row[1] for row in rows if row[1] != 'row_index']
+
+    def write(self, ledger):
+        '''
+        replaces the stored ledger with this one in a single transaction
+        '''
+        columns = list(ledger.columns)
+        quoted = ', '.join(f'"{column}"' for column in columns)
+        connection = self.connect()
+        with connection:
+            if self.columns() != columns:
+                connection.execute('DROP TABLE IF EXISTS ledger')
+                connection.execute(f'CREATE TABLE ledger (row_index INTEGER PRIMARY KEY, {quoted})')
+                for column in INDEXED_COLUMNS:
+                    if column in columns:
+                        connection.execute(f'CREATE INDEX ledger_{column} ON ledger ("{column}")')
+            else:
+                connection.execute('DELETE FROM ledger')
+            placeholders = ', '.join('?' for column in range(len(columns) + 1))
+            connection.executemany(
+                f'INSERT INTO ledger (row_index, {quoted}) VALUES ({placeholders})',
+                ([sql_value(index)] + [sql_value(value) for value in row]
+                 for index, row in zip(ledger.index, ledger.itertuples(index=False, name=None)))
+            )
+        if self.debug: print(f"wrote {len(ledger)} ledger rows to {self.path}")
+
+    def read(self):
+        ledger = pd.read_sql_query('SELECT * FROM ledger ORDER BY row_index', self.connect(), index_col='row_index')
+        ledger.index.name = None
+        #NULL as NaN, the way the csv reads back
+        return ledger.where(ledger.notna(), np.nan).infer_objects()
+
+    def update_row(self, row_index, **values):
+        '''
+        sets columns of the row with this ledger index, one transaction
+        '''
+        assignments = ', '.join(f'"{column}" = ?' for column in values)
+        connection = self.connect()
+        with connection:
+            connection.execute(
+                f'UPDATE ledger SET {assignments} WHERE row_index = ?',
+                [sql_value(value) for value in values.values()] + [sql_value(row_index)]
+            )
+
+    def update_unique_row(self, values, **where):
+        '''
+        sets columns of the single row matching where, in one transaction.
+        returns how many rows matched, nothing is changed unless exactly one did
+        '''
+        condition = ' AND '.join(f'"{column}" = ?' for column in where)
+        parameters = [sql_value(value) for value in where.values()]
+        assignments = ', '.join(f'"{column}" = ?' for column in values)
+        connection = self.connect()
+        with connection:
+            matches = connection.execute(f'SELECT COUNT(*) FROM ledger WHERE {condition}', parameters).fetchone()[0]
+            if matches == 1:
+                connection.execute(
+                    f'UPDATE ledger SET {assignments} WHERE {condition}',
+                    [sql_value(value) for value in values.values()] + parameters
+                )
+        return matches
+
+    def export_csv(self, csv_path=None):
+        '''
+        writes the stored ledger out as the usual |-separated csv
+        '''
+        ledger = self.read()
+        #closing checkpoints the WAL, so the exported csv is the newer file
+        self.close()
+        write_csv(ledger, self.csv_path if csv_path is None else csv_path)
+
+    def modified_time(self):
+        #committed pages sit in the -wal file until a checkpoint
+        times = [os.stat(path).st_mtime_ns for path in (self.path, self.path + '-wal') if os.path.exists(path)]
+        return max(times) if times else None
+
+
+#LEDGER JOURNAL
+
+def journal_path(csv_path):
+    return csv_path + '.journal'
+
+
+def csv_stamp(csv_path):
+    stat = os.stat(csv_path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+class LedgerJournal:
+    '''
+    append-only log of ledger changes on top of the csv snapshot.
+    the first line names the snapshot it belongs to, every other line is
+    {"row": position in the csv, "values": {column: value}}
+    '''
+    def __init__(self, csv_path, **kwargs):
+        self.csv_path = csv_path
+        self.path = journal_path(csv_path)
+        self.debug = kwargs.get('debug', False)
+        self.records = 0 #records since the last compaction
+
+    def compact(self, ledger):
+        '''
+        writes the ledger as the new csv snapshot and starts an empty journal for it
+        '''
+        write_csv(ledger, self.csv_path)
+        header = {'snapshot' : csv_stamp(self.csv_path), 'rows' : len(ledger)}
+        part_path = self.path + '.part'
+        with open(part_path, 'w') as journal_f:
+            journal_f.write(json.dumps(header) + '\n')
+        os.replace(part_path, self.path)
+        self.records = 0
+        if self.debug: print(f"compacted ledger journal into {self.csv_path}")
+
+    def append(self, row, **values):
+        record = {'row' : int(row), 'values' : {column : sql_value(value) for column, value in values.items()}}
+        #opened per record, so a crashed runner loses nothing it recorded
+        #and a compaction by another process is picked up straight away
+        with open(self.path, 'a') as journal_f:
+            journal_f.write(json.dumps(record) + '\n')
+        self.records += 1
+
+
+def read_journal(csv_path, rows):
+    '''
+    the journal records belonging to the current csv snapshot,
+    None if there is no journal or it was written for another snapshot
+    '''
+    path = journal_path(csv_path)
+    if not os.path.exists(path) or not os.path.exists(csv_path):
+        return None
+    with open(path, 'r') as journal_f:
+        lines = journal_f.readlines()
+    if not lines:
+        return None
+    try:
+        header = json.loads(lines[0])
+    except ValueError:
+        return None
+    #a csv rewritten some other way makes the journal stale
+    if header.get('snapshot') != csv_stamp(csv_path) or header.get('rows') != rows:
+        return None
+    records = []
+    for line in lines[1:]:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            #only the last line can be cut short, by a crash mid-write
+            break
+    return records
+
+
+def replay_journal(ledger, records):
+    for record in records:
+        for column, value in record['values'].items():
+            ledger.iloc[record['row'], ledger.columns.get_loc(column)] = value
+    return ledger
+
+
+def write_csv(ledger, csv_path):
+    '''
+    writes the ledger csv through a temporary file,
+    so readers never see a half-written ledger
+    '''
+    part_path = csv_path + '.part'
+    ledger.to_csv(part_path, sep='|', index=False)
+    os.replace(part_path, csv_path)
+
+
+def database_is_newer(csv_path):
+    '''
+    True if the ledger's SQLite copy exists and was written after the csv
+    '''
+    store = LedgerStore(csv_path)
+    db_time = store.modified_time()
+    if db_time is None:
+        return False
+    if not os.path.exists(csv_path):
+        return True
+    return db_time >= os.stat(csv_path).st_mtime_ns
+
+
+def ledger_exists(csv_path):
+    return os.path.exists(csv_path) or os.path.exists(db_path(csv_path))
+
+
+def load_ledger(csv_path):
+    '''
+    reads the ledger from whichever of the csv and the database was written last,
+    with the journal replayed on top of the csv
+    '''
+    if database_is_newer(csv_path):
+        store = LedgerStore(csv_path)
+        try:
+            return store.read()
+        finally:
+            store.close()
+    ledger = pd.read_csv(csv_path, sep='|')
+    records = read_journal(csv_path, len(ledger))
+    if records:
+        replay_journal(ledger, records)
+    return ledger
+
+
+def update_unique_row(csv_path, values, **where):
+    '''
+    sets columns of the single ledger row matching where, in whichever of the
+    csv and the database was written last. with a journal the change is
+    appended to it instead of rewriting the csv. returns how many rows matched,
+    nothing is changed unless exactly one did
+    '''
+    if database_is_newer(csv_path):
+        store = LedgerStore(csv_path)
+        try:
+            return store.update_unique_row(values, **where)
+        finally:
+            store.close()
+    ledger = pd.read_csv(csv_path, sep='|')
+    records = read_journal(csv_path, len(ledger))
+    if records:
+        replay_journal(ledger, records)
+    mask = pd.Series(True, index=ledger.index)
+    for column, value in where.items():
+        mask &= ledger[column] == value
+    matches = int(mask.sum())
+    if matches == 1:
+        if records is not None:
+            journal = LedgerJournal(csv_path)
+            journal.append(int(mask.values.argmax()), **values)
+        else:
+            for column, value in values.items():
+                ledger.loc[mask, column] = value
+            write_csv(ledger, csv_path)
+    return matches
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export the SQLite copy or the journal of a BatchRunner ledger to csv")
+    parser.add_argument("ledger", type=str, help="Path to the ledger csv, e.g. __ledger__.csv (the database and journal are found next to it)")
+    parser.add_argument("-o", "--output", type=str, help="Write the csv here instead of over the ledger csv")
+    args = parser.parse_args()
+    if database_is_newer(args.ledger):
+        LedgerStore(args.ledger).export_csv(args.output)
+    else:
+        ledger = load_ledger(args.ledger)
+        if args.output:
+            write_csv(ledger, args.output)
+        else:
+            LedgerJournal(args.ledger).compact(ledger)
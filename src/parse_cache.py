@@ -0,0 +1,228 @@
+import os
+import json
+import time
+import sqlite3
+import tempfile
+import numpy as np
+
+#ON-DISK CACHE OF extract_data RESULTS
+
+# Results are keyed by the output's absolute path and the content hash of the
+# ruleset, and are only returned while the output's size, mtime and inode
+# still match the ones recorded when it was parsed.
+#
+# The cache is off unless asked for. SQLite in WAL mode needs shared memory
+# and working locks, which NFS (where $HOME usually is on a cluster) does not
+# give, so 'on' puts it in the node-local temporary directory. Only point it
+# at a path on a local disk.
+
+DEFAULT_CACHE_PATH = os.path.join(tempfile.gettempdir(), f'ccbatchman-{os.getuid()}', 'parse_cache.sqlite')
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024 #total size of stored results before eviction
+EVICT_EVERY = 500 #check the size bound after this many writes
+TOUCH_AFTER = 3600 #seconds before a hit refreshes an entry's last_used time
+
+#set this to 'on' for the cache at DEFAULT_CACHE_PATH, or to a path on a local disk.
+#unset or 'off' leaves it disabled
+CACHE_ENV_VAR = 'CCBATCHMAN_PARSE_CACHE'
+
+
+def cache_path(setting):
+    '''
+    the cache file a CCBATCHMAN_PARSE_CACHE style setting asks for, None for off
+    '''
+    if setting is None or setting.strip().lower() in ('', 'off', 'none', '0'):
+        return None
+    if setting.strip().lower() in ('on', '1'):
+        return DEFAULT_CACHE_PATH
+    return setting
+
+
+class ParseCache:
+    '''
+    SQLite file mapping (output path, ruleset hash) to a parse result,
+    with least-recently-used eviction once the stored results
+    grow past max_bytes
+    '''
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.connection = None
+        self.pid = None
+        self.broken = False
+        self.writes = 0
+
+    def connect(self):
+        #connections can't be shared with forked worker processes
+        if self.connection is not None and self.pid == os.getpid():
+            return self.connection
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute(
+            '''CREATE TABLE IF NOT EXISTS parse_results (
+                   path TEXT NOT NULL,
+                   ruleset_hash TEXT NOT NULL,
+                   size INTEGER NOT NULL,
+                   mtime_ns INTEGER NOT NULL,
+                   inode INTEGER NOT NULL,
+                   data TEXT NOT NULL,
+                   last_used REAL NOT NULL,
+                   PRIMARY KEY (path, ruleset_hash)
+               )'''
+        )
+        connection.execute(
+            'CREATE INDEX IF NOT EXISTS parse_results_last_used ON parse_results (last_used)'
+        )
+        connection.commit()
+        self.connection = connection
+        self.pid = os.getpid()
+        return connection
+
+    def run(self, function, *args):
+        '''
+        runs a cache operation, disabling the cache for this process
+        instead of raising if the database is unusable
+        '''
+        if self.broken:
+            return None
+        try:
+            return function(self.connect(), *args)
+        except sqlite3.Error as e:
+            print(f"Warning: parse cache at {self.path} disabled: {e}")
+            self.broken = True
+            return None
+
+    @staticmethod
+    def file_key(read_filename):
+        stat = os.stat(read_filename)
+        return os.path.abspath(read_filename), stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+    def get(self, read_filename, ruleset):
+        '''
+        cached result for this output and ruleset, or None if it is
+        missing or the output has changed since it was parsed
+        '''
+        path, size, mtime_ns, inode = self.file_key(read_filename)
+        def get_row(connection):
+            row = connection.execute(
+                'SELECT size, mtime_ns, inode, data, last_used FROM parse_results '
+                'WHERE path = ? AND ruleset_hash = ?',
+                (path, ruleset.digest)
+            ).fetchone()
+            if row is None or tuple(row[:3]) != (size, mtime_ns, inode):
+                return None
+            now = time.time()
+            if now - row[4] > TOUCH_AFTER:
+                connection.execute(
+                    'UPDATE parse_results SET last_used = ? WHERE path = ? AND ruleset_hash = ?',
+                    (now, path, ruleset.digest)
+                )
+                connection.commit()
+            return row[3]
+        data = self.run(get_row)
+        if data is None:
+            return None
+        return json.loads(data, object_hook=decode_array)
+
+    def put(self, read_filename, ruleset, data):
+        path, size, mtime_ns, inode = self.file_key(read_filename)
+        def put_row(connection):
+            connection.execute(
+                'INSERT OR REPLACE INTO parse_results '
+                '(path, ruleset_hash, size, mtime_ns, inode, data, last_used) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (path, ruleset.digest, size, mtime_ns, inode, json.dumps(data, default=encode_array), time.time())
+            )
+            connection.commit()
+        self.run(put_row)
+        self.writes += 1
+        if self.writes % EVICT_EVERY == 0:
+            self.evict()
+
+    def invalidate(self, read_filename=None):
+        '''
+        drops the entries for one output, or every entry if none is given
+        '''
+        def delete_rows(connection):
+            if read_filename is None:
+                connection.execute('DELETE FROM parse_results')
+            else:
+                connection.execute(
+                    'DELETE FROM parse_results WHERE path = ?',
+                    (os.path.abspath(read_filename),)
+                )
+            connection.commit()
+        self.run(delete_rows)
+
+    def evict(self):
+        '''
+        deletes least recently used entries until the stored results
+        fit in max_bytes
+        '''
+        def evict_rows(connection):
+            total = connection.execute(
+                'SELECT COALESCE(SUM(LENGTH(data)), 0) FROM parse_results'
+            ).fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            rows = connection.execute(
+                'SELECT path, ruleset_hash, LENGTH(data) FROM parse_results ORDER BY last_used'
+            )
+            doomed = []
+            for path, ruleset_hash, length in rows:
+                if total <= self.max_bytes:
+                    break
+                doomed.append((path, ruleset_hash))
+                total -= length
+            connection.executemany(
+                'DELETE FROM parse_results WHERE path = ? AND ruleset_hash = ?', doomed
+            )
+            connection.commit()
+        self.run(evict_rows)
+
+
+# results from array rules hold numpy arrays
+def encode_array(value):
+    if isinstance(value, np.ndarray):
+        return {'__ndarray__' : value.tolist(), 'dtype' : value.dtype.str}
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def decode_array(obj):
+    if '__ndarray__' in obj:
+        return np.array(obj['__ndarray__'], dtype=obj['dtype'])
+    return obj
+
+
+default_cache = None
+
+def get_default_cache():
+    '''
+    the process-wide cache used by file_parser.extract_data,
+    or None if it has been turned off
+    '''
+    global default_cache
+    if default_cache is None:
+        path = cache_path(os.environ.get(CACHE_ENV_VAR, None))
+        default_cache = ParseCache(path) if path else False
+    return default_cache or None
+
+
+def set_default_cache(path, max_bytes=DEFAULT_MAX_BYTES):
+    '''
+    points the process-wide cache at another file, 'on' for DEFAULT_CACHE_PATH; None turns it off
+    '''
+    global default_cache
+    path = cache_path(path)
+    default_cache = ParseCache(path, max_bytes) if path else False
+    return get_default_cache()
+
+
+def invalidate(read_filename=None):
+    cache = get_default_cache()
+    if cache is not None:
+        cache.invalidate(read_filename)
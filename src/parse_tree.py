@@ -24,8 +24,7 @@ class ParseTree:
         return self.root_node.data
     
     def write_json(self):
-        with open(self.root_node.json_path,'w') as json_file:
-            json.dump(self.data,json_file,indent=2)
+        file_parser.write_data_json(self.data,self.root_node.json_path,indent=2)
     
     def depth_first_parse(self,node=None,dirpath=None):
         current_node = node if node else self.root_node
@@ -56,7 +55,7 @@ class ParseTree:
         if current_node.data:
             current_node.write_json() #consider putting this in a conditional, like if data: 
         if not current_node.data:
-            raise RuntimeError(f'Parsing failed!\ndumping data:\n{json.dumps(current_node.data,indent=2)}')
+            raise RuntimeError(f'Parsing failed!\ndumping data:\n{json.dumps(current_node.data,indent=2,default=file_parser.jsonable)}')
     
 
 
@@ -72,14 +71,15 @@ class ParseNode:
         self.directory = "" #full path to the directory this uses
         self.basename = basename
         self.lazy = kwargs.get('lazy',False) 
+        #if set, only these variables are read; no json is written and no postprocessing is run
+        self.fields = kwargs.get('fields',None)
 
     @property
     def json_path(self):
         return os.path.join(self.directory,self.basename) + '.json'
     
     def write_json(self):
-        with open(self.json_path, 'w') as json_file:
-            json.dump(self.data,json_file,indent = "")
+        file_parser.write_data_json(self.data,self.json_path,indent = "")
 
     def parse_data():
         raise NotImplementedError('ParseNode is a virtual class')
@@ -97,8 +97,7 @@ class ParseLeaf(ParseNode):
                 print('using new lazy evaluation')
                 print('note - no postprocessing this way')
                 print('-------------------------')
-            with open(self.json_path,'r') as json_file:
-                self.data = json.load(json_file)
+            self.data = file_parser.read_data_json(self.json_path)
             return self
             
         #TODO: fix this bad code
@@ -129,14 +128,14 @@ class ParseLeaf(ParseNode):
             gaussian_output_file = self.json_path[:-5] + '.log'
 
             
-            if os.path.exists(orca_output_file):
+            if file_parser.output_exists(orca_output_file):
                 ruleset = os.path.basename(ORCARULES)
                 
                 if self.debug:    
                     print('inferring ORCA - .out extension found') 
                     print(orca_output_file)
             
-            elif os.path.exists(gaussian_output_file):
+            elif file_parser.output_exists(gaussian_output_file):
                 ruleset = os.path.basename(GAUSSIANRULES)
                 if self.debug:
                     print('inferring Gaussian - .log extension found')
@@ -153,6 +152,8 @@ class ParseLeaf(ParseNode):
         # Okay, it might be good to be able to handle there not being a run info path.
         # we can check whether the job basename .log exists or job basename .out exists and infer ORCA or Gaussian by default.
 
+        if self.fields is not None and ruleset:
+            return self.parse_fields(ruleset)
         
         
         if not os.path.exists(self.json_path) and ruleset:
@@ -163,8 +164,7 @@ class ParseLeaf(ParseNode):
                 output_file = self.json_path[:-5] + '.out'
                 
             data = file_parser.extract_data(output_file,ruleset) #this will cause errors sometimes probably. idk. TODO: change this before others use it.
-            with open (self.json_path,'w') as json_file:
-                json.dump(data,json_file,indent=2) #okay no time like the present!
+            file_parser.write_data_json(data,self.json_path,indent=2) #okay no time like the present!
                 
             self.data = data
         
@@ -179,13 +179,12 @@ class ParseLeaf(ParseNode):
                 if self.debug: print(f'parsing output at {output_file}')
 
                 
-                if os.path.exists(output_file): #okay why are we doing this twice
+                if file_parser.output_exists(output_file): #okay why are we doing this twice
                     # TODO: fix this
                     data = file_parser.extract_data(output_file,ruleset)
                 
-                elif not os.path.exists(output_file): #what. why didn't this work.
-                    with open(self.json_path,'r') as json_data:
-                        self.data = json.load(json_data)
+                elif not file_parser.output_exists(output_file): #what. why didn't this work.
+                    self.data = file_parser.read_data_json(self.json_path)
                     return self  #???? why do we return? oh, postprocessing would break w/ no output. that's a lesson in touching stuff I don't understand
                     #TODO: SHOULD FLAG AN ERROR HERE
 
@@ -197,7 +196,7 @@ class ParseLeaf(ParseNode):
                 # print("data before postprocessing")
                 # print(self.data)
                 
-                if os.path.basename(ruleset) == os.path.basename(ORCARULES) and os.path.exists(output_file):
+                if os.path.basename(ruleset) == os.path.basename(ORCARULES) and file_parser.output_exists(output_file):
                     pp = postprocessing.OrcaPostProcessor(debug=self.debug)
                     pp.data = self.data
                     pp.thermal_energies()
@@ -210,7 +209,7 @@ class ParseLeaf(ParseNode):
 
                 ###########################################
                 #### recently added, look here for errors
-                elif os.path.basename(ruleset) == os.path.basename(GAUSSIANRULES) and os.path.exists(output_file):
+                elif os.path.basename(ruleset) == os.path.basename(GAUSSIANRULES) and file_parser.output_exists(output_file):
                     pp = postprocessing.GaussianPostProcessor(debug=self.debug)
                     pp.data = self.data
                     pp.thermal_energies()
@@ -226,6 +225,31 @@ class ParseLeaf(ParseNode):
                 else:
                     if self.debug: print('file not compatible w/ orca or gaussian pp routine')
         return self
+
+    def parse_fields(self, ruleset):
+        '''
+        reads only self.fields from the output.
+        fields the ruleset doesn't define are skipped.
+        broken-symmetry ORCA energies are still spin corrected, like orca_pp_routine does
+        '''
+        if os.path.basename(GAUSSIANRULES) == os.path.basename(ruleset):
+            output_file = self.json_path[:-5] + '.log'
+        else:
+            output_file = self.json_path[:-5] + '.out'
+        if self.debug: print(f'parsing {self.fields} from output at {output_file}')
+        compiled = file_parser.get_ruleset(ruleset)
+        fields = [field for field in self.fields if any(rule.provides(field) for rule in compiled.rules())]
+        self.data = file_parser.extract_data(output_file, compiled, fields=fields)
+        if os.path.basename(ruleset) == os.path.basename(ORCARULES):
+            pp = postprocessing.OrcaPostProcessor(debug=self.debug)
+            pp.data = self.data
+            pp.prune_data()
+            try:
+                pp.spin_corrected_bs_energies()
+            except:
+                if self.debug: print('no broken-symmetry energies to correct')
+            self.data = pp.data
+        return self
                   
 
 
@@ -314,7 +338,7 @@ class CompoundNode(ParseNode):
                         print(f'conversion_key: {conversion_key}')
                         print(f'data: {of_data.get(conversion_key,None)}')
                         print('dumping data:')
-                        print(json.dumps(self.children[self.opt_freq_key].data,indent=2))
+                        print(json.dumps(self.children[self.opt_freq_key].data,indent=2,default=file_parser.jsonable))
                         print('---------------------')
                     raise ValueError(f'Missing expected thermochemistry data. Path: {self.children[self.opt_freq_key].directory}')
                 data[thermal_key] = of_data[conversion_key] - of_data['E_el_au']
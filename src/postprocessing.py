@@ -43,14 +43,12 @@ class OrcaPostProcessor:
 
     def read_json(self,filename = None):
         if filename is None: filename = self.json_path
-        with open(filename,'r') as json_file:
-            self.data = json.load(json_file)
+        self.data = file_parser.read_data_json(filename)
 
     #check syntax
     def write_json(self,filename = None):
         if filename is None: filename = self.json_path
-        with open(filename,'w') as json_file:
-            json.dump(self.data,json_file,indent="")
+        file_parser.write_data_json(self.data,filename,indent="")
 
     def read_raw_state(self):
         self.data = file_parser.extract_data(self.output_path,self.parser_rules_path)
@@ -63,11 +61,10 @@ class OrcaPostProcessor:
         here, we parse everything [2.00, 0.00]
         '''
         if self.debug: print(F"reading file at {self.output_path}")
-        with open(self.output_path,'r') as output_file:
-            lines = output_file.readlines()
         occupations = []
         search = False
-        for line in lines:
+        # the loop starts over at every header, so begin at the last one
+        for line in file_parser.iter_lines_from_last(self.output_path, [r'^\s*UHF\s+NATURAL\s+ORBITALS']):
             if re.match(r'\s*UHF\s+NATURAL\s+ORBITALS',line):
                 search = True
                 occupations = []
@@ -289,14 +286,12 @@ class GaussianPostProcessor:
 
     def read_json(self,filename = None):
         if filename is None: filename = self.json_path
-        with open(filename,'r') as json_file:
-            self.data = json.load(json_file)
+        self.data = file_parser.read_data_json(filename)
 
     #check syntax
     def write_json(self,filename = None):
         if filename is None: filename = self.json_path
-        with open(filename,'w') as json_file:
-            json.dump(self.data,json_file,indent="")
+        file_parser.write_data_json(self.data,filename,indent="")
 
     def read_raw_state(self):
         self.data = file_parser.extract_data(self.output_path,self.parser_rules_path)
@@ -309,11 +304,10 @@ class GaussianPostProcessor:
         here, we parse everything [2.00, 0.00]
         '''
         if self.debug: print(F"reading file at {self.output_path}")
-        with open(self.output_path,'r') as output_file:
-            lines = output_file.readlines()
         occupations = []
         search = False
-        for line in lines:
+        # the loop starts over at every header, so begin at the last one
+        for line in file_parser.iter_lines_from_last(self.output_path, [r'Natural Orbital Coefficients']):
             if re.search(r'Natural Orbital Coefficients',line):
                 search = True
                 occupations = []
@@ -425,11 +419,9 @@ class GaussianPostProcessor:
 
     def parse_spin_squared(self):
         if self.debug: print(F"reading file at {self.output_path}")
-        with open(self.output_path,'r') as output_file:
-            lines = output_file.readlines()
         occupations = []
         search = False
-        for line in lines:
+        for line in file_parser.iter_lines(self.output_path):
             search_string = r'(?:<S\*\*2>=\s*)(-?\d\.\d+)' 
             match = re.search(search_string,line)
             if match:
@@ -9,6 +9,7 @@ import json
 import input_combi
 import helpers
 import file_parser
+import ledger_store
 
 # Paths relative to this file's location
 _THIS_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -34,7 +35,8 @@ def load_ledger(working_path: str,ledger_filename: str = '__ledger__.csv') -> pd
     Returns:
         DataFrame with ledger data for batch run
     """
-    ledger = pd.read_csv(os.path.join(working_path,ledger_filename),sep='|')
+    # the csv, or its SQLite copy if that was written more recently
+    ledger = ledger_store.load_ledger(os.path.join(working_path,ledger_filename))
     return ledger
     
     
@@ -111,7 +113,7 @@ def classify_failures(ledger: pd.DataFrame, working_path: str, verbose: bool = F
 
 
 
-def categorize_errors(data: pd.DataFrame, working_path: str) -> pd.DataFrame:
+def categorize_errors(data: pd.DataFrame, working_path: str, workers: Optional[int] = None) -> pd.DataFrame:
     """
     Further categorize computational chemistry errors in failed jobs.
     
@@ -119,6 +121,7 @@ def categorize_errors(data: pd.DataFrame, working_path: str) -> pd.DataFrame:
         data: DataFrame containing failed job information
         working_path: Base path for all jobs
         file_parser_module: Module containing extract_data function for parsing output files
+        workers: Processes used to parse the outputs (default: all available cpus)
         
     Returns:
         DataFrame with detailed error categories
@@ -126,39 +129,41 @@ def categorize_errors(data: pd.DataFrame, working_path: str) -> pd.DataFrame:
     new_data = data.copy()
     new_data.index = range(0, len(new_data))
     
+    # Find every output first so they can all be parsed in one pool
+    out_paths = {}
     for i, row in new_data.iterrows():
         base_path = os.path.join(working_path, row['system'], row['method'], row['method'])
-        
-        # # Try to find and parse output file
-        out_path = f"{base_path}.out"
-        if os.path.exists(out_path):
+        if file_parser.output_exists(f"{base_path}.out"):
             # ORCA output
-            output = file_parser.extract_data(
-                out_path, 
-                ORCA_RULES_PATH
-            )
-        else:
+            out_paths[i] = (f"{base_path}.out", ORCA_RULES_PATH)
+        elif file_parser.output_exists(f"{base_path}.log"):
             # Gaussian output
-            out_path = f"{base_path}.log"
-            if os.path.exists(out_path):
-                output = file_parser.extract_data(
-                    out_path, 
-                    GAUSSIAN_RULES_PATH
-                )
-            else:
-                # No output file found
-                continue
+            out_paths[i] = (f"{base_path}.log", GAUSSIAN_RULES_PATH)
+    outputs = dict(zip(out_paths, file_parser.extract_many(
+        [out_path for out_path, rules_path in out_paths.values()],
+        [rules_path for out_path, rules_path in out_paths.values()],
+        workers=workers,
+    )))
+    
+    for i, row in new_data.iterrows():
+        base_path = os.path.join(working_path, row['system'], row['method'], row['method'])
+        
+        if i not in outputs:
+            # No output file found
+            continue
+        output = outputs[i]
+        if isinstance(output, Exception):
+            print(f"Could not parse {out_paths[i][0]}: {output}")
+            continue
         
         # # Save parsed data as JSON
         
         json_path = f"{base_path}.json"
-        with open(json_path, 'w') as json_file:
-            json.dump(output, json_file, indent=6)
+        file_parser.write_data_json(output, json_path, indent=6)
             
         # Load JSON to analyze errors
     
-        with open(json_path, 'r') as json_file:
-            run_data = json.load(json_file)
+        run_data = file_parser.read_data_json(json_path)
     
         if run_data.get('normal_exit_opt_freq_2',None) is not None and not run_data.get('normal_exit_opt_freq_2',None):
             print('normal_exit opt freq...')
@@ -4,6 +4,7 @@ import progcheck
 import os
 import re
 import file_parser
+import ledger_store
 import json
 import input_generator
 
@@ -109,7 +110,7 @@ def check_cause(job_status,directory,theory,id=None,old=False,debug=False):
     json_path = f"{base_path}.json"
     # if not os.path.exists(json_path):
     out_path = base_path + '.out'
-    if os.path.exists(out_path):
+    if file_parser.output_exists(out_path):
         # ORCA output
         output = file_parser.extract_data(
             out_path,
@@ -118,7 +119,7 @@ def check_cause(job_status,directory,theory,id=None,old=False,debug=False):
     else:
         # Gaussian output
         out_path = f"{base_path}.log"
-        if os.path.exists(out_path):
+        if file_parser.output_exists(out_path):
             output = file_parser.extract_data(
                 out_path, 
                 gaussian_rules_path
@@ -127,11 +128,9 @@ def check_cause(job_status,directory,theory,id=None,old=False,debug=False):
             outcome = 'could not parse'
             return outcome
     
-    with open(json_path, 'w') as json_file:
-        json.dump(output, json_file, indent=6)
+    file_parser.write_data_json(output, json_path, indent=6)
         
-    with open(json_path, 'r') as json_file:
-        run_data = json.load(json_file)
+    run_data = file_parser.read_data_json(json_path)
     
     if run_data.get('normal_exit_opt_freq_2',None) is not None and not run_data.get('normal_exit_opt_freq_2',None):
         if debug:
@@ -245,8 +244,12 @@ def rewrite_job(row,new_settings,ledger_path):
         # raise ValueError('only implemented for ORCA and Gaussian (and will pass for CREST)')
     base_path = os.path.join(row['job_directory'],row['theory'])
     os.remove(base_path+input_extension)
-    os.remove(base_path+output_extension)
+    os.remove(file_parser.resolve_output(base_path+output_extension))
+    if os.path.exists(file_parser.section_index_path(base_path+output_extension)):
+        os.remove(file_parser.section_index_path(base_path+output_extension))
     os.remove(base_path+'.json')
+    if os.path.exists(file_parser.arrays_path(base_path+'.json')):
+        os.remove(file_parser.arrays_path(base_path+'.json'))
     os.remove(base_path+'.sh')
     os.remove(os.path.join(row['job_directory'],'run_info.json'))
     for file in os.listdir(row['job_directory']):
@@ -273,16 +276,15 @@ def rewrite_job(row,new_settings,ledger_path):
     # (just needs to find row with job id, and update it in place in the dataframe)
     # this code already lives in the batch manager. Steal it from there
     # but which ledger name to use?
-    run_root = os.path.dirname(ledger_path)
-    ledger_basename = os.path.basename(ledger_path)
-    ledger = progcheck.load_ledger(run_root,ledger_basename)
-    index_list = ledger[ledger['job_id'] == job_id].index.tolist()
-    if len(index_list) != 1:
+    # one row, in the SQLite ledger if the runner keeps one
+    matches = ledger_store.update_unique_row(
+        ledger_path,
+        {'job_status' : 'not_started', 'job_id' : -1}, #like it never even happened...
+        job_id=job_id,
+        job_directory=row['job_directory'], #the jobs of a slurm array share one job id
+    )
+    if matches != 1:
         raise ValueError('multiple or zero rows in ledger with same SLURM ID')
-    ledger_index = index_list[0]
-    ledger.loc[ledger_index,'job_status'] = 'not_started' #like it never even happened...
-    ledger.loc[ledger_index,'job_id'] = -1 #like it never even happened...
-    ledger.to_csv(ledger_path,sep='|',index=False)
     return
 
 
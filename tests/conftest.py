@@ -0,0 +1,29 @@
+import os
+import sys
+
+import numpy as np
+
+#the modules in src import each other by bare name
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+src_dir = os.path.join(repo_dir, 'src')
+for path in (src_dir, repo_dir):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+#tests never read or write a parse cache the user may have turned on
+os.environ['CCBATCHMAN_PARSE_CACHE'] = 'off'
+
+RULES_DIR = os.path.join(repo_dir, 'config', 'file_parser_config')
+
+
+def same_data(a, b):
+    '''
+    equality for parse results, which may hold numpy arrays
+    '''
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(same_data(a[key], b[key]) for key in a)
+    if isinstance(a, (list, tuple)) and isinstance(b, (list, tuple)):
+        return len(a) == len(b) and all(same_data(x, y) for x, y in zip(a, b))
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        return np.array_equal(np.asarray(a), np.asarray(b))
+    return a == b
@@ -0,0 +1,61 @@
+import batch_runner
+import job_harness
+
+
+def test_quiet_passes_back_off_to_the_ceiling():
+    poll = batch_runner.AdaptivePoll(min_interval=5.0, max_interval=60.0, backoff=2.0)
+    assert [poll.next_interval(False) for _ in range(5)] == [10.0, 20.0, 40.0, 60.0, 60.0]
+    #anything happening drops straight back to the minimum
+    assert poll.next_interval(True) == 5.0
+    assert poll.next_interval(False) == 10.0
+
+
+def test_short_jobs_lower_the_ceiling():
+    poll = batch_runner.AdaptivePoll(min_interval=5.0, max_interval=300.0)
+    poll.job_finished(600.0)
+    poll.job_finished(1200.0)
+    assert poll.shortest_runtime == 600.0
+    assert poll.ceiling() == 60.0
+    assert max(poll.next_interval(False) for _ in range(10)) == 60.0
+    #never below the minimum, however short the jobs
+    poll.job_finished(1.0)
+    assert poll.ceiling() == 5.0
+    assert poll.next_interval(False) == 5.0
+
+
+def test_max_interval_below_min_is_raised_to_it():
+    poll = batch_runner.AdaptivePoll(min_interval=30.0, max_interval=10.0)
+    assert poll.max_interval == 30.0
+    assert poll.next_interval(False) == 30.0
+
+
+def test_runner_takes_poll_intervals_from_kwargs():
+    runner = batch_runner.BatchRunner(min_poll_interval=2, max_poll_interval=20)
+    assert (runner.poll.min_interval, runner.poll.max_interval) == (2, 20)
+    runner = batch_runner.BatchRunner()
+    assert (runner.poll.min_interval, runner.poll.max_interval) == (5.0, 300.0)
+
+
+def test_wait_returns_early_when_a_watched_output_changes(tmp_path, monkeypatch):
+    runner = batch_runner.BatchRunner(min_poll_interval=1)
+    job = job_harness.ORCAHarness()
+    job.directory = str(tmp_path)
+    job.job_name = 'job'
+    job.job_id = 7
+    runner.jobs = [job]
+    now = [0.0]
+    sleeps = []
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+        if len(sleeps) == 3:
+            (tmp_path / 'job.out').write_text('started\n')
+    monkeypatch.setattr(batch_runner.time, 'monotonic', lambda: now[0])
+    monkeypatch.setattr(batch_runner.time, 'sleep', sleep)
+    assert runner.wait_for_event(60.0) is True
+    assert sleeps == [1, 1, 1]
+    #a running job's output is left to squeue
+    runner.slurm_snapshot.statuses = {7 : 'running'}
+    sleeps.clear()
+    assert runner.wait_for_event(2.5) is False
+    assert sleeps == [1, 1, 0.5]
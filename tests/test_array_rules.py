@@ -0,0 +1,53 @@
+import os
+import json
+
+import numpy as np
+
+import file_parser
+from benchmarks import synthetic_outputs
+from conftest import RULES_DIR, same_data
+
+
+def test_default_rules_write_plain_json(tmp_path):
+    path = synthetic_outputs.write_output('orca', str(tmp_path), '64kb', opt_cycles=5)
+    data = file_parser.extract_data(path, os.path.join(RULES_DIR, 'orca_rules.dat'), use_cache=False)
+    assert not any(isinstance(value, np.ndarray) for value in data.values())
+    json_path = str(tmp_path / 'job.json')
+    file_parser.write_data_json(data, json_path)
+    assert not os.path.exists(file_parser.arrays_path(json_path))
+    with open(json_path, 'r') as json_file:
+        assert json.load(json_file) == data
+
+
+def test_array_rules_collect_every_match(tmp_path):
+    path = synthetic_outputs.write_output('orca', str(tmp_path), '64kb', opt_cycles=5)
+    data = file_parser.extract_data(path, os.path.join(RULES_DIR, 'orca_array_rules.dat'), use_cache=False)
+    assert data['E_el_cycles_au'].shape == (5,)
+    assert data['max_gradient_cycles_au'].shape == (5,)
+    assert data['vib_frequencies_cm-1'].shape == (30,) #3 * 10 atoms
+    assert data['excite_E_au'].shape == (10,)
+    assert data['E_el_cycles_au'].dtype == float
+    #nothing matched still gives an array
+    path = synthetic_outputs.write_output('gaussian', str(tmp_path), '64kb', opt_cycles=5)
+    data = file_parser.extract_data(path, os.path.join(RULES_DIR, 'orca_array_rules.dat'), use_cache=False)
+    assert data['excite_E_au'].shape == (0,)
+
+
+def test_arrays_round_trip_through_json(tmp_path):
+    path = synthetic_outputs.write_output('gaussian', str(tmp_path), '64kb', opt_cycles=5)
+    rules = os.path.join(RULES_DIR, 'gaussian_array_rules.dat')
+    data = file_parser.extract_data(path, rules, use_cache=False)
+    data['normal_exit'] = True
+    data['steps'] = np.arange(3)
+    json_path = str(tmp_path / 'job.json')
+    file_parser.write_data_json(data, json_path, indent=2)
+    assert os.path.exists(file_parser.arrays_path(json_path))
+    read_back = file_parser.read_data_json(json_path)
+    assert same_data(read_back, data)
+    assert read_back['steps'].dtype == data['steps'].dtype
+    #plain json sees placeholders where the arrays were
+    with open(json_path, 'r') as json_file:
+        placeholders = json.load(json_file)
+    assert placeholders['E_el_cycles_au']['shape'] == [5]
+    assert '__array__' in placeholders['max_force_cycles_au']
+    assert placeholders['normal_exit'] is True
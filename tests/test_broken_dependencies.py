@@ -0,0 +1,45 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import batch_runner
+
+
+def make_runner(root):
+    # a <- b through coordinates, a <- c through orbitals only, c <- d
+    rows = []
+    for name, coords_from, orbitals_from in (('a', None, None), ('b', 'a', None), ('c', None, 'a'), ('d', 'c', None)):
+        os.makedirs(os.path.join(root, name))
+        rows.append({
+            'job_basename' : name,
+            'job_directory' : os.path.join(root, name),
+            'job_status' : 'not_started',
+            'job_id' : np.nan,
+            'coords_from' : f"../{coords_from}" if coords_from else np.nan,
+            'xyz_filename' : f"{coords_from}.xyz" if coords_from else np.nan,
+            'orbitals_from' : f"../{orbitals_from}" if orbitals_from else np.nan,
+            'gbw_filename' : f"{orbitals_from}.gbw" if orbitals_from else np.nan,
+        })
+    runner = batch_runner.BatchRunner()
+    runner.ledger = pd.DataFrame(rows)
+    runner.build_dependency_graph()
+    return runner
+
+
+def test_orbital_pipes_break_like_coordinate_pipes(tmp_path):
+    runner = make_runner(str(tmp_path))
+    runner._set_job_status(0, 'failed')
+    #the jobs reading a's files directly
+    assert [runner.dependencies_broken(row) for index, row in runner.ledger.iterrows()] == [False, True, True, False]
+    runner.flag_broken_dependencies([0])
+    assert runner.ledger['job_status'].tolist() == ['failed', 'broken_dependency', 'broken_dependency', 'broken_dependency']
+    #and every job downstream of a broken one is broken too
+    assert all(runner.dependencies_broken(row) for index, row in runner.ledger.iloc[1:].iterrows())
+
+
+def test_rerun_clears_broken_upstream(tmp_path):
+    runner = make_runner(str(tmp_path))
+    runner._set_job_status(0, 'failed')
+    runner._set_job_status(0, 'not_started')
+    assert not any(runner.dependencies_broken(row) for index, row in runner.ledger.iterrows())
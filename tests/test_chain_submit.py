@@ -0,0 +1,106 @@
+import os
+import json
+import subprocess
+
+import numpy as np
+import pandas as pd
+
+import batch_runner
+import job_harness
+from benchmarks import synthetic_outputs
+from test_job_arrays import make_job, fake_sbatch
+
+
+def test_dependent_submission(tmp_path, monkeypatch):
+    job = make_job(str(tmp_path), 'a')
+    calls = fake_sbatch(monkeypatch)
+    job.submit_job(after=[101, '200_3'], script='job.chain.sh')
+    assert calls == [('sbatch --dependency=afterok:101:200_3 --kill-on-invalid-dep=yes job.chain.sh', job.directory)]
+    with open(os.path.join(job.directory, 'run_info.json'), 'r') as json_file:
+        assert json.load(json_file)['after'] == [101, '200_3']
+    #and without upstream jobs, the plain script
+    job.submit_job()
+    assert calls[1] == ('sbatch job.sh', job.directory)
+    assert job.after == []
+
+
+def test_chain_script_runs_the_prologue_first(tmp_path):
+    job = make_job(str(tmp_path), 'a')
+    for prologue, ran in (('true', True), ('false', False)):
+        chain_filename = job.chain_script(prologue)
+        assert chain_filename == 'job.chain.sh'
+        with open(os.path.join(job.directory, chain_filename), 'r') as script:
+            lines = script.read().splitlines()
+        #after every #SBATCH line, or sbatch would stop reading them
+        assert lines[:5] == ['#!/bin/bash', '#SBATCH -J a', '#SBATCH -o a.log', '#SBATCH -n 4', '#SBATCH -t 1:00:00']
+        assert lines[5] == f"{prologue} || exit 1"
+        process = subprocess.run(['bash', chain_filename], cwd=job.directory, env=dict(os.environ, SLURM_SUBMIT_DIR=job.directory),
+                                 stdout=subprocess.PIPE)
+        assert (process.returncode == 0) == ran
+        assert (process.stdout.decode() == f"ran in {job.directory}\n") == ran
+
+
+def make_runner(root):
+    # a <- b <- c, and d on its own. a is in the queue
+    jobs = [make_job(root, name) for name in ('a', 'b', 'c', 'd')]
+    upstream = (None, 'a', 'b', None)
+    runner = batch_runner.BatchRunner(chain_submit=True, num_jobs=3)
+    runner.scratch_directory = root
+    runner.ledger = pd.DataFrame({
+        'job_id' : [100, -1, -1, -1],
+        'job_basename' : ['job'] * 4,
+        'job_directory' : [job.directory for job in jobs],
+        'program' : ['orca'] * 4,
+        'job_status' : ['pending', 'not_started', 'not_started', 'not_started'],
+        'coords_from' : [np.nan if name is None else f"../{name}" for name in upstream],
+        'xyz_filename' : [np.nan if name is None else f"{name}.xyz" for name in upstream],
+        'orbitals_from' : [np.nan] * 4,
+        'gbw_filename' : [np.nan] * 4,
+    })
+    runner.build_dependency_graph()
+    runner.slurm_snapshot.statuses = {100 : 'pending'}
+    jobs[0].job_id = 100
+    jobs[0].status = 'pending'
+    runner.jobs.append(jobs[0])
+    return runner, jobs
+
+
+def test_runner_queues_down_the_chain(tmp_path, monkeypatch):
+    runner, jobs = make_runner(str(tmp_path))
+    calls = fake_sbatch(monkeypatch)
+    runner.queue_chained_jobs()
+    #b behind a, c behind b, and d is left to queue_new_jobs
+    assert calls == [
+        ('sbatch --dependency=afterok:100 --kill-on-invalid-dep=yes job.chain.sh', jobs[1].directory),
+        ('sbatch --dependency=afterok:4242 --kill-on-invalid-dep=yes job.chain.sh', jobs[2].directory),
+    ]
+    assert runner.ledger['job_status'].tolist() == ['pending', 'pending', 'pending', 'not_started']
+    assert runner.ledger['job_id'].tolist() == [100, 4242, 4243, -1]
+    assert runner.dependency_graph.count('pending') == 3
+    #waiting on upstream jobs is not runtime
+    assert 4242 not in runner.submit_times
+    with open(os.path.join(jobs[2].directory, 'job.chain.json'), 'r') as json_file:
+        spec = json.load(json_file)
+    assert spec['row']['coords_from'] == '../b'
+    assert spec['row']['orbitals_from'] is None
+    assert spec['upstream'] == [{'directory' : jobs[1].directory, 'job_name' : 'job', 'program' : 'orca'}]
+    with open(os.path.join(jobs[2].directory, 'job.chain.sh'), 'r') as script:
+        assert f"chain_prologue.py {os.path.join(jobs[2].directory, 'job.chain.json')} || exit 1\n" in script.read()
+    #the budget is spent
+    runner.queue_chained_jobs()
+    assert len(calls) == 2
+
+
+def test_chain_prologue_checks_upstream_output(tmp_path):
+    runner, jobs = make_runner(str(tmp_path))
+    spec = {
+        'row' : {'job_directory' : jobs[3].directory, 'job_basename' : 'job', 'program' : 'orca',
+                 'coords_from' : None, 'xyz_filename' : None, 'orbitals_from' : None, 'gbw_filename' : None},
+        'upstream' : [{'directory' : jobs[0].directory, 'job_name' : 'job', 'program' : 'orca'}],
+    }
+    with open(os.path.join(jobs[0].directory, 'job.out'), 'w') as output:
+        output.write("ORCA TERMINATED WITH ERRORS\n")
+    #afterok only says a exited cleanly
+    assert not runner.chain_prologue(spec)
+    synthetic_outputs.write_orca_output(os.path.join(jobs[0].directory, 'job.out'), 64 * 1024, opt_cycles=5)
+    assert runner.chain_prologue(spec)
@@ -0,0 +1,76 @@
+import os
+import gzip
+
+import pytest
+
+import file_parser
+import job_harness
+from benchmarks import synthetic_outputs
+from conftest import RULES_DIR, same_data
+
+ORCA_RULES = os.path.join(RULES_DIR, 'orca_rules.dat')
+
+
+def test_gzip_output_reads_like_the_original(tmp_path):
+    path = synthetic_outputs.write_output('orca', str(tmp_path), '64kb', opt_cycles=5)
+    with open(path, 'r') as output:
+        lines = output.readlines()
+    full = file_parser.extract_data(path, ORCA_RULES, use_cache=False)
+    stat = os.stat(path)
+
+    assert file_parser.compress_output(path, 'gz') == path + '.gz'
+    assert not os.path.exists(path)
+    #callers keep using the uncompressed name
+    assert file_parser.output_exists(path)
+    assert file_parser.is_compressed(path)
+    assert file_parser.resolve_output(path) == path + '.gz'
+    assert os.stat(path + '.gz').st_mtime_ns == stat.st_mtime_ns
+    with gzip.open(path + '.gz', 'rt') as output:
+        assert output.readlines() == lines
+    assert list(file_parser.iter_lines(path)) == lines
+    assert same_data(file_parser.extract_data(path, ORCA_RULES, use_cache=False), full)
+    assert same_data(file_parser.probe_data(path, ORCA_RULES), full)
+    data, state = file_parser.extract_data_incremental(path, ORCA_RULES)
+    assert same_data(data, full)
+    #compressed outputs are finished, the state is kept as long as the file is the same
+    assert file_parser.extract_data_incremental(path, ORCA_RULES, state)[1] is state
+
+
+def test_missing_output_is_not_resolved(tmp_path):
+    path = str(tmp_path / 'job.out')
+    assert file_parser.resolve_output(path) == path
+    assert not file_parser.output_exists(path)
+    #compressing a missing output is a no-op
+    assert file_parser.compress_output(path, 'gz') == path
+
+
+def test_harness_finds_compressed_output(tmp_path):
+    path = synthetic_outputs.write_orca_output(str(tmp_path / 'job.out'), 64 * 1024, opt_cycles=5)
+    harness = job_harness.ORCAHarness()
+    harness.directory = str(tmp_path)
+    harness.job_name = 'job'
+    assert harness.compress_output('gz') == path + '.gz'
+    harness.check_success_static()
+    assert harness.status == 'succeeded'
+
+
+def test_zst_without_zstandard_raises(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_parser, 'zstandard', None)
+    path = tmp_path / 'job.out'
+    path.write_text('x\n')
+    with pytest.raises(RuntimeError):
+        file_parser.compress_output(str(path), 'zst')
+    assert path.exists()
+    (tmp_path / 'other.out.zst').write_bytes(b'')
+    with pytest.raises(RuntimeError):
+        list(file_parser.iter_lines(str(tmp_path / 'other.out')))
+    with pytest.raises(ValueError):
+        file_parser.compress_output(str(path), 'bz2')
+
+
+def test_zst_output_reads_like_the_original(tmp_path):
+    pytest.importorskip('zstandard')
+    path = synthetic_outputs.write_output('orca', str(tmp_path), '64kb', opt_cycles=5)
+    full = file_parser.extract_data(path, ORCA_RULES, use_cache=False)
+    assert file_parser.compress_output(path, 'zst') == path + '.zst'
+    assert same_data(file_parser.extract_data(path, ORCA_RULES, use_cache=False), full)
@@ -0,0 +1,165 @@
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+from dependency_graph import DependencyGraph
+
+
+def make_ledger(root, jobs):
+    '''
+    ledger with a row per (name, coords_from, status), each job in root/name
+    '''
+    rows = []
+    for name, coords_from, status in jobs:
+        os.makedirs(os.path.join(root, name), exist_ok=True)
+        rows.append({
+            'job_basename' : name,
+            'job_directory' : os.path.join(root, name),
+            'job_status' : status,
+            'coords_from' : np.nan if coords_from is None else f"../{coords_from}",
+            'xyz_filename' : np.nan if coords_from is None else f"{coords_from}.xyz",
+            'orbitals_from' : np.nan,
+            'gbw_filename' : np.nan,
+        })
+    return pd.DataFrame(rows)
+
+
+def write_xyz(root, name):
+    with open(os.path.join(root, name, f"{name}.xyz"), 'w') as xyz_file:
+        xyz_file.write('1\n\nH 0 0 0\n')
+
+
+def chain_ledger(root):
+    # a <- b <- c, and d on its own
+    return make_ledger(root, [
+        ('a', None, 'not_started'),
+        ('b', 'a', 'not_started'),
+        ('c', 'b', 'not_started'),
+        ('d', None, 'not_started'),
+    ])
+
+
+def test_only_jobs_without_pending_upstream_are_ready(tmp_path):
+    graph = DependencyGraph(chain_ledger(str(tmp_path)))
+    assert graph.ready_jobs() == [0, 3]
+    assert graph.ready_jobs(limit=1) == [0]
+    assert graph.count('not_started') == 4
+
+
+def test_success_readies_downstream_once_coordinates_exist(tmp_path):
+    root = str(tmp_path)
+    graph = DependencyGraph(chain_ledger(root))
+    graph.set_status(0, 'succeeded')
+    #the counter is satisfied, but b reads a.xyz which is not there yet
+    assert graph.remaining[1] == 0
+    assert graph.ready_jobs() == [3]
+    write_xyz(root, 'a')
+    assert graph.ready_jobs() == [1, 3]
+    assert list(graph.mask(chain_ledger(root))) == [True, True, False, True]
+    #a job that starts is no longer ready, and an undone success blocks again
+    graph.set_status(1, 'pending')
+    assert graph.ready_jobs() == [3]
+    graph.set_status(0, 'not_started')
+    assert graph.remaining[1] == 1
+    assert graph.count('succeeded') == 0
+
+
+def test_upstream_outside_ledger_is_read_from_run_info(tmp_path):
+    root = str(tmp_path)
+    ledger = make_ledger(root, [('b', 'outside', 'not_started')])
+    os.makedirs(os.path.join(root, 'outside'))
+    write_xyz(root, 'outside')
+    run_info_path = os.path.join(root, 'outside', 'run_info.json')
+    with open(run_info_path, 'w') as run_info_file:
+        json.dump({'status' : 'running'}, run_info_file)
+    graph = DependencyGraph(ledger)
+    assert graph.ready_jobs() == []
+    with open(run_info_path, 'w') as run_info_file:
+        json.dump({'status' : 'succeeded'}, run_info_file)
+    assert graph.ready_jobs() == [0]
+
+
+def test_failure_reaches_the_whole_downstream_subtree(tmp_path):
+    root = str(tmp_path)
+    # a <- b <- c <- e, and a <- f
+    ledger = make_ledger(root, [
+        ('a', None, 'not_started'),
+        ('b', 'a', 'not_started'),
+        ('c', 'b', 'not_started'),
+        ('e', 'c', 'not_started'),
+        ('f', 'a', 'not_started'),
+    ])
+    graph = DependencyGraph(ledger)
+    graph.set_status(0, 'failed')
+    assert os.path.abspath(os.path.join(root, 'a')) in graph.failed_paths
+    broken_from = ('not_started', 'failed', 'broken_dependency')
+    assert sorted(graph.downstream_of([0], statuses=broken_from)) == [1, 2, 3, 4]
+    for index in graph.downstream_of([0], statuses=broken_from):
+        graph.set_status(index, 'broken_dependency')
+    assert graph.count(*('failed', 'broken_dependency')) == 5
+    assert graph.ready_jobs() == []
+
+
+def test_propagation_stops_at_jobs_outside_the_statuses(tmp_path):
+    root = str(tmp_path)
+    ledger = make_ledger(root, [
+        ('a', None, 'failed'),
+        ('b', 'a', 'succeeded'),
+        ('c', 'b', 'not_started'),
+        ('d', 'a', 'running'),
+        ('e', 'd', 'not_started'),
+        ('f', 'a', 'not_started'),
+    ])
+    graph = DependencyGraph(ledger)
+    assert sorted(graph.downstream_of([0])) == [1, 2, 3, 4, 5]
+    assert graph.downstream_of([0], statuses=('not_started', 'failed', 'broken_dependency')) == [5]
+
+
+def test_failed_paths_follow_retries(tmp_path):
+    root = str(tmp_path)
+    graph = DependencyGraph(make_ledger(root, [('a', None, 'failed'), ('b', 'a', 'not_started')]))
+    a_path = os.path.abspath(os.path.join(root, 'a'))
+    assert graph.failed_paths == {a_path}
+    graph.set_status(0, 'not_started')
+    assert graph.failed_paths == set()
+    assert graph.ready_jobs() == [0]
+
+
+def test_rebuild_keeps_files_already_seen(tmp_path, monkeypatch):
+    root = str(tmp_path)
+    ledger = chain_ledger(root)
+    ledger.loc[0, 'job_status'] = 'succeeded'
+    write_xyz(root, 'a')
+    graph = DependencyGraph(ledger)
+    assert graph.ready_jobs() == [1, 3]
+    #the rebuilt graph does not look for a.xyz again
+    checked = []
+    exists = os.path.exists
+    monkeypatch.setattr(os.path, 'exists', lambda path: checked.append(path) or exists(path))
+    graph.build(ledger)
+    assert graph.ready_jobs() == [1, 3]
+    assert os.path.join(root, 'a', 'a.xyz') not in checked
+
+
+def test_chainable_jobs_follow_active_upstream(tmp_path):
+    root = str(tmp_path)
+    # a <- b <- c, d <- e
+    graph = DependencyGraph(make_ledger(root, [
+        ('a', None, 'running'),
+        ('b', 'a', 'not_started'),
+        ('c', 'b', 'not_started'),
+        ('d', None, 'failed'),
+        ('e', 'd', 'not_started'),
+    ]))
+    assert graph.chainable_jobs({}) == []
+    #e is behind a failed job, not an active one
+    assert graph.chainable_jobs({0 : None}) == [1]
+    #one link at a time: c waits until b is queued itself
+    graph.set_status(1, 'pending')
+    assert graph.chainable_jobs({0 : None, 1 : None}) == [2]
+    assert graph.chainable_jobs({0 : None, 1 : None}, limit=0) == []
+    #upstream jobs that already succeeded count as done
+    graph.set_status(0, 'succeeded')
+    assert graph.chainable_jobs({1 : None}) == [2]
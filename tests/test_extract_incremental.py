@@ -0,0 +1,53 @@
+import os
+import shutil
+
+import pytest
+
+import file_parser
+from benchmarks import synthetic_outputs
+from conftest import RULES_DIR, same_data
+
+
+@pytest.mark.parametrize('program, rules', [
+    ('orca', 'orca_rules.dat'),
+    ('gaussian', 'gaussian_rules.dat'),
+    ('xtb', 'xtb_rules.dat'),
+    ('orca', 'orca_array_rules.dat'),
+    ('gaussian', 'gaussian_array_rules.dat'),
+])
+def test_incremental_matches_full_parse(tmp_path, program, rules):
+    rules_path = os.path.join(RULES_DIR, rules)
+    finished = synthetic_outputs.write_output(program, str(tmp_path / 'finished'), '64kb', opt_cycles=5)
+    full = file_parser.extract_data(finished, rules_path, use_cache=False)
+    with open(finished, 'rb') as finished_file:
+        content = finished_file.read()
+
+    #the output grows in pieces that end mid-line
+    growing = str(tmp_path / os.path.basename(finished))
+    state = None
+    with open(growing, 'wb') as growing_file:
+        for start in range(0, len(content), 7001):
+            growing_file.write(content[start:start + 7001])
+            growing_file.flush()
+            data, state = file_parser.extract_data_incremental(growing, rules_path, state)
+    assert same_data(data, full)
+
+    #nothing new, nothing changes
+    data, state = file_parser.extract_data_incremental(growing, rules_path, state)
+    assert same_data(data, full)
+
+
+def test_incremental_starts_over_on_truncation(tmp_path):
+    rules_path = os.path.join(RULES_DIR, 'orca_rules.dat')
+    finished = synthetic_outputs.write_output('orca', str(tmp_path / 'finished'), '64kb', opt_cycles=5)
+    growing = str(tmp_path / 'job.out')
+    shutil.copy(finished, growing)
+    data, state = file_parser.extract_data_incremental(growing, rules_path)
+
+    #a rerun writes a shorter output over the old one
+    with open(finished, 'rb') as finished_file:
+        head = finished_file.read(20000)
+    with open(growing, 'wb') as growing_file:
+        growing_file.write(head)
+    data, state = file_parser.extract_data_incremental(growing, rules_path, state)
+    assert same_data(data, file_parser.extract_data(growing, rules_path, use_cache=False))
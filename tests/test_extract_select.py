@@ -0,0 +1,32 @@
+import os
+
+import pytest
+
+import file_parser
+from benchmarks import synthetic_outputs
+from conftest import RULES_DIR, same_data
+
+
+@pytest.mark.parametrize('program, rules', [
+    ('orca', 'orca_rules.dat'),
+    ('gaussian', 'gaussian_rules.dat'),
+    ('xtb', 'xtb_rules.dat'),
+])
+def test_selected_fields_match_full_parse(tmp_path, program, rules):
+    rules_path = os.path.join(RULES_DIR, rules)
+    path = synthetic_outputs.write_output(program, str(tmp_path), '64kb', opt_cycles=5)
+    full = file_parser.extract_data(path, rules_path, use_cache=False)
+    assert full
+    #each field on its own, including ones read from sections only
+    for field in full:
+        selected = file_parser.extract_data(path, rules_path, fields=[field], use_cache=False)
+        assert same_data(selected, {field : full[field]}), field
+    #and all of them together
+    selected = file_parser.extract_data(path, rules_path, fields=list(full), use_cache=False)
+    assert same_data(selected, full)
+
+
+def test_select_rejects_unknown_fields():
+    ruleset = file_parser.get_ruleset(os.path.join(RULES_DIR, 'orca_rules.dat'))
+    with pytest.raises(ValueError):
+        ruleset.select(['no_such_field'])
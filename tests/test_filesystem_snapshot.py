@@ -0,0 +1,95 @@
+import os
+import json
+
+import file_parser
+import job_harness
+from benchmarks import synthetic_outputs
+from filesystem_snapshot import FilesystemSnapshot, run_info_stat
+
+
+def make_jobs(root):
+    '''
+    a finished job with two slurm outputs and a run_info.json, one with a
+    compressed output and one that never ran
+    '''
+    done = os.path.join(root, 'done')
+    os.makedirs(done)
+    synthetic_outputs.write_orca_output(os.path.join(done, 'job.out'), 64 * 1024, opt_cycles=5)
+    for job_id in (101, 205):
+        open(os.path.join(done, f"slurm-{job_id}.out"), 'w').close()
+    with open(os.path.join(done, 'run_info.json'), 'w') as json_file:
+        json.dump({'job_id' : 205}, json_file)
+    packed = os.path.join(root, 'packed')
+    os.makedirs(packed)
+    file_parser.compress_output(synthetic_outputs.write_orca_output(os.path.join(packed, 'job.out'), 64 * 1024, opt_cycles=5), 'gz')
+    fresh = os.path.join(root, 'fresh')
+    os.makedirs(fresh)
+    return done, packed, fresh
+
+
+def harness(directory, fs_snapshot=None):
+    job = job_harness.ORCAHarness()
+    job.from_dict({'directory' : directory, 'job_name' : 'job'})
+    job.fs_snapshot = fs_snapshot
+    return job
+
+
+def test_listing_answers_like_the_filesystem(tmp_path):
+    done, packed, fresh = make_jobs(str(tmp_path))
+    missing = str(tmp_path / 'missing')
+    snapshot = FilesystemSnapshot([done, packed, fresh, missing, os.path.relpath(done)])
+    assert len(snapshot.names) == 4
+    assert snapshot.knows(done) and snapshot.knows(fresh)
+    #missing directories are left to the filesystem
+    assert not snapshot.knows(missing)
+    assert not snapshot.knows(str(tmp_path))
+    assert sorted(snapshot.slurm_ids[done]) == [101, 205]
+    for directory in (done, packed, fresh):
+        for name in ('job.out', 'job.out.gz', 'run_info.json', 'slurm-101.out'):
+            path = os.path.join(directory, name)
+            assert snapshot.exists(path) == os.path.exists(path)
+        output = os.path.join(directory, 'job.out')
+        resolved = file_parser.resolve_output(output)
+        assert snapshot.resolve_output(output) == (resolved if os.path.exists(resolved) else None)
+    stat = os.stat(os.path.join(done, 'job.out'))
+    assert snapshot.stat(os.path.join(done, 'job.out')) == (stat.st_size, stat.st_mtime_ns)
+    #slurm outputs are listed, not stat-ed
+    assert snapshot.stat(os.path.join(done, 'slurm-101.out')) is None
+
+    fingerprint = snapshot.fingerprint(done, os.path.join(done, 'job.out'))
+    assert fingerprint == [[101, 205], [stat.st_size, stat.st_mtime_ns], run_info_stat(done)]
+    assert json.loads(json.dumps(fingerprint)) == fingerprint
+    assert snapshot.fingerprint(fresh, os.path.join(fresh, 'job.out')) == [[], None, None]
+    assert snapshot.fingerprint(missing, os.path.join(missing, 'job.out')) is None
+
+
+def test_subset_holds_one_directory(tmp_path):
+    done, packed, fresh = make_jobs(str(tmp_path))
+    snapshot = FilesystemSnapshot([done, packed, fresh])
+    subset = snapshot.subset(done)
+    assert list(subset.names) == [done]
+    assert subset.fingerprint(done, os.path.join(done, 'job.out')) == snapshot.fingerprint(done, os.path.join(done, 'job.out'))
+    assert not subset.knows(packed)
+    assert FilesystemSnapshot().subset(done).names == {}
+
+
+def test_harness_status_is_the_same_from_the_snapshot(tmp_path):
+    directories = make_jobs(str(tmp_path))
+    snapshot = FilesystemSnapshot(directories)
+    for directory, status, job_id in zip(directories, ('succeeded', 'succeeded', 'not_started'), (205, -1, -1)):
+        with_snapshot = harness(directory, snapshot.subset(directory))
+        without = harness(directory)
+        for job in (with_snapshot, without):
+            job.update_status(slurm_cache={})
+        assert with_snapshot.status == without.status == status
+        assert with_snapshot.job_id == without.job_id == job_id
+        assert with_snapshot.knows_directory()
+
+
+def test_snapshot_is_not_refreshed(tmp_path):
+    done, packed, fresh = make_jobs(str(tmp_path))
+    snapshot = FilesystemSnapshot([fresh])
+    open(os.path.join(fresh, 'slurm-300.out'), 'w').close()
+    #a job submitted after the sweep is found at the next one
+    assert snapshot.slurm_ids[fresh] == []
+    assert FilesystemSnapshot([fresh]).slurm_ids[fresh] == [300]
@@ -0,0 +1,86 @@
+import os
+import json
+import subprocess
+
+import batch_runner
+import job_harness
+from test_status_workers import make_runner
+
+
+def checked(runner, monkeypatch):
+    '''
+    runs check_status_all, returns the directories whose status was read from disk
+    '''
+    seen = []
+    detect = runner.detect_job_statuses
+    def recording(jobs, slurm_cache=None):
+        seen.extend(os.path.basename(job.directory) for job in jobs)
+        return detect(jobs, slurm_cache=slurm_cache)
+    monkeypatch.setattr(runner, 'detect_job_statuses', recording)
+    runner.check_status_all()
+    return sorted(seen)
+
+
+def test_unchanged_jobs_are_not_checked_again(tmp_path, monkeypatch):
+    root = str(tmp_path)
+    runner = make_runner(root, monkeypatch, parse_workers=1)
+    assert checked(runner, monkeypatch) == ['a', 'b', 'c', 'd', 'e', 'f']
+    with open(os.path.join(root, '__fingerprints__.json'), 'r') as json_file:
+        fingerprints = json.load(json_file)
+    assert len(fingerprints['jobs']) == 6
+    statuses = runner.ledger['job_status'].tolist()
+
+    runner.ledger['job_status'] = 'not_started'
+    assert checked(runner, monkeypatch) == []
+    assert runner.ledger['job_status'].tolist() == statuses
+
+    #a new slurm output, a rewritten output and a job in the queue are read again
+    open(os.path.join(root, 'f', 'slurm-300.out'), 'w').close()
+    with open(os.path.join(root, 'e', 'job.out'), 'a') as output:
+        output.write("\n")
+    with open(os.path.join(root, 'a', 'run_info.json'), 'w') as json_file:
+        json.dump({'job_id' : 301}, json_file)
+    monkeypatch.setattr(batch_runner, 'query_slurm_statuses', lambda: {301 : 'running'})
+    assert checked(runner, monkeypatch) == ['a', 'e', 'f']
+    assert runner.ledger['job_status'].tolist()[0] == 'running'
+    assert checked(runner, monkeypatch) == ['a']
+
+
+def test_revalidation(tmp_path, monkeypatch):
+    root = str(tmp_path)
+    runner = make_runner(root, monkeypatch, parse_workers=1, revalidate=True)
+    checked(runner, monkeypatch)
+    #--revalidate covers one sweep
+    assert checked(runner, monkeypatch) == []
+    runner.revalidate = True
+    assert len(checked(runner, monkeypatch)) == 6
+    #so does a failed squeue, a queued job could look unchanged
+    monkeypatch.setattr(runner.slurm_snapshot, 'refresh', lambda force=False: None)
+    #each harness asks squeue about its own job instead
+    monkeypatch.setattr(job_harness.subprocess, 'run', lambda command, **kwargs: subprocess.CompletedProcess(
+        command, 1, stdout=b'slurm_load_jobs error: Invalid job id specified'))
+    assert len(checked(runner, monkeypatch)) == 6
+
+
+def test_revalidate_after(tmp_path, monkeypatch):
+    root = str(tmp_path)
+    runner = make_runner(root, monkeypatch, parse_workers=1, revalidate_after=60.0)
+    now = [1000.0]
+    monkeypatch.setattr(batch_runner.time, 'time', lambda: now[0])
+    checked(runner, monkeypatch)
+    now[0] += 59.0
+    assert checked(runner, monkeypatch) == []
+    now[0] += 2.0
+    assert len(checked(runner, monkeypatch)) == 6
+    with open(os.path.join(root, '__fingerprints__.json'), 'r') as json_file:
+        assert json.load(json_file)['revalidated'] == now[0]
+
+
+def test_unreadable_fingerprints_are_ignored(tmp_path, monkeypatch, capsys):
+    root = str(tmp_path)
+    runner = make_runner(root, monkeypatch, parse_workers=1)
+    with open(os.path.join(root, '__fingerprints__.json'), 'w') as json_file:
+        json_file.write('{"revalidated": ')
+    assert len(checked(runner, monkeypatch)) == 6
+    assert 'ignoring unreadable fingerprints' in capsys.readouterr().out
+    assert checked(runner, monkeypatch) == []
@@ -0,0 +1,47 @@
+import input_generator
+
+
+def batch_runner_line(**config):
+    return input_generator.BatchRunnerInputBuilder().change_params(config).submit_line()
+
+
+def test_default_submit_line_has_no_optional_flags():
+    line = batch_runner_line()
+    assert line.startswith(f"python3 {input_generator.BatchRunnerInputBuilder._BATCH_RUNNER_PATH} batchfile.csv -j 1 -l __ledger__.csv")
+    assert line.endswith(' > batch_runner.out')
+    for flag in ('--parse-workers', '--compress-outputs', '--parse-cache', '--squeue-ttl',
+                 '--min-poll-interval', '--max-poll-interval', '--revalidate-after',
+                 '--array-submit', '--bundle-size', '--bundle-workers', '--bundle-max-runtime',
+                 '--chain-submit'):
+        assert flag not in line
+
+
+def test_submit_line_emits_configured_flags():
+    line = batch_runner_line(
+        parse_workers=4,
+        compress_outputs='gz',
+        parse_cache='on',
+        squeue_ttl=30,
+        min_poll_interval=10,
+        max_poll_interval=300,
+        revalidate_after=0,
+        array_submit=True,
+        bundle_size=8,
+        bundle_workers=2,
+        bundle_max_runtime=20,
+        chain_submit=True,
+    )
+    options = line.split(' -l ', 1)[1].split(' > ')[0]
+    assert options == ('__ledger__.csv --parse-workers 4 --compress-outputs gz --parse-cache on'
+                       ' --squeue-ttl 30 --ledger-backend csv --min-poll-interval 10 --max-poll-interval 300'
+                       ' --revalidate-after 0 --array-submit --bundle-size 8 --bundle-workers 2'
+                       ' --bundle-max-runtime 20 --chain-submit')
+
+
+def test_pyaroma_submit_line_ignores_batch_runner_options():
+    builder = input_generator.pyAromaInputBuilder().change_params({
+        'revalidate_after' : 60, 'array_submit' : True, 'bundle_size' : 8, 'chain_submit' : True,
+    })
+    line = builder.submit_line()
+    assert line.startswith('python3 ')
+    assert '--' not in line
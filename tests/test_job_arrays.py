@@ -0,0 +1,119 @@
+import os
+import json
+import subprocess
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import batch_runner
+import job_harness
+
+
+def make_job(root, name, options=('#SBATCH -n 4', '#SBATCH -t 1:00:00')):
+    directory = os.path.join(root, name)
+    os.makedirs(directory)
+    with open(os.path.join(directory, 'job.sh'), 'w') as script:
+        script.write('\n'.join(('#!/bin/bash', f"#SBATCH -J {name}", f"#SBATCH -o {name}.log") + tuple(options)))
+        script.write('\necho "ran in $SLURM_SUBMIT_DIR"\n')
+    job = job_harness.ORCAHarness()
+    job.directory = directory
+    job.job_name = 'job'
+    return job
+
+
+def fake_sbatch(monkeypatch, stdout=None):
+    '''
+    sbatch answers each submission with the next job id from 4242, or with stdout;
+    returns the (command, cwd) of each
+    '''
+    calls = []
+    next_id = [4242]
+    def run(command, **kwargs):
+        calls.append((command, kwargs.get('cwd', None)))
+        answer = stdout
+        if answer is None:
+            answer = f"Submitted batch job {next_id[0]}\n"
+            next_id[0] += 1
+        return subprocess.CompletedProcess(command, 0, stdout=answer.encode())
+    monkeypatch.setattr(job_harness.subprocess, 'run', run)
+    return calls
+
+
+def test_array_script_and_map(tmp_path, monkeypatch):
+    jobs = [make_job(str(tmp_path), name) for name in ('a', 'b', 'c')]
+    calls = fake_sbatch(monkeypatch)
+    array_directory = str(tmp_path / '__arrays__')
+    assert job_harness.submit_array(jobs, array_directory, 'array_1') == 4242
+    assert calls == [('sbatch array_1.sh', array_directory)]
+    with open(os.path.join(array_directory, 'array_1.map'), 'r') as map_file:
+        assert map_file.read() == ''.join(f"{job.directory}\tjob\n" for job in jobs)
+    with open(os.path.join(array_directory, 'array_1.sh'), 'r') as script:
+        script = script.read()
+    #the shared resources, not the names of the first job
+    assert '#SBATCH -n 4\n#SBATCH -t 1:00:00\n' in script
+    assert '-J a' not in script and 'a.log' not in script
+    assert '#SBATCH --array=0-2\n' in script
+    for task, job in enumerate(jobs):
+        assert (job.job_id, job.array_task, job.status, job.slurm_key()) == (4242, task, 'pending', f"4242_{task}")
+        with open(os.path.join(job.directory, 'run_info.json'), 'r') as json_file:
+            data = json.load(json_file)
+        assert (data['job_id'], data['array_task'], data['bundle_task']) == (4242, task, None)
+        #and read back the same way
+        read = job_harness.ORCAHarness()
+        read.directory = job.directory
+        read.job_name = 'job'
+        read.get_id()
+        assert read.slurm_key() == f"4242_{task}"
+
+
+def test_failed_array_submission_raises(tmp_path, monkeypatch):
+    jobs = [make_job(str(tmp_path), name) for name in ('a', 'b')]
+    fake_sbatch(monkeypatch, stdout='sbatch: error: Batch job submission failed')
+    with pytest.raises(ValueError):
+        job_harness.submit_array(jobs, str(tmp_path / '__arrays__'), 'array_1')
+
+
+def test_array_tasks_run_their_own_job(tmp_path, monkeypatch):
+    jobs = [make_job(str(tmp_path), name) for name in ('a', 'b')]
+    array_directory = str(tmp_path / '__arrays__')
+    run = subprocess.run
+    fake_sbatch(monkeypatch)
+    job_harness.submit_array(jobs, array_directory, 'array_1')
+    monkeypatch.undo()
+    for task, job in enumerate(jobs):
+        environment = dict(os.environ, SLURM_ARRAY_JOB_ID='4242', SLURM_ARRAY_TASK_ID=str(task))
+        run(['bash', os.path.join(array_directory, 'array_1.sh')], cwd=array_directory, env=environment, check=True)
+        with open(os.path.join(job.directory, f"slurm-4242_{task}.out"), 'r') as output:
+            assert output.read() == f"ran in {job.directory}\n"
+
+
+def test_runner_groups_jobs_by_resources(tmp_path, monkeypatch):
+    root = str(tmp_path)
+    jobs = [make_job(root, 'a'), make_job(root, 'b'), make_job(root, 'c', options=('#SBATCH -n 8',)), make_job(root, 'd')]
+    runner = batch_runner.BatchRunner(array_submit=True)
+    runner.scratch_directory = root
+    runner.ledger = pd.DataFrame({
+        'job_id' : [-1] * 4,
+        'job_basename' : ['job'] * 4,
+        'job_directory' : [job.directory for job in jobs],
+        'job_status' : ['not_started'] * 4,
+        'coords_from' : [np.nan] * 4,
+        'xyz_filename' : [np.nan] * 4,
+        'orbitals_from' : [np.nan] * 4,
+        'gbw_filename' : [np.nan] * 4,
+    })
+    runner.build_dependency_graph()
+    runner.slurm_snapshot.statuses = {}
+    calls = fake_sbatch(monkeypatch)
+    runner.submit_arrays(list(enumerate(jobs)))
+    #one array for a, b and d, c on its own
+    assert len(calls) == 2
+    assert calls[0][0].startswith('sbatch array_') and calls[0][1] == os.path.join(root, '__arrays__')
+    assert calls[1] == ('sbatch job.sh', jobs[2].directory)
+    array_id = jobs[0].job_id
+    assert [job.job_id for job in jobs] == [array_id, array_id, jobs[2].job_id, array_id]
+    assert runner.ledger['job_id'].tolist() == [job.job_id for job in jobs]
+    assert runner.ledger['job_status'].tolist() == ['pending'] * 4
+    assert runner.ledger_index.by_job_id(array_id) == [0, 1, 3]
+    assert set(runner.slurm_snapshot.statuses) == {f"{array_id}_0", f"{array_id}_1", f"{array_id}_2", jobs[2].job_id}
@@ -0,0 +1,125 @@
+import os
+import json
+import subprocess
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import batch_runner
+import job_harness
+from test_job_arrays import make_job, fake_sbatch
+
+
+@pytest.mark.parametrize('runtime, minutes', [
+    ('30', 30), ('30:30', 30.5), ('2:00:00', 120), ('1-0', 1440),
+    ('1-2', 1560), ('1-2:30', 1590), ('1-2:30:30', 1590.5),
+    ('UNLIMITED', None), ('INFINITE', None), ('infinite', None),
+])
+def test_slurm_minutes(runtime, minutes):
+    assert job_harness.slurm_minutes(runtime) == minutes
+
+
+def test_sbatch_runtime_and_key():
+    options = ('#SBATCH -n 4', '#SBATCH --time=0:20:00', '#SBATCH --mem=8G')
+    assert job_harness.sbatch_runtime(options) == 20
+    assert job_harness.sbatch_runtime(('#SBATCH -t UNLIMITED',)) is None
+    assert job_harness.sbatch_runtime(('#SBATCH -n 4',)) is None
+    assert job_harness.bundle_key(options) == ('#SBATCH -n 4', '#SBATCH --mem=8G')
+    assert job_harness.slurm_time(90.5) == '0-01:31:00'
+    assert job_harness.slurm_time(1440) == '1-00:00:00'
+
+
+def test_bundle_script_and_map(tmp_path, monkeypatch):
+    root = str(tmp_path)
+    jobs = [make_job(root, name, options=('#SBATCH -n 4', f"#SBATCH -t {minutes}"))
+            for name, minutes in (('a', 10), ('b', 20), ('c', 5))]
+    calls = fake_sbatch(monkeypatch)
+    bundle_directory = os.path.join(root, '__bundles__')
+    assert job_harness.submit_bundle(jobs, bundle_directory, 'bundle_1', workers=2) == 4242
+    assert calls == [('sbatch bundle_1.sh', bundle_directory)]
+    with open(os.path.join(bundle_directory, 'bundle_1.map'), 'r') as map_file:
+        assert map_file.read() == ''.join(f"{job.directory}\t{task}\tjob\n" for task, job in enumerate(jobs))
+    with open(os.path.join(bundle_directory, 'bundle_1.sh'), 'r') as script:
+        script = script.read()
+    #two workers, two rounds of the longest job
+    assert '#SBATCH -n 8\n' in script
+    assert '#SBATCH -t 0-00:40:00\n' in script
+    assert script.count('#SBATCH -t') == 1
+    assert '-P 2 ' in script
+    for task, job in enumerate(jobs):
+        assert (job.job_id, job.array_task, job.bundle_task, job.slurm_key()) == (4242, None, task, 4242)
+        with open(os.path.join(job.directory, 'run_info.json'), 'r') as json_file:
+            assert json.load(json_file)['bundle_task'] == task
+
+
+def test_bundle_workers_mark_their_jobs(tmp_path, monkeypatch):
+    root = str(tmp_path)
+    jobs = [make_job(root, name) for name in ('a', 'b', 'c')]
+    bundle_directory = os.path.join(root, '__bundles__')
+    run = subprocess.run
+    fake_sbatch(monkeypatch)
+    job_harness.submit_bundle(jobs, bundle_directory, 'bundle_1', workers=2)
+    monkeypatch.undo()
+    #nothing has run yet, the jobs wait for a worker
+    assert [job.bundle_progress() for job in jobs] == ['pending'] * 3
+    run(['bash', os.path.join(bundle_directory, 'bundle_1.sh')], cwd=bundle_directory,
+        env=dict(os.environ, SLURM_JOB_ID='4242'), check=True)
+    for task, job in enumerate(jobs):
+        with open(os.path.join(job.directory, f"slurm-4242_{task}.out"), 'r') as output:
+            assert output.read() == f"ran in {job.directory}\n"
+        with open(os.path.join(job.directory, job_harness.bundle_status_filename), 'r') as status_file:
+            assert status_file.read() == f"4242 {task} done\n"
+        assert job.bundle_progress() == 'done'
+    #a mark from an earlier bundle does not count for this one
+    jobs[0].job_id = 5000
+    assert jobs[0].bundle_progress() == 'pending'
+
+
+def test_running_bundle_status(tmp_path):
+    job = make_job(str(tmp_path), 'a')
+    job.job_id = 4242
+    job.bundle_task = 1
+    job.write_json()
+    slurm_cache = {4242 : 'running'}
+    job.update_status(slurm_cache=slurm_cache)
+    assert job.status == 'pending'
+    with open(os.path.join(job.directory, job_harness.bundle_status_filename), 'w') as status_file:
+        status_file.write('4242 1 running\n')
+    job.update_status(slurm_cache=slurm_cache)
+    assert job.status == 'running'
+    #done with its job, the allocation may still run others: the output decides
+    with open(os.path.join(job.directory, job_harness.bundle_status_filename), 'w') as status_file:
+        status_file.write('4242 1 done\n')
+    job.update_status(slurm_cache=slurm_cache)
+    assert job.status == 'not_started'
+
+
+def test_runner_bundles_short_jobs(tmp_path, monkeypatch):
+    root = str(tmp_path)
+    runtimes = ('10', '20', 'UNLIMITED', '600', '15')
+    jobs = [make_job(root, name, options=('#SBATCH -n 4', f"#SBATCH -t {runtime}"))
+            for name, runtime in zip('abcde', runtimes)]
+    runner = batch_runner.BatchRunner(bundle_size=2, bundle_workers=2)
+    runner.scratch_directory = root
+    runner.ledger = pd.DataFrame({
+        'job_id' : [-1] * 5,
+        'job_basename' : ['job'] * 5,
+        'job_directory' : [job.directory for job in jobs],
+        'job_status' : ['not_started'] * 5,
+        'coords_from' : [np.nan] * 5,
+        'xyz_filename' : [np.nan] * 5,
+        'orbitals_from' : [np.nan] * 5,
+        'gbw_filename' : [np.nan] * 5,
+    })
+    runner.build_dependency_graph()
+    runner.slurm_snapshot.statuses = {}
+    calls = fake_sbatch(monkeypatch)
+    runner.submit_grouped(list(enumerate(jobs)))
+    #a and b share an allocation, e is left alone in its chunk, c and d are too long
+    assert calls[0][0].startswith('sbatch bundle_')
+    assert sorted(cwd for command, cwd in calls[1:]) == [jobs[2].directory, jobs[3].directory, jobs[4].directory]
+    assert [job.bundle_task for job in jobs] == [0, 1, None, None, None]
+    assert jobs[0].job_id == jobs[1].job_id
+    assert runner.ledger['job_status'].tolist() == ['pending'] * 5
+    assert runner.ledger_index.by_job_id(jobs[0].job_id) == [0, 1]
@@ -0,0 +1,48 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from ledger_index import LedgerIndex
+
+
+def make_ledger(root):
+    return pd.DataFrame({
+        'job_id' : [-1, 501, 501, np.nan],
+        'job_basename' : ['a', 'b', 'c', 'a'],
+        'job_directory' : [os.path.join(root, 'a'), os.path.join(root, 'bc'), os.path.join(root, 'bc') + '/', os.path.join(root, 'a2')],
+        'job_status' : ['not_started', 'running', 'running', 'not_started'],
+    }, index=[10, 11, 12, 13])
+
+
+def test_lookups_match_a_column_scan(tmp_path, monkeypatch):
+    root = str(tmp_path)
+    ledger = make_ledger(root)
+    index = LedgerIndex(ledger)
+    #the tasks of one array share a job id
+    assert index.by_job_id(501) == list(ledger.index[ledger['job_id'] == 501]) == [11, 12]
+    assert index.by_job_id(-1) == [10]
+    assert index.by_job_id(999) == []
+    #directories are compared as absolute paths
+    assert index.by_directory(os.path.join(root, 'bc')) == [11, 12]
+    monkeypatch.chdir(root)
+    assert index.by_directory('bc') == [11, 12]
+    assert index.by_name('./bc', 'c') == [12]
+    assert index.by_name('a', 'a') == [10]
+    assert index.by_name('a', 'b') == []
+
+
+def test_set_job_id_moves_the_row(tmp_path):
+    index = LedgerIndex(make_ledger(str(tmp_path)))
+    index.set_job_id(10, 777)
+    assert index.by_job_id(777) == [10]
+    assert -1 not in index.job_ids
+    index.set_job_id(12, 778)
+    assert index.by_job_id(501) == [11]
+    #a row that never had a job id
+    index.set_job_id(13, 779)
+    assert index.by_job_id(779) == [13]
+    assert index.job_id == {10 : 777, 11 : 501, 12 : 778, 13 : 779}
+    #the returned lists are copies
+    index.by_job_id(777).append(99)
+    assert index.by_job_id(777) == [10]
@@ -0,0 +1,90 @@
+import os
+
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from ledger_store import LedgerJournal, journal_path, read_journal, load_ledger, update_unique_row, write_csv
+
+
+def make_ledger():
+    return pd.DataFrame({
+        'job_basename' : ['a', 'b', 'c'],
+        'job_directory' : ['./a', './b', './c'],
+        'job_status' : ['not_started'] * 3,
+        'job_id' : [float('nan')] * 3,
+    })
+
+
+def journaled(tmp_path):
+    csv_path = str(tmp_path / '__ledger__.csv')
+    journal = LedgerJournal(csv_path)
+    journal.compact(make_ledger())
+    return csv_path, journal
+
+
+def test_replay_matches_rewritten_ledger(tmp_path):
+    csv_path, journal = journaled(tmp_path)
+    journal.append(1, job_status='running', job_id=1234)
+    journal.append(2, job_status='failed')
+    journal.append(1, job_status='succeeded')
+    assert journal.records == 3
+    assert len(read_journal(csv_path, 3)) == 3
+
+    expected = make_ledger()
+    expected.loc[1, ['job_status', 'job_id']] = ['succeeded', 1234]
+    expected.loc[2, 'job_status'] = 'failed'
+    assert_frame_equal(load_ledger(csv_path), expected)
+
+
+def test_compaction_folds_journal_into_csv(tmp_path):
+    csv_path, journal = journaled(tmp_path)
+    journal.append(0, job_status='succeeded')
+    ledger = load_ledger(csv_path)
+    journal.compact(ledger)
+    assert journal.records == 0
+    assert read_journal(csv_path, 3) == []
+    #the snapshot alone now holds the change
+    assert pd.read_csv(csv_path, sep='|')['job_status'].tolist() == ['succeeded', 'not_started', 'not_started']
+    assert_frame_equal(load_ledger(csv_path), ledger)
+
+
+def test_journal_for_another_snapshot_is_ignored(tmp_path):
+    csv_path, journal = journaled(tmp_path)
+    journal.append(0, job_status='failed')
+    #the csv rewritten without the journal, e.g. by an older BatchRunner
+    ledger = make_ledger()
+    ledger.loc[0, 'job_status'] = 'succeeded'
+    write_csv(ledger, csv_path)
+    os.utime(csv_path, ns=(1, 1))
+    assert read_journal(csv_path, 3) is None
+    assert load_ledger(csv_path)['job_status'].tolist() == ['succeeded', 'not_started', 'not_started']
+
+
+def test_torn_last_record_is_dropped(tmp_path):
+    csv_path, journal = journaled(tmp_path)
+    journal.append(0, job_status='running')
+    with open(journal_path(csv_path), 'a') as journal_f:
+        journal_f.write('{"row": 1, "values": {"job_st')
+    assert len(read_journal(csv_path, 3)) == 1
+    assert load_ledger(csv_path)['job_status'].tolist() == ['running', 'not_started', 'not_started']
+
+
+def test_update_unique_row_appends_to_journal(tmp_path):
+    csv_path, journal = journaled(tmp_path)
+    with open(csv_path, 'rb') as csv_f:
+        snapshot = csv_f.read()
+    assert update_unique_row(csv_path, {'job_status' : 'cancelled'}, job_basename='b') == 1
+    assert update_unique_row(csv_path, {'job_status' : 'cancelled'}, job_status='not_started') == 2
+    #the csv is left alone, the change is a journal record
+    with open(csv_path, 'rb') as csv_f:
+        assert csv_f.read() == snapshot
+    assert read_journal(csv_path, 3) == [{'row' : 1, 'values' : {'job_status' : 'cancelled'}}]
+    assert load_ledger(csv_path)['job_status'].tolist() == ['not_started', 'cancelled', 'not_started']
+
+
+def test_update_unique_row_without_journal_rewrites_csv(tmp_path):
+    csv_path = str(tmp_path / '__ledger__.csv')
+    write_csv(make_ledger(), csv_path)
+    assert update_unique_row(csv_path, {'job_status' : 'cancelled'}, job_basename='c') == 1
+    assert not os.path.exists(journal_path(csv_path))
+    assert pd.read_csv(csv_path, sep='|')['job_status'].tolist() == ['not_started', 'not_started', 'cancelled']
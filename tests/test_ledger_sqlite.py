@@ -0,0 +1,118 @@
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+import batch_runner
+from ledger_store import LedgerStore, db_path, database_is_newer, load_ledger, update_unique_row, write_csv
+
+
+def make_ledger():
+    return pd.DataFrame({
+        'job_id' : [-1, -1, -1],
+        'job_basename' : ['a', 'b', 'c'],
+        'job_directory' : ['./a', './b', './c'],
+        'job_status' : ['not_started'] * 3,
+        'coords_from' : [np.nan, '../a', '../b'],
+        'xyz_filename' : [np.nan, 'a.xyz', 'b.xyz'],
+        'orbitals_from' : [np.nan] * 3,
+        'gbw_filename' : [np.nan] * 3,
+    })
+
+
+def stored(tmp_path, ledger=None):
+    csv_path = str(tmp_path / '__ledger__.csv')
+    store = LedgerStore(csv_path)
+    store.write(make_ledger() if ledger is None else ledger)
+    return csv_path, store
+
+
+def test_write_and_read_round_trip(tmp_path):
+    csv_path, store = stored(tmp_path)
+    assert store.path == db_path(csv_path) == str(tmp_path / '__ledger__.db')
+    #NULL comes back as NaN, like from the csv
+    assert_frame_equal(store.read(), make_ledger())
+    write_csv(make_ledger(), csv_path)
+    assert_frame_equal(store.read(), pd.read_csv(csv_path, sep='|'))
+    #the ledger index is kept
+    ledger = make_ledger().iloc[[2, 0]]
+    store.write(ledger)
+    assert_frame_equal(store.read(), ledger.sort_index())
+    #new columns replace the table
+    ledger = make_ledger().assign(program=['orca', 'xtb', 'orca'])
+    store.write(ledger)
+    assert store.columns() == list(ledger.columns)
+    assert_frame_equal(store.read(), ledger)
+    store.close()
+
+
+def test_single_row_updates(tmp_path):
+    csv_path, store = stored(tmp_path)
+    store.update_row(1, job_status='running', job_id=np.int64(4242))
+    assert store.update_unique_row({'job_status' : 'failed'}, job_directory='./c') == 1
+    assert store.update_unique_row({'job_status' : 'failed'}, job_status='not_started') == 1
+    assert store.update_unique_row({'job_status' : 'failed'}, job_status='failed') == 2
+    ledger = store.read()
+    assert ledger['job_status'].tolist() == ['failed', 'running', 'failed']
+    assert ledger.loc[1, 'job_id'] == 4242
+    store.close()
+
+
+def test_readers_use_the_newer_copy(tmp_path):
+    csv_path, store = stored(tmp_path)
+    store.update_row(0, job_status='succeeded')
+    store.close()
+    #no csv yet, the database is all there is
+    assert database_is_newer(csv_path)
+    assert load_ledger(csv_path)['job_status'].tolist() == ['succeeded', 'not_started', 'not_started']
+    assert update_unique_row(csv_path, {'job_status' : 'cancelled'}, job_basename='b') == 1
+    assert LedgerStore(csv_path).read()['job_status'].tolist() == ['succeeded', 'cancelled', 'not_started']
+
+    #a csv written later wins
+    ledger = make_ledger()
+    ledger.loc[2, 'job_status'] = 'failed'
+    write_csv(ledger, csv_path)
+    db_time = max(os.stat(path).st_mtime_ns for path in (db_path(csv_path), db_path(csv_path) + '-wal') if os.path.exists(path))
+    os.utime(csv_path, ns=(db_time + 10**9, db_time + 10**9))
+    assert not database_is_newer(csv_path)
+    assert load_ledger(csv_path)['job_status'].tolist() == ['not_started', 'not_started', 'failed']
+
+
+def test_export_csv(tmp_path):
+    csv_path, store = stored(tmp_path)
+    store.update_row(2, job_status='succeeded')
+    store.export_csv()
+    exported = pd.read_csv(csv_path, sep='|')
+    assert exported['job_status'].tolist() == ['not_started', 'not_started', 'succeeded']
+    assert not os.path.exists(csv_path + '.part')
+
+
+def test_readers_see_committed_rows_while_writer_is_open(tmp_path):
+    csv_path, store = stored(tmp_path)
+    store.update_row(0, job_status='running')
+    reader = sqlite3.connect(store.path)
+    assert reader.execute('SELECT job_status FROM ledger WHERE row_index = 0').fetchone() == ('running',)
+    assert reader.execute('PRAGMA journal_mode').fetchone() == ('wal',)
+    reader.close()
+    store.close()
+
+
+def test_runner_writes_status_changes_as_single_rows(tmp_path):
+    runner = batch_runner.BatchRunner(ledger_backend='sqlite')
+    runner.scratch_directory = str(tmp_path)
+    runner.ledger = make_ledger()
+    runner.build_dependency_graph()
+    runner.write_ledger()
+    store = runner.get_ledger_store()
+    updates = []
+    update_row = store.update_row
+    store.update_row = lambda index, **values: updates.append((index, values)) or update_row(index, **values)
+    runner._set_job_id(0, 101)
+    runner._set_job_status(0, 'pending')
+    runner.write_ledger()
+    assert updates == [(0, {'job_id' : 101}), (0, {'job_status' : 'pending'})]
+    assert store.read().loc[0, ['job_id', 'job_status']].tolist() == [101, 'pending']
+    runner.export_ledger()
+    assert pd.read_csv(str(tmp_path / '__ledger__.csv'), sep='|').loc[0, 'job_status'] == 'pending'
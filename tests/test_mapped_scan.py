@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+import file_parser
+from benchmarks import synthetic_outputs
+from conftest import RULES_DIR, same_data
+
+#big enough that parse_file takes the memory-mapped path
+OUTPUT_SIZE = '1536kb'
+
+
+def to_crlf(path):
+    crlf_path = path + '.crlf'
+    with open(path, 'rb') as output:
+        data = output.read()
+    with open(crlf_path, 'wb') as output:
+        output.write(data.replace(b'\n', b'\r\n'))
+    return crlf_path
+
+
+@pytest.mark.parametrize('program, rules', [
+    ('orca', 'orca_rules.dat'),
+    ('gaussian', 'gaussian_rules.dat'),
+    ('xtb', 'xtb_rules.dat'),
+    ('crest', 'crest_rules.dat'),
+])
+def test_mapped_scan_matches_line_parse(tmp_path, program, rules):
+    ruleset = file_parser.get_ruleset(os.path.join(RULES_DIR, rules))
+    path = synthetic_outputs.write_output(program, str(tmp_path), OUTPUT_SIZE, opt_cycles=8)
+    assert os.path.getsize(path) >= file_parser.MAPPED_MIN_BYTES
+    assert ruleset.scan_plan() is not None
+    by_lines = ruleset.parse_lines(file_parser.iter_lines(path))
+    mapped = file_parser.parse_mapped(ruleset, path)
+    assert mapped is not None
+    assert same_data(mapped, by_lines)
+    assert same_data(ruleset.parse_file(path), by_lines)
+
+    #text mode reads \r\n as \n, the mapped scan leaves such files to the line reader
+    crlf_path = to_crlf(path)
+    assert file_parser.parse_mapped(ruleset, crlf_path) is None
+    assert same_data(ruleset.parse_file(crlf_path), by_lines)
+    assert same_data(ruleset.parse_lines(file_parser.iter_lines(crlf_path)), by_lines)
+
+
+def test_non_ascii_lines_are_always_read(tmp_path):
+    #(?i)kelvin also matches the kelvin sign, which a byte search for the literal misses
+    rules_path = tmp_path / 'kelvin.dat'
+    rules_path.write_text('T_K ; (?i)kelvin ; last ; float\nnormal_exit ; all done ; found\n')
+    output = tmp_path / 'job.out'
+    with open(output, 'w', encoding='utf-8') as output_file:
+        output_file.write('filler line\n' * (file_parser.MAPPED_MIN_BYTES // 12 + 1))
+        output_file.write('\u212aelvin 298.15\n')
+        output_file.write('all done\n')
+    ruleset = file_parser.get_ruleset(str(rules_path))
+    mapped = file_parser.parse_mapped(ruleset, str(output))
+    assert mapped == {'T_K' : 298.15, 'normal_exit' : True}
+    assert mapped == ruleset.parse_lines(file_parser.iter_lines(str(output)))
+
+
+def test_required_literal():
+    assert file_parser.required_literal(r'FINAL SINGLE POINT ENERGY') == ('FINAL SINGLE POINT ENERGY', False)
+    assert file_parser.required_literal(r'TOTAL\s+FREE\s+ENERGY') == ('ENERGY', False)
+    assert file_parser.required_literal(r'(?i)(^|\s+)(opt|tightopt)\s+') is None
+    assert file_parser.required_literal(r'(?i)end of input') == ('end of input', True)
+    #too short to be worth a search
+    assert file_parser.required_literal(r'\d+:\s+cm') is None
+    assert file_parser.required_literal(r'[') is None
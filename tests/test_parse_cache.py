@@ -0,0 +1,109 @@
+import os
+
+import numpy as np
+import pytest
+
+import file_parser
+import parse_cache
+from benchmarks import synthetic_outputs
+from conftest import RULES_DIR, same_data
+
+ORCA_RULES = os.path.join(RULES_DIR, 'orca_rules.dat')
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    '''
+    the default cache pointed at a file in tmp_path, off again afterwards
+    '''
+    monkeypatch.setattr(parse_cache, 'default_cache', None)
+    yield parse_cache.set_default_cache(str(tmp_path / 'cache' / 'parse_cache.sqlite'))
+    parse_cache.set_default_cache(None)
+
+
+@pytest.fixture
+def parses(monkeypatch):
+    '''
+    list of the outputs actually parsed, as opposed to read from the cache
+    '''
+    parsed = []
+    parse_file = file_parser.CompiledRuleset.parse_file
+    def counting_parse_file(self, read_filename, chunk_size=None):
+        parsed.append(read_filename)
+        return parse_file(self, read_filename, chunk_size)
+    monkeypatch.setattr(file_parser.CompiledRuleset, 'parse_file', counting_parse_file)
+    return parsed
+
+
+def test_cache_is_off_unless_asked_for():
+    assert parse_cache.cache_path(None) is None
+    assert parse_cache.cache_path('off') is None
+    assert parse_cache.cache_path(' OFF ') is None
+    assert parse_cache.cache_path('on') == parse_cache.DEFAULT_CACHE_PATH
+    assert parse_cache.cache_path('/scratch/me/cache.sqlite') == '/scratch/me/cache.sqlite'
+    #the default never lives in the home directory, which is NFS on most clusters
+    assert not parse_cache.DEFAULT_CACHE_PATH.startswith(os.path.expanduser('~'))
+
+
+def test_hit_until_output_changes(tmp_path, cache, parses):
+    path = synthetic_outputs.write_output('orca', str(tmp_path), '64kb', opt_cycles=5)
+    first = file_parser.extract_data(path, ORCA_RULES)
+    assert same_data(file_parser.extract_data(path, ORCA_RULES), first)
+    assert len(parses) == 1
+    #a changed output is parsed again
+    with open(path, 'a') as output:
+        output.write('FINAL SINGLE POINT ENERGY      -1.000000000\n')
+    changed = file_parser.extract_data(path, ORCA_RULES)
+    assert len(parses) == 2
+    assert changed['E_el_au'] == -1.0
+    assert same_data(changed, file_parser.extract_data(path, ORCA_RULES, use_cache=False))
+
+
+def test_results_are_kept_per_ruleset_and_selection(tmp_path, cache, parses):
+    path = synthetic_outputs.write_output('orca', str(tmp_path), '64kb', opt_cycles=5)
+    full = file_parser.extract_data(path, ORCA_RULES)
+    selected = file_parser.extract_data(path, ORCA_RULES, fields=['E_el_au'])
+    assert selected == {'E_el_au' : full['E_el_au']}
+    assert len(parses) == 2
+    file_parser.extract_data(path, ORCA_RULES)
+    file_parser.extract_data(path, ORCA_RULES, fields=['E_el_au'])
+    assert len(parses) == 2
+
+
+def test_arrays_round_trip(tmp_path):
+    cache = parse_cache.ParseCache(str(tmp_path / 'parse_cache.sqlite'))
+    output = tmp_path / 'job.out'
+    output.write_text('x\n')
+    ruleset = file_parser.get_ruleset(ORCA_RULES)
+    data = {'E_el_cycles_au' : np.array([-1.5, -1.25]), 'steps' : np.array([1, 2]), 'normal_exit' : True}
+    cache.put(str(output), ruleset, data)
+    cached = cache.get(str(output), ruleset)
+    assert same_data(cached, data)
+    assert cached['steps'].dtype == data['steps'].dtype
+    cache.invalidate(str(output))
+    assert cache.get(str(output), ruleset) is None
+
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    cache = parse_cache.ParseCache(str(tmp_path / 'parse_cache.sqlite'), max_bytes=250)
+    ruleset = file_parser.get_ruleset(ORCA_RULES)
+    outputs = []
+    for number in range(4):
+        output = tmp_path / f'{number}.out'
+        output.write_text('x\n')
+        outputs.append(str(output))
+        cache.put(str(output), ruleset, {'padding' : 'x' * 100})
+    cache.evict()
+    assert [cache.get(output, ruleset) is not None for output in outputs] == [False, False, True, True]
+
+
+def test_unusable_database_disables_cache(tmp_path, capsys):
+    not_a_database = tmp_path / 'parse_cache.sqlite'
+    not_a_database.write_bytes(b'this is not sqlite' * 100)
+    cache = parse_cache.ParseCache(str(not_a_database))
+    output = tmp_path / 'job.out'
+    output.write_text('x\n')
+    ruleset = file_parser.get_ruleset(ORCA_RULES)
+    assert cache.get(str(output), ruleset) is None
+    assert cache.broken
+    assert 'disabled' in capsys.readouterr().out
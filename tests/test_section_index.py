@@ -0,0 +1,91 @@
+import os
+import json
+
+import pytest
+
+import file_parser
+from benchmarks import synthetic_outputs
+from conftest import RULES_DIR, same_data
+
+ORCA_RULES = os.path.join(RULES_DIR, 'orca_rules.dat')
+#section-scoped orca variables, a selection of them is parsed with parse_sections
+SCOPED_FIELDS = ['E_dispersion_au', 'imaginary_frequencies', 'first_excite_E_au', 'E_broken_sym_au']
+
+
+@pytest.fixture
+def output(tmp_path):
+    file_parser.section_indexes.clear()
+    path = synthetic_outputs.write_output('orca', str(tmp_path), '1536kb', opt_cycles=8)
+    assert os.path.getsize(path) >= file_parser.MAPPED_MIN_BYTES
+    yield path
+    file_parser.section_indexes.clear()
+
+
+def test_parse_sections_matches_full_parse(output):
+    ruleset = file_parser.get_ruleset(ORCA_RULES)
+    full = file_parser.extract_data(output, ruleset, use_cache=False)
+    for fields in [SCOPED_FIELDS] + [[field] for field in SCOPED_FIELDS]:
+        selected = ruleset.select(fields)
+        assert not selected.sections['__normal__']
+        from_sections = file_parser.parse_sections(selected, output)
+        assert from_sections is not None
+        assert same_data(from_sections, {field : full[field] for field in fields})
+        assert same_data(from_sections, selected.parse_lines(file_parser.iter_lines(output)))
+    #nothing is written next to the output unless asked for
+    assert not os.path.exists(file_parser.section_index_path(output))
+
+
+def test_iter_lines_from_last(output):
+    with open(output, 'r') as output_file:
+        lines = output_file.readlines()
+    header = 'CARTESIAN COORDINATES'
+    last = max(number for number, line in enumerate(lines) if header in line)
+    assert list(file_parser.iter_lines_from_last(output, [header])) == lines[last:]
+    #several patterns start at the last line matching any of them
+    patterns = [header, 'DFT DISPERSION CORRECTION']
+    last = max(number for number, line in enumerate(lines) if any(pattern in line for pattern in patterns))
+    assert list(file_parser.iter_lines_from_last(output, patterns)) == lines[last:]
+    assert list(file_parser.iter_lines_from_last(output, ['no such header'])) == []
+
+
+def test_iter_lines_from_last_without_index(tmp_path):
+    #\r line ends can't be read by offset, the whole file comes back
+    path = tmp_path / 'job.out'
+    path.write_bytes(b'first\r\nHEADER one\r\nHEADER two\r\nlast\r\n')
+    assert file_parser.section_offsets(str(path), ['HEADER']) is None
+    assert list(file_parser.iter_lines_from_last(str(path), ['HEADER'])) == ['first\n', 'HEADER one\n', 'HEADER two\n', 'last\n']
+
+
+def test_persisted_index_is_read_back_and_invalidated(output):
+    patterns = ['CARTESIAN COORDINATES']
+    offsets = file_parser.section_offsets(output, patterns, persist=True)
+    index_path = file_parser.section_index_path(output)
+    with open(index_path, 'r') as index_file:
+        index = json.load(index_file)
+    assert index['offsets'] == offsets
+    assert index['size'] == os.path.getsize(output)
+
+    #a new process starts with nothing in memory and reads the sidecar
+    file_parser.section_indexes.clear()
+    with open(index_path, 'w') as index_file:
+        json.dump(dict(index, offsets={'CARTESIAN COORDINATES' : [0]}), index_file)
+    assert file_parser.section_offsets(output, patterns) == {'CARTESIAN COORDINATES' : [0]}
+
+    #once the output changes, the sidecar and the in-memory index are stale
+    with open(output, 'a') as output_file:
+        output_file.write('CARTESIAN COORDINATES (ANGSTROEM)\n')
+    offsets = file_parser.section_offsets(output, patterns, persist=True)
+    assert len(offsets['CARTESIAN COORDINATES']) == 9
+    with open(output, 'rb') as output_file:
+        output_file.seek(offsets['CARTESIAN COORDINATES'][-1])
+        assert output_file.readline() == b'CARTESIAN COORDINATES (ANGSTROEM)\n'
+    with open(index_path, 'r') as index_file:
+        assert json.load(index_file)['offsets'] == offsets
+
+    #same size, new mtime
+    file_parser.section_indexes.clear()
+    with open(index_path, 'w') as index_file:
+        json.dump(dict(index, size=os.path.getsize(output), offsets={'CARTESIAN COORDINATES' : [0]}), index_file)
+    stat = os.stat(output)
+    os.utime(output, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert file_parser.section_offsets(output, patterns) == offsets
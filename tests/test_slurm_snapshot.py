@@ -0,0 +1,112 @@
+import subprocess
+
+import pytest
+
+import batch_runner
+import job_harness
+from benchmarks import synthetic_outputs
+
+
+def fake_squeue(monkeypatch, stdout='', returncode=0):
+    calls = []
+    def run(command, **kwargs):
+        calls.append(command)
+        return subprocess.CompletedProcess(command, returncode, stdout=stdout, stderr='squeue: error')
+    monkeypatch.setattr(batch_runner.subprocess, 'run', run)
+    return calls
+
+
+def test_squeue_listing_is_parsed(monkeypatch):
+    calls = fake_squeue(monkeypatch, stdout='101|RUNNING\n102|PENDING\n103|COMPLETING\n200_4|RUNNING\n200_5|PD\nnot a job|R\n\n')
+    assert batch_runner.query_slurm_statuses() == {
+        101 : 'running',
+        102 : 'pending',
+        '200_4' : 'running',
+        '200_5' : 'pending',
+    }
+    #array tasks are listed one per line
+    assert ' -r ' in calls[0]
+
+
+def test_failed_squeue_raises(monkeypatch, capsys):
+    fake_squeue(monkeypatch, returncode=1)
+    with pytest.raises(RuntimeError):
+        batch_runner.query_slurm_statuses()
+    assert batch_runner.get_all_slurm_statuses() == {}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(batch_runner.time, 'monotonic', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def listings(monkeypatch):
+    '''
+    squeue answers, popped one per query; an exception is raised instead of returned
+    '''
+    answers = []
+    def query():
+        answer = answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return dict(answer)
+    monkeypatch.setattr(batch_runner, 'query_slurm_statuses', query)
+    return answers
+
+
+def test_snapshot_is_reused_until_ttl(clock, listings):
+    listings.extend([{1 : 'running'}, {1 : 'running', 2 : 'pending'}, {}])
+    snapshot = batch_runner.SlurmSnapshot(ttl=10.0)
+    assert snapshot.statuses is None
+    assert snapshot.refresh() == {1 : 'running'}
+    clock[0] += 9.0
+    assert snapshot.refresh() == {1 : 'running'}
+    assert len(listings) == 2
+    clock[0] += 1.0
+    assert snapshot.refresh() == {1 : 'running', 2 : 'pending'}
+    assert snapshot.refresh(force=True) == {}
+    assert listings == []
+
+
+def test_failed_refresh_keeps_previous_listing(clock, listings, capsys):
+    listings.extend([{1 : 'running'}, RuntimeError('squeue timed out'), {}])
+    snapshot = batch_runner.SlurmSnapshot(ttl=0.0)
+    snapshot.refresh()
+    taken = snapshot.taken
+    clock[0] += 1.0
+    #job 1 must not look finished just because squeue failed
+    assert snapshot.refresh() == {1 : 'running'}
+    assert snapshot.taken == taken
+    assert 'keeping previous snapshot' in capsys.readouterr().out
+    assert snapshot.refresh() == {}
+
+
+def test_submitted_jobs_are_added_until_next_listing(clock, listings):
+    listings.extend([{}])
+    snapshot = batch_runner.SlurmSnapshot()
+    #nothing to add to before the first listing, harnesses then ask squeue themselves
+    snapshot.add(5)
+    assert snapshot.statuses is None
+    snapshot.refresh()
+    snapshot.add(5)
+    snapshot.add('7_2')
+    snapshot.add(None)
+    assert snapshot.statuses == {5 : 'pending', '7_2' : 'pending'}
+
+
+def test_array_tasks_are_looked_up_by_task_key(tmp_path):
+    harness = job_harness.ORCAHarness()
+    harness.directory = str(tmp_path)
+    harness.job_name = 'job'
+    harness.job_id = 200
+    harness.array_task = 4
+    harness.update_status(slurm_cache={200 : 'pending', '200_4' : 'running'})
+    assert harness.status == 'running'
+    harness.update_status(slurm_cache={'200_5' : 'running'})
+    assert harness.status == 'not_started' #no output yet
+    synthetic_outputs.write_orca_output(str(tmp_path / 'job.out'), 64 * 1024, opt_cycles=5)
+    harness.update_status(slurm_cache={'200_5' : 'running'})
+    assert harness.status == 'succeeded'
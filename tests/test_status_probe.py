@@ -0,0 +1,117 @@
+import os
+
+import pytest
+
+import file_parser
+import job_harness
+from benchmarks import synthetic_outputs
+
+#bigger than both probe windows, so the probe really only reads part of it
+OUTPUT_BYTES = 4 * (file_parser.PROBE_HEAD_BYTES + file_parser.PROBE_TAIL_BYTES)
+
+
+def replace_in_file(path, old, new):
+    with open(path, 'r') as output:
+        text = output.read()
+    assert old in text
+    with open(path, 'w') as output:
+        output.write(text.replace(old, new))
+
+
+def harness_for(harness_class, path):
+    harness = harness_class()
+    harness.directory = os.path.dirname(path)
+    harness.job_name = os.path.splitext(os.path.basename(path))[0]
+    return harness
+
+
+def check_status(harness, monkeypatch):
+    '''
+    check_success_static, returning whether it fell back to the full parse
+    '''
+    full_parses = []
+    extract_data = file_parser.extract_data
+    def counting_extract_data(*args, **kwargs):
+        full_parses.append(args[0])
+        return extract_data(*args, **kwargs)
+    monkeypatch.setattr(file_parser, 'extract_data', counting_extract_data)
+    harness.check_success_static()
+    monkeypatch.setattr(file_parser, 'extract_data', extract_data)
+    return bool(full_parses)
+
+
+def full_status(harness_class, path):
+    harness = harness_for(harness_class, path)
+    harness.interpret_fp_out(file_parser.extract_data(path, harness.ruleset, use_cache=False))
+    return harness.status
+
+
+def probe(harness, path):
+    return file_parser.probe_data(path, harness.ruleset,
+                                  head_fields=harness.probe_head_fields,
+                                  tail_fields=harness.probe_tail_fields,
+                                  tail_anchors=harness.probe_tail_anchors)
+
+
+def test_orca_opt_without_freq_is_settled_by_probe(tmp_path, monkeypatch):
+    path = synthetic_outputs.write_orca_output(str(tmp_path / 'opt.out'), OUTPUT_BYTES, sections=('dispersion',))
+    harness = harness_for(job_harness.ORCAHarness, path)
+    assert probe(harness, path) == {
+        'is_opt' : True,
+        'normal_exit' : True,
+        'opt_normal_exit' : True,
+        'imaginary_frequencies' : False,
+    }
+    assert not check_status(harness, monkeypatch)
+    assert harness.status == 'succeeded' == full_status(job_harness.ORCAHarness, path)
+
+
+def test_orca_opt_freq_with_imaginary_mode_fails_without_full_parse(tmp_path, monkeypatch):
+    path = synthetic_outputs.write_orca_output(str(tmp_path / 'optfreq.out'), OUTPUT_BYTES)
+    replace_in_file(path, '     0.00 cm**-1\n', '  -123.45 cm**-1\n')
+    harness = harness_for(job_harness.ORCAHarness, path)
+    assert probe(harness, path)['imaginary_frequencies'] is True
+    assert not check_status(harness, monkeypatch)
+    assert harness.status == 'failed' == full_status(job_harness.ORCAHarness, path)
+
+
+def test_orca_unfinished_opt_falls_back(tmp_path, monkeypatch):
+    path = synthetic_outputs.write_orca_output(str(tmp_path / 'opt.out'), OUTPUT_BYTES, sections=('dispersion',))
+    replace_in_file(path, '*** OPTIMIZATION RUN DONE ***', 'still optimizing')
+    harness = harness_for(job_harness.ORCAHarness, path)
+    settled = probe(harness, path)
+    assert 'opt_normal_exit' not in settled and 'imaginary_frequencies' not in settled
+    assert check_status(harness, monkeypatch)
+    assert harness.status == 'failed' == full_status(job_harness.ORCAHarness, path)
+
+
+def test_gaussian_opt_freq_is_settled_by_probe(tmp_path, monkeypatch):
+    path = synthetic_outputs.write_gaussian_output(str(tmp_path / 'optfreq.log'), OUTPUT_BYTES)
+    harness = harness_for(job_harness.GaussianHarness, path)
+    settled = probe(harness, path)
+    assert settled['is_opt_freq'] is True
+    #at_least_2 rules count their matches across both windows
+    assert settled['normal_exit_opt_freq'] is True
+    assert settled['normal_exit_opt_freq_2'] is True
+    assert settled['imaginary_frequencies'] is False
+    assert not check_status(harness, monkeypatch)
+    assert harness.status == 'succeeded' == full_status(job_harness.GaussianHarness, path)
+
+
+def test_gaussian_route_missing_from_head_is_not_settled(tmp_path, monkeypatch):
+    path = synthetic_outputs.write_gaussian_output(str(tmp_path / 'sp.log'), OUTPUT_BYTES)
+    #not an opt freq job as far as the head can tell
+    replace_in_file(path, ' #p ub3lyp/6-31g(d) opt freq\n', ' #p ub3lyp/6-31g(d)\n')
+    harness = harness_for(job_harness.GaussianHarness, path)
+    assert 'is_opt_freq' not in probe(harness, path)
+    assert check_status(harness, monkeypatch)
+    assert harness.status == full_status(job_harness.GaussianHarness, path)
+
+
+def test_at_least_2_stays_true_after_more_matches(tmp_path):
+    rules_path = tmp_path / 'count.dat'
+    rules_path.write_text('twice ; hit ; at_least_2\n')
+    for hits, expected in ((0, False), (1, False), (2, True), (3, True), (4, True)):
+        output = tmp_path / f'{hits}.out'
+        output.write_text('miss\n' + 'hit\n' * hits)
+        assert file_parser.extract_data(str(output), str(rules_path), use_cache=False) == {'twice' : expected}
@@ -0,0 +1,91 @@
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+import batch_runner
+import file_parser
+from benchmarks import synthetic_outputs
+
+
+def make_runner(root, monkeypatch, **kwargs):
+    '''
+    four finished orca jobs, one failed, one never started, nothing in the queue
+    '''
+    rows = []
+    for name in ('a', 'b', 'c', 'd', 'e', 'f'):
+        directory = os.path.join(root, name)
+        os.makedirs(directory)
+        if name not in ('e', 'f'):
+            synthetic_outputs.write_orca_output(os.path.join(directory, 'job.out'), 64 * 1024, opt_cycles=5, seed=len(rows))
+        rows.append({
+            'job_id' : -1,
+            'job_basename' : 'job',
+            'job_directory' : directory,
+            'program' : 'orca',
+            'job_status' : 'not_started',
+            'coords_from' : np.nan,
+            'xyz_filename' : np.nan,
+            'orbitals_from' : np.nan,
+            'gbw_filename' : np.nan,
+        })
+    with open(os.path.join(root, 'e', 'job.out'), 'w') as output:
+        output.write("ORCA TERMINATED WITH ERRORS\n")
+    monkeypatch.setattr(batch_runner, 'query_slurm_statuses', lambda: {})
+    runner = batch_runner.BatchRunner(**kwargs)
+    runner.scratch_directory = root
+    runner.ledger = pd.DataFrame(rows)
+    runner.build_dependency_graph()
+    return runner
+
+
+def test_pool_finds_the_same_statuses(tmp_path, monkeypatch):
+    statuses = []
+    for workers in (1, 3):
+        runner = make_runner(str(tmp_path / str(workers)), monkeypatch, parse_workers=workers)
+        runner.check_status_all()
+        statuses.append(runner.ledger['job_status'].tolist())
+        #each worker saves its job's status
+        for directory in runner.ledger['job_directory']:
+            with open(os.path.join(directory, 'run_info.json'), 'r') as json_file:
+                assert json.load(json_file)['job_id'] == -1
+    assert statuses[0] == statuses[1] == ['succeeded'] * 4 + ['failed', 'not_started']
+    assert runner.ledger_index.by_directory(os.path.join(str(tmp_path / '3'), 'e')) == [4]
+
+
+class RecordingPool:
+    '''
+    ProcessPoolExecutor run in-process, recording the pool size
+    '''
+    sizes = []
+
+    def __init__(self, max_workers):
+        RecordingPool.sizes.append(max_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def map(self, function, items, chunksize=1):
+        return map(function, items)
+
+
+def test_status_workers_default(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch_runner.concurrent.futures, 'ProcessPoolExecutor', RecordingPool)
+    monkeypatch.setattr(file_parser, 'available_cpus', lambda: 64)
+    RecordingPool.sizes = []
+    runner = make_runner(str(tmp_path / 'default'), monkeypatch)
+    runner.check_status_all()
+    #a few processes unless parse_workers asks for more
+    assert RecordingPool.sizes == [batch_runner.DEFAULT_STATUS_WORKERS]
+    runner = make_runner(str(tmp_path / 'many'), monkeypatch, parse_workers=16)
+    runner.check_status_all()
+    #never more processes than jobs
+    assert RecordingPool.sizes == [batch_runner.DEFAULT_STATUS_WORKERS, 6]
+    runner = make_runner(str(tmp_path / 'serial'), monkeypatch, parse_workers=1)
+    runner.check_status_all()
+    assert len(RecordingPool.sizes) == 2
+    assert runner.ledger['job_status'].tolist() == ['succeeded'] * 4 + ['failed', 'not_started']